@@ -0,0 +1,176 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import typer
+
+from benchmarks.run import environment, load_baseline, percentile, save_baseline, start_origin_process
+
+
+# Cold-start benchmark: every run is a fresh interpreter that imports an entry
+# point and serves one request from the stub origin, the way a new Lambda
+# execution environment would, then serves a few warm requests.
+#
+#   python -m benchmarks.cold_start                      lambda handler vs Flask app, 10 runs each
+#   python -m benchmarks.cold_start --importtime 15      slowest top-level imports of the lambda handler
+#   python -m benchmarks.cold_start --save main          store benchmarks/baselines/cold-start-main.json
+#   python -m benchmarks.cold_start --compare main       exit 1 if a cold start got slower than tolerance
+
+ROOT = Path(__file__).parent.parent
+
+# runs in the fresh interpreter, prints one JSON line of timings
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+mode, event, warm = sys.argv[1], json.loads(sys.argv[2]), int(sys.argv[3])
+if mode == "lambda":
+    from server.lambda_handler import handler
+    call = lambda: handler(event, None)["statusCode"]
+else:
+    from server.app import app
+    client = app.test_client()
+    call = lambda: client.get("/proxy" + event["rawPath"] + "?" + event["rawQueryString"]).status_code
+imported = time.perf_counter()
+status = call()
+first = time.perf_counter()
+warm_ms = []
+for _ in range(warm):
+    begin = time.perf_counter()
+    call()
+    warm_ms.append((time.perf_counter() - begin) * 1000)
+print(json.dumps({
+    "status": status,
+    "import_ms": (imported - started) * 1000,
+    "first_call_ms": (first - imported) * 1000,
+    "warm_ms": warm_ms,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+}))
+"""
+
+
+class Mode(str, Enum):
+    lambda_ = "lambda"
+    flask = "flask"
+
+
+def stub_event(path: str = "/stub/json", query: str = "size=1024") -> Dict:
+    """API Gateway HTTP API (payload 2.0) event for GET /proxy<path>"""
+    return {
+        "version": "2.0",
+        "rawPath": path,
+        "rawQueryString": query,
+        "headers": {"accept": "*/*", "host": "bench.local"},
+        "requestContext": {"http": {"method": "GET", "path": path, "sourceIp": "127.0.0.1"}},
+        "isBase64Encoded": False
+    }
+
+
+def probe(mode: str, event: Dict, warm: int, env: Dict, importtime: bool = False) -> Dict:
+    """One cold start in a fresh interpreter"""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE, mode, json.dumps(event), str(warm)]
+    completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{mode} probe failed:\n{completed.stderr[-2000:]}")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    if result["status"] >= 400:
+        raise RuntimeError(f"{mode} probe got HTTP {result['status']} from the stub origin")
+    if importtime:
+        result["imports"] = parse_importtime(completed.stderr)
+    return result
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Top-level modules from -X importtime output, slowest cumulative first"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # nested imports are indented under their parent
+        if not name.startswith("  "):
+            imports.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(imports, key=lambda entry: entry["cumulative_ms"], reverse=True)
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    cold = sorted(run["import_ms"] + run["first_call_ms"] for run in runs)
+    warm = sorted(ms for run in runs for ms in run["warm_ms"])
+    return {
+        "runs": len(runs),
+        "import_ms": round(statistics.median(run["import_ms"] for run in runs), 2),
+        "first_call_ms": round(statistics.median(run["first_call_ms"] for run in runs), 2),
+        "cold_start_ms": round(statistics.median(cold), 2),
+        "cold_start_p90_ms": round(percentile(cold, 0.9), 2),
+        "warm_p50_ms": round(percentile(warm, 0.5), 2),
+        "peak_rss_mb": round(statistics.median(run["peak_rss_mb"] for run in runs), 1)
+    }
+
+
+def main(
+    mode: Optional[List[Mode]] = typer.Option(None, "--mode", "-m", help="lambda and/or flask (default both)"),
+    runs: int = typer.Option(10, min=1, help="Fresh interpreters per mode"),
+    warm: int = typer.Option(20, min=0, help="Warm requests after each cold start"),
+    importtime: int = typer.Option(0, min=0, help="Also show the N slowest top-level imports of the lambda handler"),
+    save: Optional[str] = typer.Option(None, help="Store the results as benchmarks/baselines/cold-start-<name>.json"),
+    compare: Optional[str] = typer.Option(None, help="Compare against a stored baseline, exit 1 on regression"),
+    tolerance: float = typer.Option(0.15, min=0, help="Allowed cold-start increase as a fraction")
+) -> None:
+    """Measure import time, first-request latency and warm latency of fresh processes"""
+    modes = [m.value for m in mode] if mode else [m.value for m in Mode]
+    baseline = load_baseline(f"cold-start-{compare}")["results"] if compare else None
+    event = stub_event()
+
+    origin_process, origin = start_origin_process()
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as routes_file:
+        json.dump({"/stub": origin}, routes_file)
+
+    env = dict(os.environ, REVERSE_PROXY_ROUTES_FILE=routes_file.name, PYTHONPATH=str(ROOT))
+    results = {}
+    try:
+        for name in modes:
+            typer.echo(f"running {name} x{runs} ...", err=True)
+            results[name] = summarize([probe(name, event, warm, env) for _ in range(runs)])
+
+        imports = probe("lambda", event, 0, env, importtime=True)["imports"] if importtime else None
+    finally:
+        origin_process.kill()
+        os.unlink(routes_file.name)
+
+    columns = ["import_ms", "first_call_ms", "cold_start_ms", "cold_start_p90_ms", "warm_p50_ms", "peak_rss_mb"]
+    typer.echo(f"{'mode':<10}" + "".join(f"{column:>19}" for column in columns))
+    for name, result in results.items():
+        typer.echo(f"{name:<10}" + "".join(f"{result[column]:>19}" for column in columns))
+
+    if imports:
+        typer.echo("\nslowest top-level imports (lambda, cold):")
+        for entry in imports[:importtime]:
+            typer.echo(f"  {entry['cumulative_ms']:>9.1f}ms  {entry['module']}")
+
+    if save:
+        path = save_baseline(f"cold-start-{save}", {"environment": environment(), "runs": runs, "results": results})
+        typer.echo(f"\nSaved baseline to {path}")
+
+    if baseline is not None:
+        regressed = False
+        typer.echo(f"\nvs baseline {compare}:")
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            change = (result["cold_start_ms"] - before["cold_start_ms"]) / before["cold_start_ms"]
+            flag = "  REGRESSION" if change > tolerance else ""
+            regressed = regressed or bool(flag)
+            typer.echo(f"{name:<10} cold start {change:+.1%}{flag}")
+        if regressed:
+            raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,332 @@
+import itertools
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import typer
+
+from benchmarks.stub_origin import start_stub_origin
+
+
+# Throughput benchmarks for the proxy pipeline against the local stub origin.
+#
+#   python -m benchmarks.run run                        every scenario, both drivers
+#   python -m benchmarks.run run -s json-1k -d proxy    one scenario, one driver
+#   python -m benchmarks.run run --save main            store benchmarks/baselines/main.json
+#   python -m benchmarks.run run --compare main         exit 1 on a regression vs that baseline
+#
+# Drivers: "proxy" calls proxy_request directly, "app" goes through the Flask
+# app (server/app.py) with its WSGI test client, so the difference between
+# the two is the adapter's overhead. Each scenario runs in a freshly forked
+# process, which keeps caches, pools and peak RSS from leaking between runs.
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+STUB_ROUTE = "/stub"
+
+SCENARIOS = {
+    "json-1k": {"path": "/stub/json", "params": {"size": 1024}, "concurrency": 8},
+    "json-64k": {"path": "/stub/json", "params": {"size": 64 * 1024}, "concurrency": 8},
+    "html-16k": {"path": "/stub/html", "params": {"size": 16 * 1024}, "concurrency": 8},
+    "html-256k-title": {"path": "/stub/html", "params": {"size": 256 * 1024}, "concurrency": 4, "page_title": "Benchmark"},
+    "slow-50ms": {"path": "/stub/slow", "params": {"delay": 50, "size": 1024}, "concurrency": 64},
+    "chunked-1m": {"path": "/stub/chunked", "params": {"chunks": 64, "size": 16 * 1024, "delay": 1}, "concurrency": 4, "stream": True}
+}
+
+
+class Driver(str, Enum):
+    proxy = "proxy"
+    app = "app"
+
+
+def _params(scenario: Dict, n: int) -> Dict:
+    # a distinct query per request, so concurrent calls aren't coalesced
+    return {**{k: str(v) for k, v in scenario["params"].items()}, "n": str(n)}
+
+
+def proxy_driver(scenario: Dict, origin: str) -> Callable[[int], bool]:
+    """Call proxy_request in-process, draining streamed bodies"""
+    from reverse_proxy.proxy_service import proxy_request
+
+    routes = {STUB_ROUTE: origin}
+    transform_options = {"page_title": scenario["page_title"], "text_replaces": {}} if scenario.get("page_title") else None
+
+    def call(n: int) -> bool:
+        event = {
+            "method": "GET",
+            "path": scenario["path"],
+            "client_ip": "127.0.0.1",
+            "params": _params(scenario, n),
+            "data": None,
+            "headers": {}
+        }
+        response = proxy_request(event, transform_options, routes, stream=scenario.get("stream", False))
+        if response.get("stream") is not None:
+            for _ in response["stream"]:
+                pass
+        else:
+            response["content"]
+        return response["status_code"] < 400
+
+    return call
+
+
+def app_driver(scenario: Dict, origin: str) -> Callable[[int], bool]:
+    """GET /proxy/<path> through the Flask app, one test client per thread"""
+    from reverse_proxy.router import set_live_routes
+    from server.app import app
+
+    set_live_routes({STUB_ROUTE: origin})
+    clients = threading.local()
+
+    def call(n: int) -> bool:
+        if not hasattr(clients, "client"):
+            clients.client = app.test_client()
+        params = _params(scenario, n)
+        if scenario.get("page_title"):
+            params["page_title"] = scenario["page_title"]
+        response = clients.client.get("/proxy" + scenario["path"], query_string=params)
+        response.get_data()
+        response.close()
+        return response.status_code < 400
+
+    return call
+
+
+DRIVERS = {Driver.proxy.value: proxy_driver, Driver.app.value: app_driver}
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(call: Callable[[int], bool], concurrency: int, duration: float, warmup: int = 0) -> Dict:
+    """Drive call from `concurrency` threads for `duration` seconds"""
+    counter = itertools.count()
+    for _ in range(warmup):
+        call(next(counter))
+
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        latencies = []
+        errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = call(next(counter))
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+        return latencies, errors
+
+    cpu_start = _cpu_seconds()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = [future.result() for future in [pool.submit(worker) for _ in range(concurrency)]]
+    wall = time.perf_counter() - wall_start
+    cpu = _cpu_seconds() - cpu_start
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(outcome[1] for outcome in outcomes),
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "cpu_seconds": round(cpu, 3),
+        "cpu_percent": round(cpu / wall * 100, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1)
+    }
+
+
+def _scenario_process(name: str, driver: str, origin: str, concurrency: int, duration: float, warmup: int, results) -> None:
+    # per-request logging (and urllib3's pool-full warnings at high concurrency)
+    # would dominate the numbers
+    logging.disable(logging.WARNING)
+    try:
+        call = DRIVERS[driver](SCENARIOS[name], origin)
+        results.put(measure(call, concurrency, duration, warmup))
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_scenario(name: str, driver: str, origin: str, duration: float, warmup: int, concurrency: Optional[int] = None) -> Dict:
+    """Run one scenario with one driver in a forked process"""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(
+        target=_scenario_process,
+        args=(name, driver, origin, concurrency or SCENARIOS[name]["concurrency"], duration, warmup, results)
+    )
+    process.start()
+    try:
+        result = results.get(timeout=duration + 120)
+    finally:
+        process.join(10)
+        if process.is_alive():
+            process.kill()
+    return result
+
+
+def start_origin_process():
+    """Serve the stub origin from a forked process, returns (process, base URL)"""
+    server = start_stub_origin()
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    process = multiprocessing.get_context("fork").Process(target=server.serve_forever, daemon=True)
+    process.start()
+    server.server_close()
+    return process, origin
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": multiprocessing.cpu_count()
+    }
+
+
+def baseline_path(name: str) -> Path:
+    return BASELINE_DIR / f"{name}.json"
+
+
+def save_baseline(name: str, report: Dict) -> Path:
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    return path
+
+
+def load_baseline(name: str) -> Dict:
+    path = baseline_path(name)
+    if not path.exists():
+        raise ValueError(f"No baseline named {name} ({path})")
+    return json.loads(path.read_text())
+
+
+def compare_results(baseline: Dict, current: Dict, tolerance: float) -> List[Dict]:
+    """Per-run change in RPS and p99 latency, flagging moves worse than tolerance"""
+    rows = []
+    for key, result in current.items():
+        before = baseline.get(key)
+        if not before or "error" in before or "error" in result:
+            continue
+        rps_change = (result["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        p99_change = (result["p99_ms"] - before["p99_ms"]) / before["p99_ms"] if before["p99_ms"] else 0.0
+        rows.append({
+            "run": key,
+            "rps_change": round(rps_change, 4),
+            "p99_change": round(p99_change, 4),
+            "regression": rps_change < -tolerance or p99_change > tolerance
+        })
+    return rows
+
+
+def format_results(results: Dict) -> str:
+    columns = ["rps", "p50_ms", "p90_ms", "p99_ms", "max_ms", "errors", "cpu_percent", "peak_rss_mb"]
+    lines = [f"{'run':<24}" + "".join(f"{column:>13}" for column in columns)]
+    for key, result in results.items():
+        if "error" in result:
+            lines.append(f"{key:<24}  failed: {result['error']}")
+        else:
+            lines.append(f"{key:<24}" + "".join(f"{result[column]:>13}" for column in columns))
+    return "\n".join(lines)
+
+
+app = typer.Typer(help="Proxy throughput benchmarks against a local stub origin")
+
+
+@app.command("list")
+def list_scenarios() -> None:
+    """Show the available scenarios"""
+    for name, scenario in SCENARIOS.items():
+        typer.echo(f"{name:<18} {scenario['path']} {scenario['params']} concurrency={scenario['concurrency']}")
+
+
+@app.command()
+def run(
+    scenario: Optional[List[str]] = typer.Option(None, "--scenario", "-s", help="Scenario to run (repeatable, default all)"),
+    driver: Optional[List[Driver]] = typer.Option(None, "--driver", "-d", help="proxy and/or app (default both)"),
+    duration: float = typer.Option(5, min=0.1, help="Measured seconds per run"),
+    warmup: int = typer.Option(20, min=0, help="Unmeasured requests before each run"),
+    concurrency: Optional[int] = typer.Option(None, min=1, help="Override every scenario's concurrency"),
+    save: Optional[str] = typer.Option(None, help="Store the results as benchmarks/baselines/<name>.json"),
+    compare: Optional[str] = typer.Option(None, help="Compare against a stored baseline, exit 1 on regression"),
+    tolerance: float = typer.Option(0.1, min=0, help="Allowed RPS drop / p99 rise as a fraction")
+) -> None:
+    """Run scenarios and print RPS, latency percentiles, CPU and peak RSS"""
+    names = scenario or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise typer.BadParameter(f"unknown scenario(s): {', '.join(unknown)}", param_hint="--scenario")
+    drivers = [d.value for d in driver] if driver else [d.value for d in Driver]
+    baseline = load_baseline(compare)["results"] if compare else None
+
+    origin_process, origin = start_origin_process()
+    results = {}
+    try:
+        for name in names:
+            for driver_name in drivers:
+                key = f"{name}/{driver_name}"
+                typer.echo(f"running {key} ...", err=True)
+                results[key] = run_scenario(name, driver_name, origin, duration, warmup, concurrency)
+    finally:
+        origin_process.kill()
+
+    typer.echo(format_results(results))
+
+    if save:
+        path = save_baseline(save, {"environment": environment(), "duration": duration, "results": results})
+        typer.echo(f"\nSaved baseline to {path}")
+
+    if baseline is not None:
+        rows = compare_results(baseline, results, tolerance)
+        typer.echo(f"\nvs baseline {compare}:")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            typer.echo(f"{row['run']:<24} rps {row['rps_change']:+.1%}  p99 {row['p99_change']:+.1%}{flag}")
+        if any(row["regression"] for row in rows):
+            raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,108 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+import typer
+from requests.structures import CaseInsensitiveDict
+
+from reverse_proxy import proxy_service
+from reverse_proxy.config.consts import DEFAULT_STAGES
+from reverse_proxy.stages import UPSTREAM
+
+
+# Per-stage overhead of the compiled route pipeline, with the upstream call
+# answered in memory so only the proxy's own work is timed.
+#
+#   python -m benchmarks.stages                         every built-in stage against a bare "upstream" route
+#   python -m benchmarks.stages -n 20000 --stream       more requests, streamed responses
+#
+# Each row is a route whose stages are just "upstream" plus the named stage,
+# its overhead is the difference to the bare route. "default" is DEFAULT_STAGES.
+# Requests carry no transform options, so the transform row is the cost of
+# the stage call itself.
+
+BODY = b'{"items": []}' * 64
+
+STAGE_SETS = {
+    "upstream": [UPSTREAM],
+    "ratelimit": ["ratelimit", UPSTREAM],
+    "headers": ["headers", UPSTREAM],
+    "cache": ["cache", UPSTREAM],
+    "transform": [UPSTREAM, "transform"],
+    "compress": [UPSTREAM, "compress"],
+    "default": DEFAULT_STAGES
+}
+
+
+def origin_response(method, url, params=None, data=None, headers=None, stream=False, timeout=None) -> requests.Response:
+    """In-memory upstream reply, never cacheable so the cache stage misses every time"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict({"Content-Type": "application/json", "Cache-Control": "no-store"})
+    response._content = BODY
+    response._content_consumed = True
+    return response
+
+
+def stage_driver(stages: List[str], stream: bool = False) -> Callable[[], None]:
+    """One proxy_request through a route with these stages"""
+    routes = {"/bench": {"target": "http://bench.invalid", "stages": stages, "request_headers": {"X-Bench": "1"}}}
+    event = {"method": "GET", "path": "/bench/items", "params": {}, "data": None, "headers": {"Accept-Encoding": "gzip"}}
+
+    def call() -> None:
+        response = proxy_service.proxy_request(event, route_config=routes, stream=stream)
+        if stream and response["stream"] is not None:
+            for _ in response["stream"]:
+                pass
+
+    return call
+
+
+def time_rows(rows: Dict[str, List[str]], requests_count: int, stream: bool = False, rounds: int = 5) -> Dict[str, float]:
+    """Mean microseconds per request for each row, best of rounds
+
+    Rows take turns within a round, so drift in the machine's speed hits
+    every row alike instead of skewing the ones measured last.
+    """
+    drivers = {name: stage_driver(stages, stream) for name, stages in rows.items()}
+    # the first request compiles each route's chain
+    for call in drivers.values():
+        for _ in range(min(requests_count, 100)):
+            call()
+
+    best = {name: float("inf") for name in drivers}
+    for _ in range(rounds):
+        for name, call in drivers.items():
+            started = time.perf_counter()
+            for _ in range(requests_count):
+                call()
+            best[name] = min(best[name], time.perf_counter() - started)
+    return {name: elapsed / requests_count * 1e6 for name, elapsed in best.items()}
+
+
+def main(
+    stage: Optional[List[str]] = typer.Option(None, "--stage", "-s", help=f"Rows to run (default all): {', '.join(STAGE_SETS)}"),
+    requests_count: int = typer.Option(5000, "--requests", "-n", min=1, help="Timed requests per row and round"),
+    stream: bool = typer.Option(False, help="Stream the responses (compress only acts on streams)")
+) -> None:
+    """Time proxy_request per route stage list, showing each stage's overhead"""
+    names = stage or list(STAGE_SETS)
+    unknown = [name for name in names if name not in STAGE_SETS]
+    if unknown:
+        raise typer.BadParameter(f"Unknown stage rows: {', '.join(unknown)}")
+
+    logging.disable(logging.WARNING)
+    proxy_service.execute_request = origin_response
+    rows = {UPSTREAM: STAGE_SETS[UPSTREAM], **{name: STAGE_SETS[name] for name in names}}
+    results = time_rows(rows, requests_count, stream)
+    baseline = results[UPSTREAM]
+
+    typer.echo(f"{'stages':<12}{'us/request':>12}{'overhead_us':>13}")
+    for name in names:
+        typer.echo(f"{name:<12}{results[name]:>12.1f}{results[name] - baseline:>+13.1f}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
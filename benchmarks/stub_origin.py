@@ -0,0 +1,122 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import typer
+
+
+# Local upstream for the benchmarks, so results measure the proxy rather than
+# the network. Every response is deterministic and marked no-store so the
+# response cache never short-circuits a run.
+#
+#   /json?size=N                    JSON document of about N bytes
+#   /html?size=N                    HTML page of about N bytes with a <title>
+#   /slow?delay=MS&size=N           HTML page sent after MS milliseconds
+#   /chunked?chunks=K&size=N&delay=MS
+#                                   K chunks of N bytes, MS milliseconds apart
+
+_payloads: Dict[Tuple[str, int], bytes] = {}
+
+
+def json_payload(size: int) -> bytes:
+    items = []
+    body = b"[]"
+    while len(body) < size:
+        items.append({"id": len(items), "name": f"item-{len(items)}", "tags": ["proxy", "benchmark"], "score": len(items) * 0.5})
+        body = json.dumps({"items": items}).encode("utf-8")
+    return body
+
+
+def html_payload(size: int) -> bytes:
+    head = b"<!DOCTYPE html><html><head><title>Stub Origin</title></head><body>"
+    tail = b"</body></html>"
+    paragraph = b"<p>The quick brown fox jumps over the lazy dog.</p>"
+    count = max(size - len(head) - len(tail), 0) // len(paragraph) + 1
+    return head + paragraph * count + tail
+
+
+def payload(kind: str, size: int) -> bytes:
+    key = (kind, size)
+    if key not in _payloads:
+        _payloads[key] = json_payload(size) if kind == "json" else html_payload(size)
+    return _payloads[key]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive, so the proxy's pooled connections are reused
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, Nagle + delayed ACK would add 40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_chunked(self, chunks: int, size: int, delay: float) -> None:
+        chunk = payload("html", size)[:size]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        for _ in range(chunks):
+            if delay:
+                time.sleep(delay)
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query))
+        size = int(query.get("size", 1024))
+        delay = int(query.get("delay", 0)) / 1000
+
+        if parts.path.endswith("/json"):
+            return self._send(payload("json", size), "application/json")
+        if parts.path.endswith("/html"):
+            return self._send(payload("html", size), "text/html; charset=utf-8")
+        if parts.path.endswith("/slow"):
+            time.sleep(delay)
+            return self._send(payload("html", size), "text/html; charset=utf-8")
+        if parts.path.endswith("/chunked"):
+            return self._send_chunked(int(query.get("chunks", 16)), size, delay)
+
+        self.send_error(404)
+
+    do_HEAD = do_GET
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        self._send(json.dumps({"received": len(body)}).encode("utf-8"), "application/json")
+
+
+class StubOrigin(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_stub_origin(host: str = "127.0.0.1", port: int = 0) -> StubOrigin:
+    """Bind the stub origin, call serve_forever() on the result to run it"""
+    return StubOrigin((host, port), StubHandler)
+
+
+def main(host: str = typer.Option("127.0.0.1"), port: int = typer.Option(8900)) -> None:
+    """Run the stub origin on its own, e.g. to benchmark `reverse-proxy serve` with an external load generator"""
+    server = start_stub_origin(host, port)
+    typer.echo(f"Stub origin on http://{host}:{server.server_address[1]}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,142 @@
+import asyncio
+import weakref
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from reverse_proxy.compression import can_pass_through, content_coding
+from reverse_proxy.config.consts import POOL_CONFIG, STREAM_CHUNK_SIZE, BREAKER_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.execution import prepare_request_body, prepare_request_headers, parse_response
+from reverse_proxy.pool import pool_key
+from reverse_proxy.streams import AsyncClosingStream
+from reverse_proxy.validate import is_valid_url
+
+
+# httpx clients are bound to the event loop that created them, so keep one
+# client per upstream host per loop (same per-host caps as reverse_proxy.pool).
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+
+
+def create_async_client(pool_config: Dict = POOL_CONFIG) -> httpx.AsyncClient:
+    """Build an async client whose connection pool mirrors the sync POOL_CONFIG"""
+    limits = httpx.Limits(
+        max_connections=pool_config.get("max_connections_per_host"),
+        max_keepalive_connections=pool_config.get("pool_size", 10),
+        keepalive_expiry=pool_config.get("max_idle_seconds")
+    )
+    return httpx.AsyncClient(limits=limits, timeout=BREAKER_CONFIG["max_timeout"])
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """Return the shared async client for the URL's host on the running event loop"""
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    key = pool_key(url)
+    client = clients.get(key)
+    if client is None or client.is_closed:
+        client = create_async_client()
+        clients[key] = client
+    return client
+
+
+async def close_async_clients() -> None:
+    """Close the running loop's async clients (ASGI shutdown)"""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+async def execute_request_async(method: str, url: str, params=None, data=None, headers=None, stream: bool = False, timeout: Optional[float] = None) -> httpx.Response:
+    """Execute HTTP request to target server without blocking the event loop
+
+    Async counterpart of execute_request, with stream=True the body is left
+    unread for stream_response_async to consume.
+    """
+    if not is_valid_url(url):
+        raise ValueError(f"Invalid URL: {url}")
+
+    prepared_data = prepare_request_body(data, headers)
+    headers = prepare_request_headers(headers)
+    pipeline_logger.info("Executing (async): %s %s", method.upper(), url)
+
+    client = get_async_client(url)
+    try:
+        request = client.build_request(
+            method=method.upper(),
+            url=url,
+            params=params,
+            content=prepared_data if isinstance(prepared_data, (str, bytes)) else None,
+            data=prepared_data if isinstance(prepared_data, dict) else None,
+            headers=headers,
+            timeout=timeout or BREAKER_CONFIG["max_timeout"]
+        )
+        response = await client.send(request, stream=stream)
+        if stream and response.status_code >= 400:
+            await response.aclose()
+        response.raise_for_status()
+        return response
+
+    except httpx.HTTPError as e:
+        pipeline_logger.error("Request failed: %s", e)
+        raise
+
+
+def is_upstream_failure_async(error: Exception) -> bool:
+    """Async counterpart of upstreams.is_upstream_failure for httpx errors"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+async def parse_response_async(response: httpx.Response) -> Dict:
+    """Read the body without blocking, then parse it like parse_response"""
+    await response.aread()
+    return parse_response(response)
+
+
+async def read_response_async(response: httpx.Response) -> requests.Response:
+    """Read the body and repackage the response as a requests.Response
+
+    The async pipeline hands buffered upstream responses to the same cache
+    and parse code as the sync one.
+    """
+    await response.aread()
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.reason = response.reason_phrase
+    converted.url = str(response.url)
+    converted.headers = CaseInsensitiveDict(response.headers.items())
+    converted.encoding = response.encoding
+    converted._content = response.content
+    converted._content_consumed = True
+    return converted
+
+
+def iter_response_body_async(response: httpx.Response, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield the upstream body chunk by chunk, releasing the connection when done or closed"""
+    chunks = (chunk async for chunk in response.aiter_bytes(chunk_size) if chunk)
+    return AsyncClosingStream(chunks, lambda error: response.aclose())
+
+
+def iter_raw_body_async(response: httpx.Response, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield the upstream body exactly as sent, still content-encoded"""
+    chunks = (chunk async for chunk in response.aiter_raw(chunk_size) if chunk)
+    return AsyncClosingStream(chunks, lambda error: response.aclose())
+
+
+def stream_response_async(response: httpx.Response, chunk_size: int = STREAM_CHUNK_SIZE, accept_encoding: Optional[str] = None) -> Dict:
+    """Async counterpart of stream_response, "stream" is an async byte-chunk generator"""
+    passthrough = can_pass_through(response.headers, accept_encoding)
+    return {
+        "status_code": response.status_code,
+        "headers": dict(response.headers),
+        "content_type": response.headers.get("Content-Type", ""),
+        "text": None,
+        "json": None,
+        "content": None,
+        "encoding": response.encoding,
+        "content_encoding": content_coding(response.headers) if passthrough else None,
+        "stream": iter_raw_body_async(response, chunk_size) if passthrough else iter_response_body_async(response, chunk_size)
+    }
@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from reverse_proxy.config.consts import BATCH_CONFIG
+from reverse_proxy.config.logging import pipeline_logger, bind_request, reset_request, current_request_id
+from reverse_proxy.proxy_service import proxy_request, proxy_request_async
+from reverse_proxy.ratelimit import RateLimitExceeded
+from reverse_proxy.breaker import CircuitOpenError
+
+
+# POST /proxy/batch runs a list of independent proxy calls concurrently and
+# reports each one on its own: a failing item never fails its siblings, and
+# items still running when the batch deadline passes are reported as 504s.
+# Every batch shares one pool of BATCH_CONFIG["workers"] threads but keeps
+# at most "per_batch" items in it, so workers / per_batch batches run side by
+# side without one queueing behind another.
+# Results carry the item's position ("index") and optional client "id".
+
+_executor = {"pool": None}
+_lock = threading.Lock()
+
+
+def parse_batch(payload, batch_config: Dict = BATCH_CONFIG) -> Tuple[List[Dict], float]:
+    """Items and deadline of a batch request body, raises ValueError if it is malformed"""
+    if not isinstance(payload, dict) or not isinstance(payload.get("requests"), list):
+        raise ValueError('Batch body must be {"requests": [...]}')
+
+    items = payload["requests"]
+    if not items:
+        raise ValueError("Batch has no requests")
+    if len(items) > batch_config["max_items"]:
+        raise ValueError(f"Batch has {len(items)} requests, the limit is {batch_config['max_items']}")
+    if not all(isinstance(item, dict) for item in items):
+        raise ValueError("Every batch request must be an object")
+
+    deadline = payload.get("deadline", batch_config["default_deadline"])
+    if isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or deadline <= 0:
+        raise ValueError("Batch deadline must be a positive number of seconds")
+
+    return items, min(float(deadline), batch_config["max_deadline"])
+
+
+def batch_event(item: Dict, client_ip: Optional[str] = None) -> Dict:
+    """Proxy event for one batch item, in the shape handle_proxy builds"""
+    return {
+        "method": str(item.get("method", "GET")).upper(),
+        "path": item.get("path"),
+        "params": item.get("params"),
+        "data": item.get("data"),
+        "headers": item.get("headers", {"content-Type": "application/json"}),
+        "client_ip": client_ip
+    }
+
+
+def _success(index: int, item: Dict, response: Dict) -> Dict:
+    return {
+        "index": index,
+        "id": item.get("id"),
+        "status": "success",
+        "status_code": response["status_code"],
+        "content_type": response["content_type"],
+        "content": response["text"] if isinstance(response["content"], bytes) else response["content"],
+        "headers": response["headers"]
+    }
+
+
+def _error(index: int, item: Dict, status_code: int, message: str) -> Dict:
+    return {"index": index, "id": item.get("id"), "status": "error", "status_code": status_code, "message": message}
+
+
+def _failure(index: int, item: Dict, error: Exception) -> Dict:
+    """Report an item's exception with the status handle_proxy would answer with"""
+    if isinstance(error, (RateLimitExceeded, CircuitOpenError)):
+        return _error(index, item, error.status_code, str(error))
+    if isinstance(error, ValueError):
+        return _error(index, item, 400, str(error))
+
+    pipeline_logger.error("Batch item %s failed: %s", index, error, exc_info=True)
+    return _error(index, item, 500, str(error))
+
+
+def _timed_out(index: int, item: Dict, deadline: float) -> Dict:
+    return _error(index, item, 504, f"Batch deadline of {deadline}s exceeded")
+
+
+def _item_request_id(batch_id: Optional[str], index: int) -> Optional[str]:
+    # items log under the batch's request ID, each sampled on its own
+    return f"{batch_id}.{index}" if batch_id else None
+
+
+def _call(index: int, item: Dict, client_ip: Optional[str], batch_id: Optional[str] = None) -> Dict:
+    token = bind_request(_item_request_id(batch_id, index))
+    try:
+        response = proxy_request(batch_event(item, client_ip), item.get("transformation_options"))
+        return _success(index, item, response)
+    except Exception as e:
+        return _failure(index, item, e)
+    finally:
+        reset_request(token)
+
+
+def _pool(batch_config: Dict) -> ThreadPoolExecutor:
+    if _executor["pool"] is None:
+        with _lock:
+            if _executor["pool"] is None:
+                _executor["pool"] = ThreadPoolExecutor(max_workers=batch_config["workers"], thread_name_prefix="batch")
+    return _executor["pool"]
+
+
+def run_batch(items: List[Dict], deadline: float, client_ip: Optional[str] = None, batch_config: Dict = BATCH_CONFIG) -> Iterator[Dict]:
+    """Run batch items on the shared pool, yielding each result as it completes
+
+    At most batch_config["per_batch"] items of a batch are in the pool at
+    once, the next one is submitted as one finishes, so a large batch can't
+    queue ahead of every other batch. Every item yields exactly one result.
+    Calls still running at the deadline are reported as 504 and left to
+    finish in the background; items not submitted by then are never run.
+    """
+    pool = _pool(batch_config)
+    batch_id = current_request_id()
+    expires_at = time.monotonic() + deadline
+    queued = iter(enumerate(items))
+    running = {}
+
+    def submit_next() -> None:
+        for index, item in queued:
+            running[pool.submit(_call, index, item, client_ip, batch_id)] = index
+            return
+
+    for _ in range(batch_config["per_batch"]):
+        submit_next()
+
+    try:
+        while running:
+            done, _ = wait(running, timeout=max(expires_at - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                running.pop(future)
+                if time.monotonic() < expires_at:
+                    submit_next()
+                yield future.result()
+
+        for future, index in list(running.items()):
+            running.pop(future)
+            future.cancel()
+            yield _timed_out(index, items[index], deadline)
+        for index, item in queued:
+            yield _timed_out(index, item, deadline)
+    finally:
+        # the consumer went away (e.g. a streaming client disconnected)
+        for future in running:
+            future.cancel()
+
+
+async def run_batch_async(items: List[Dict], deadline: float, client_ip: Optional[str] = None, batch_config: Dict = BATCH_CONFIG) -> AsyncIterator[Dict]:
+    """Async counterpart of run_batch on proxy_request_async
+
+    At most batch_config["per_batch"] calls of the batch run at once; calls
+    still running or waiting at the deadline are cancelled and reported as 504.
+    """
+    semaphore = asyncio.Semaphore(batch_config["per_batch"])
+    batch_id = current_request_id()
+
+    async def call(index: int, item: Dict) -> Dict:
+        # each task runs in a copy of this context, the binding stays with the item
+        bind_request(_item_request_id(batch_id, index))
+        async with semaphore:
+            try:
+                response = await proxy_request_async(batch_event(item, client_ip), item.get("transformation_options"))
+                return _success(index, item, response)
+            except Exception as e:
+                return _failure(index, item, e)
+
+    tasks = {asyncio.ensure_future(call(index, item)): index for index, item in enumerate(items)}
+    loop = asyncio.get_running_loop()
+    expires_at = loop.time() + deadline
+    pending = set(tasks)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(expires_at - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                yield task.result()
+
+        for task in list(pending):
+            pending.discard(task)
+            task.cancel()
+            yield _timed_out(tasks[task], items[tasks[task]], deadline)
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,189 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from reverse_proxy.config.consts import BREAKER_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.pool import pool_key
+
+
+# One breaker per upstream host (scheme + netloc):
+#   closed     calls flow, outcomes feed a sliding window; too many errors or
+#              slow calls in the window opens the circuit
+#   open       calls fail fast with CircuitOpenError for open_seconds
+#   half_open  up to half_open_probes calls go through; success closes the
+#              circuit, failure opens it again
+# The window's latencies also set each host's timeout.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_breakers: Dict[str, Dict] = {}
+_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open, served as 503"""
+
+    status_code = 503
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Circuit open for {host}")
+        self.host = host
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds"""
+        return str(max(math.ceil(self.retry_after), 1))
+
+
+def _new_breaker(breaker_config: Dict) -> Dict:
+    return {
+        "state": CLOSED,
+        "window": deque(maxlen=breaker_config["max_samples"]),  # (finished_at, success, latency)
+        "open_until": 0.0,
+        "probes": 0,
+        "trips": 0,
+        "timeout": breaker_config["max_timeout"],
+        "lock": threading.Lock()
+    }
+
+
+def get_breaker(url: str, breaker_config: Dict = BREAKER_CONFIG) -> Dict:
+    host = pool_key(url)
+    breaker = _breakers.get(host)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(host, _new_breaker(breaker_config))
+    return breaker
+
+
+def _prune(breaker: Dict, now: float, breaker_config: Dict) -> None:
+    window = breaker["window"]
+    horizon = now - breaker_config["window_seconds"]
+    while window and window[0][0] < horizon:
+        window.popleft()
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _adapt_timeout(breaker: Dict, breaker_config: Dict) -> None:
+    """Timeout from the p99 of successful calls, the ceiling until there are enough"""
+    latencies = [latency for _, success, latency in breaker["window"] if success]
+    if len(latencies) < breaker_config["min_requests"]:
+        breaker["timeout"] = breaker_config["max_timeout"]
+        return
+    timeout = _percentile(latencies, 0.99) * breaker_config["timeout_multiplier"]
+    breaker["timeout"] = min(max(timeout, breaker_config["min_timeout"]), breaker_config["max_timeout"])
+
+
+def _open(breaker: Dict, host: str, now: float, reason: str, breaker_config: Dict) -> None:
+    breaker["state"] = OPEN
+    breaker["open_until"] = now + breaker_config["open_seconds"]
+    breaker["probes"] = 0
+    breaker["trips"] += 1
+    pipeline_logger.warning("Circuit opened for %s: %s", host, reason)
+
+
+def before_request(url: str, breaker_config: Dict = BREAKER_CONFIG) -> Optional[float]:
+    """Admit a call to the URL's host, returning the timeout to use
+
+    Raises CircuitOpenError while the circuit is open (or half-open with all
+    probe slots taken). Returns None when breakers are disabled.
+    """
+    if not breaker_config.get("enabled"):
+        return None
+
+    breaker = get_breaker(url, breaker_config)
+    now = time.monotonic()
+    with breaker["lock"]:
+        if breaker["state"] == OPEN:
+            if now < breaker["open_until"]:
+                raise CircuitOpenError(pool_key(url), breaker["open_until"] - now)
+            breaker["state"] = HALF_OPEN
+            breaker["probes"] = 0
+            pipeline_logger.info("Circuit half-open for %s", pool_key(url))
+
+        if breaker["state"] == HALF_OPEN:
+            if breaker["probes"] >= breaker_config["half_open_probes"]:
+                raise CircuitOpenError(pool_key(url), breaker_config["open_seconds"])
+            breaker["probes"] += 1
+
+        return breaker["timeout"]
+
+
+def record_result(url: str, success: bool, latency: float, breaker_config: Dict = BREAKER_CONFIG) -> None:
+    """Feed a call's outcome back into its host's breaker"""
+    if not breaker_config.get("enabled"):
+        return
+
+    host = pool_key(url)
+    breaker = get_breaker(url, breaker_config)
+    now = time.monotonic()
+    with breaker["lock"]:
+        if breaker["state"] == HALF_OPEN:
+            breaker["probes"] = max(breaker["probes"] - 1, 0)
+            if success:
+                breaker["state"] = CLOSED
+                breaker["window"].clear()
+                pipeline_logger.info("Circuit closed for %s", host)
+            else:
+                _open(breaker, host, now, "probe failed", breaker_config)
+            return
+
+        if breaker["state"] == OPEN:
+            # a call admitted before the circuit opened
+            return
+
+        breaker["window"].append((now, success, latency))
+        _prune(breaker, now, breaker_config)
+        window = breaker["window"]
+
+        if len(window) % 10 == 0 or not success:
+            _adapt_timeout(breaker, breaker_config)
+
+        if len(window) < breaker_config["min_requests"]:
+            return
+
+        errors = sum(1 for _, ok, _ in window if not ok)
+        slow = sum(1 for _, _, elapsed in window if elapsed >= breaker_config["slow_call_seconds"])
+        if errors / len(window) >= breaker_config["error_rate_threshold"]:
+            _open(breaker, host, now, f"error rate {errors}/{len(window)}", breaker_config)
+        elif slow / len(window) >= breaker_config["slow_rate_threshold"]:
+            _open(breaker, host, now, f"slow calls {slow}/{len(window)}", breaker_config)
+
+
+def breaker_stats() -> Dict:
+    """State, error rate, latency percentiles and current timeout per host"""
+    now = time.monotonic()
+    stats = {}
+    for host, breaker in list(_breakers.items()):
+        with breaker["lock"]:
+            _prune(breaker, now, BREAKER_CONFIG)
+            window = list(breaker["window"])
+            state = breaker["state"]
+            if state == OPEN and now >= breaker["open_until"]:
+                state = HALF_OPEN
+            latencies = [latency for _, _, latency in window]
+            stats[host] = {
+                "state": state,
+                "requests": len(window),
+                "error_rate": round(sum(1 for _, ok, _ in window if not ok) / len(window), 4) if window else 0.0,
+                "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+                "timeout": round(breaker["timeout"], 3),
+                "trips": breaker["trips"]
+            }
+    return stats
+
+
+def reset_breakers() -> None:
+    with _lock:
+        _breakers.clear()
@@ -0,0 +1,368 @@
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from reverse_proxy.config.consts import CACHE_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.shared_cache import shared_lookup, shared_store, tee_response, file_reader
+
+
+# Shared HTTP cache for upstream responses, bounded by total body bytes.
+# Entries are keyed on (method, url, params, values of the Vary headers); the
+# Vary header names are only known once a response arrives, so they are
+# remembered per (method, url, params). With a shared cache directory
+# configured, misses fall through to the tier shared by every worker process
+# (reverse_proxy/shared_cache.py) and stored entries are written through to it.
+_entries: "OrderedDict[Tuple, Dict]" = OrderedDict()
+_vary: Dict[Tuple, List[str]] = {}
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "revalidated": 0, "stale": 0, "stored": 0, "evictions": 0}
+_size = [0]
+
+# Headers describing the wire encoding of the upstream body, which requests has
+# already decoded by the time the body is cached.
+_ENCODING_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def _stored_headers(headers, directives: Dict[str, Optional[str]]) -> Dict:
+    """Headers kept with an entry: no wire encoding, and no Set-Cookie
+
+    A cookie set for the client that caused the store would otherwise be
+    replayed to every client served from the entry, unless the origin
+    explicitly marked the response public.
+    """
+    keep_cookies = "public" in directives
+    return {
+        k: v for k, v in headers.items()
+        if k.lower() not in _ENCODING_HEADERS and (keep_cookies or k.lower() != "set-cookie")
+    }
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse a Cache-Control header into {directive: argument}"""
+    directives = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _seconds(value: Optional[str]) -> Optional[int]:
+    """Delta-seconds directive argument, None if missing or malformed"""
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers, default_ttl: int = 0) -> Optional[int]:
+    """Seconds a response may be served without revalidation, None if it must not be stored"""
+    directives = parse_cache_control(headers.get("Cache-Control"))
+
+    # This is a shared cache: private responses belong to one client only
+    if "no-store" in directives or "private" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+
+    for directive in ["s-maxage", "max-age"]:
+        lifetime = _seconds(directives.get(directive)) if directive in directives else None
+        if lifetime is not None:
+            return lifetime
+
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            expires_at = parsedate_to_datetime(expires)
+            date = parsedate_to_datetime(headers["Date"]) if headers.get("Date") else None
+            now = date.timestamp() if date else time.time()
+            return max(int(expires_at.timestamp() - now), 0)
+        except (TypeError, ValueError, IndexError):
+            # Invalid Expires means "already expired"
+            return 0
+
+    return default_ttl
+
+
+def _lifetime(headers, cache_config: Dict) -> Optional[int]:
+    """Freshness lifetime, unless the cache config forces one (e.g. media segments)
+
+    A forced TTL never makes a no-store or private response storable.
+    """
+    lifetime = freshness_lifetime(headers, cache_config.get("default_ttl", 0))
+    if lifetime is not None and cache_config.get("force_ttl") is not None:
+        return cache_config["force_ttl"]
+    return lifetime
+
+
+def _primary_key(method: str, url: str, params: Optional[Dict]) -> Tuple:
+    """Cache key before Vary is applied"""
+    return (method.upper(), url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())))
+
+
+def _vary_key(primary: Tuple, vary: List[str], request_headers: CaseInsensitiveDict) -> Tuple:
+    """Full cache key including the request's values for each Vary header"""
+    return primary + tuple((name, request_headers.get(name, "")) for name in vary)
+
+
+def _evict_over_budget(max_bytes: int) -> None:
+    """Drop least recently used entries until the byte budget holds (caller holds the lock)"""
+    while _entries and _size[0] > max_bytes:
+        _, entry = _entries.popitem(last=False)
+        _size[0] -= entry["size"]
+        _counters["evictions"] += 1
+
+
+def cache_lookup(method: str, url: str, params: Optional[Dict], headers: Optional[Dict], cache_config: Dict = CACHE_CONFIG, count: bool = True) -> Optional[Dict]:
+    """Look a request up in the cache
+
+    Returns None when the request bypasses the cache entirely, otherwise a
+    lookup dict with the matching "entry" (or None) and whether it is "fresh".
+    Lookups made on no client's behalf (prefetches) pass count=False to keep
+    them out of the hit ratio.
+    """
+    if not cache_config.get("enabled") or method.upper() not in cache_config.get("methods", []):
+        return None
+
+    request_headers = CaseInsensitiveDict(headers or {})
+    request_directives = parse_cache_control(request_headers.get("Cache-Control"))
+    if "no-store" in request_directives:
+        return None
+
+    primary = _primary_key(method, url, params)
+    now = time.monotonic()
+
+    with _lock:
+        vary = _vary.get(primary, [])
+        key = _vary_key(primary, vary, request_headers)
+        entry = _entries.get(key)
+        if entry:
+            _entries.move_to_end(key)
+
+    revalidate = "no-cache" in request_directives or request_directives.get("max-age") == "0"
+    if entry is None and not revalidate:
+        entry = _shared_entry(primary, request_headers, cache_config)
+
+    fresh = bool(entry) and entry["expires_at"] > now and not revalidate
+    if count:
+        with _lock:
+            _counters["hits" if fresh else "misses"] += 1
+
+    return {
+        "primary": primary,
+        "request_headers": request_headers,
+        "entry": entry,
+        "fresh": fresh,
+        "cache_config": cache_config
+    }
+
+
+def build_cached_response(entry: Dict, status_code: Optional[int] = None) -> requests.Response:
+    """Materialize a cache entry as a requests.Response
+
+    Bodies held in memory come fully read. A large shared-tier body stays in
+    its file, read on demand; the open file and its size are also attached as
+    cached_file so it can be handed to the server as is.
+    """
+    response = requests.Response()
+    response.status_code = status_code or entry["status_code"]
+    response.reason = entry["reason"]
+    response.url = entry["url"]
+    response.encoding = entry["encoding"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.headers["Age"] = str(int(time.monotonic() - entry["stored_at"]) + entry["initial_age"])
+
+    if entry.get("file") is not None and status_code != 304:
+        response.raw = file_reader(entry["file"])
+        response.cached_file = {"file": entry["file"], "size": entry["size"]}
+        return response
+
+    if entry.get("file") is not None:
+        entry["file"].close()
+    response._content = b"" if status_code == 304 else entry["body"]
+    response._content_consumed = True
+    return response
+
+
+def cached_response(lookup: Dict) -> requests.Response:
+    """Serve a fresh hit, answering 304 when the client already holds the same ETag"""
+    entry = lookup["entry"]
+    if_none_match = lookup["request_headers"].get("If-None-Match")
+    if entry["etag"] and if_none_match and entry["etag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return build_cached_response(entry, status_code=304)
+    return build_cached_response(entry)
+
+
+def stale_response(lookup: Optional[Dict]) -> Optional[requests.Response]:
+    """Serve the stale entry of a lookup when the upstream can't be reached, None if there is none"""
+    if not lookup or not lookup["entry"]:
+        return None
+
+    with _lock:
+        _counters["stale"] += 1
+    response = build_cached_response(lookup["entry"])
+    response.headers["Warning"] = '110 - "Response is Stale"'
+    pipeline_logger.warning("Serving stale cached response: %s", lookup['entry']['url'])
+    return response
+
+
+def revalidation_headers(lookup: Optional[Dict], headers: Optional[Dict]) -> Optional[Dict]:
+    """Add If-None-Match / If-Modified-Since for a stale entry that has validators"""
+    if not lookup or not lookup["entry"]:
+        return headers
+
+    entry = lookup["entry"]
+    if not entry["etag"] and not entry["last_modified"]:
+        return headers
+
+    conditional = dict(headers or {})
+    if entry["etag"]:
+        conditional["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        conditional["If-Modified-Since"] = entry["last_modified"]
+    return conditional
+
+
+def _refresh(lookup: Dict, not_modified: requests.Response) -> requests.Response:
+    """Apply a 304's headers to the stale entry and serve it again"""
+    entry = lookup["entry"]
+    merged = CaseInsensitiveDict(entry["headers"])
+    merged.update(_stored_headers(not_modified.headers, parse_cache_control(not_modified.headers.get("Cache-Control"))))
+    lifetime = _lifetime(merged, lookup["cache_config"]) or 0
+
+    with _lock:
+        entry["headers"] = dict(merged)
+        entry["stored_at"] = time.monotonic()
+        entry["initial_age"] = _seconds(not_modified.headers.get("Age")) or 0
+        entry["expires_at"] = entry["stored_at"] + lifetime - entry["initial_age"]
+        _counters["revalidated"] += 1
+        vary = _vary.get(lookup["primary"], [])
+
+    shared_store(lookup["primary"], vary, lookup["request_headers"], entry)
+    not_modified.close()
+    pipeline_logger.info("Revalidated cached response: %s", entry['url'])
+    return cached_response(lookup)
+
+
+def cache_store(lookup: Optional[Dict], response: requests.Response, stream: bool = False) -> requests.Response:
+    """Store a cacheable upstream response and return the response to use
+
+    A 304 to our own conditional request refreshes the stale entry instead.
+    Streamed responses are only stored when their declared length fits the
+    per-entry limit, so large bodies keep streaming untouched.
+    """
+    if not lookup:
+        return response
+
+    if response.status_code == 304 and lookup["entry"]:
+        return _refresh(lookup, response)
+
+    cache_config = lookup["cache_config"]
+    if response.status_code not in cache_config.get("statuses", []):
+        return response
+
+    request_headers = lookup["request_headers"]
+    directives = parse_cache_control(response.headers.get("Cache-Control"))
+    if "Authorization" in request_headers and "public" not in directives and "s-maxage" not in directives:
+        return response
+
+    vary = [name.strip() for name in response.headers.get("Vary", "").split(",") if name.strip()]
+    if "*" in vary:
+        return response
+
+    lifetime = _lifetime(response.headers, cache_config)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if lifetime is None or (lifetime == 0 and not etag and not last_modified):
+        return response
+
+    now = time.monotonic()
+    initial_age = _seconds(response.headers.get("Age")) or 0
+    entry = {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "url": response.url,
+        "encoding": response.encoding,
+        "headers": _stored_headers(response.headers, directives),
+        "body": None,
+        "size": 0,
+        "etag": etag,
+        "last_modified": last_modified,
+        "stored_at": now,
+        "initial_age": initial_age,
+        "expires_at": now + lifetime - initial_age
+    }
+
+    max_entry_bytes = cache_config.get("max_entry_bytes", 0)
+    if stream:
+        declared = _seconds(response.headers.get("Content-Length"))
+        if declared is None or declared > max_entry_bytes:
+            # too large to buffer in every worker, the shared tier can still take it as it streams by
+            # the client that caused the store still gets its Set-Cookie
+            relayed = {k: v for k, v in response.headers.items() if k.lower() not in _ENCODING_HEADERS}
+            return tee_response(response, lookup["primary"], vary, request_headers, entry, relayed)
+
+    body = response.content
+    entry["body"] = body
+    entry["size"] = len(body)
+    if len(body) <= max_entry_bytes:
+        _insert(lookup["primary"], vary, request_headers, entry, cache_config)
+    shared_store(lookup["primary"], vary, request_headers, entry)
+
+    return response
+
+
+def _insert(primary: Tuple, vary: List[str], request_headers: CaseInsensitiveDict, entry: Dict, cache_config: Dict) -> None:
+    with _lock:
+        _vary[primary] = vary
+        key = _vary_key(primary, vary, request_headers)
+        previous = _entries.pop(key, None)
+        if previous:
+            _size[0] -= previous["size"]
+        _entries[key] = entry
+        _size[0] += entry["size"]
+        _counters["stored"] += 1
+        _evict_over_budget(cache_config.get("max_bytes", 0))
+
+
+def _shared_entry(primary: Tuple, request_headers: CaseInsensitiveDict, cache_config: Dict) -> Optional[Dict]:
+    """Entry another worker stored, small bodies are copied into this process's cache"""
+    entry = shared_lookup(primary, request_headers)
+    if entry is None:
+        return None
+
+    vary = entry.pop("vary")
+    if entry["body"] is not None and entry["size"] <= cache_config.get("max_entry_bytes", 0):
+        _insert(primary, vary, request_headers, entry, cache_config)
+    return entry
+
+
+def cache_stats() -> Dict:
+    """Hit ratio, counters and memory usage of the response cache"""
+    with _lock:
+        stats = dict(_counters)
+        stats["entries"] = len(_entries)
+        stats["bytes"] = _size[0]
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round((stats["hits"] + stats["revalidated"]) / lookups, 4) if lookups else 0.0
+    stats["max_bytes"] = CACHE_CONFIG.get("max_bytes")
+    return stats
+
+
+def clear_cache() -> None:
+    """Drop every entry and reset the counters"""
+    with _lock:
+        _entries.clear()
+        _vary.clear()
+        _size[0] = 0
+        for name in _counters:
+            _counters[name] = 0
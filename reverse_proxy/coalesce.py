@@ -0,0 +1,140 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from reverse_proxy.config.consts import COALESCE_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+
+
+# Single-flight for upstream calls: the first request for a key (the leader)
+# calls the upstream, identical requests arriving while it is in flight
+# (followers) wait for it and get their own copy of its response or error.
+_calls: Dict[Tuple, Dict] = {}
+_lock = threading.Lock()
+_counters = {"leaders": 0, "followers": 0, "timeouts": 0, "unshared": 0}
+
+# Conditional headers change what the upstream answers, so they always key
+CONDITIONAL_HEADERS = ["If-None-Match", "If-Modified-Since"]
+
+
+def coalesce_key(method: str, url: str, params: Optional[Dict], headers: Optional[Dict], coalesce_config: Dict = COALESCE_CONFIG) -> Optional[Tuple]:
+    """Key identical requests share, None if the request must not be coalesced"""
+    method = method.upper()
+    if not coalesce_config.get("enabled") or method not in coalesce_config.get("methods", []):
+        return None
+
+    headers = CaseInsensitiveDict(headers or {})
+    key_params = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())) if coalesce_config.get("key_params", True) else ()
+    key_headers = tuple(headers.get(name, "") for name in coalesce_config.get("key_headers", []) + CONDITIONAL_HEADERS)
+    return (method, url, key_params, key_headers)
+
+
+def _snapshot(response: requests.Response, stream: bool, coalesce_config: Dict) -> Optional[Dict]:
+    """Buffer the leader's response for followers, None if the body is too large to share"""
+    if stream:
+        try:
+            declared = int(response.headers.get("Content-Length"))
+        except (TypeError, ValueError):
+            return None
+        if declared > coalesce_config.get("max_body_bytes", 0):
+            return None
+
+    return {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "url": response.url,
+        "encoding": response.encoding,
+        "headers": dict(response.headers),
+        # reading .content here leaves the leader's own response fully usable
+        "body": response.content
+    }
+
+
+def _copy(snapshot: Dict) -> requests.Response:
+    """Independent, fully-read response for one follower"""
+    response = requests.Response()
+    response.status_code = snapshot["status_code"]
+    response.reason = snapshot["reason"]
+    response.url = snapshot["url"]
+    response.encoding = snapshot["encoding"]
+    response.headers = CaseInsensitiveDict(snapshot["headers"])
+    response._content = snapshot["body"]
+    response._content_consumed = True
+    return response
+
+
+def single_flight(key: Optional[Tuple], fetch: Callable[[], requests.Response], stream: bool = False, coalesce_config: Dict = COALESCE_CONFIG) -> requests.Response:
+    """Call fetch once per key at a time, sharing the result with concurrent callers
+
+    Followers that time out, or whose leader got a body too large to share,
+    call fetch themselves.
+    """
+    if key is None:
+        return fetch()
+
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = {"done": threading.Event(), "snapshot": None, "error": None, "waiting": 0}
+            _calls[key] = call
+            _counters["leaders"] += 1
+        else:
+            call["waiting"] += 1
+
+    if leader:
+        try:
+            response = fetch()
+            with _lock:
+                share = call["waiting"] > 0
+                # nobody to share with: leave a streamed body unread, later callers lead their own call
+                if not share:
+                    _calls.pop(key, None)
+            if share:
+                call["snapshot"] = _snapshot(response, stream, coalesce_config)
+            return response
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with _lock:
+                _calls.pop(key, None)
+            call["done"].set()
+
+    if not call["done"].wait(coalesce_config.get("follower_timeout")):
+        with _lock:
+            _counters["timeouts"] += 1
+            call["waiting"] -= 1
+        pipeline_logger.warning("Coalesced request timed out waiting for %s, calling upstream", key[1])
+        return fetch()
+
+    if call["error"] is not None:
+        with _lock:
+            _counters["followers"] += 1
+        raise call["error"]
+
+    if call["snapshot"] is None:
+        with _lock:
+            _counters["unshared"] += 1
+        return fetch()
+
+    with _lock:
+        _counters["followers"] += 1
+    return _copy(call["snapshot"])
+
+
+def coalesce_stats() -> Dict:
+    """Leader/follower counters, "saved" is the number of upstream calls avoided"""
+    with _lock:
+        stats = dict(_counters)
+        stats["in_flight"] = len(_calls)
+    stats["saved"] = stats["followers"]
+    return stats
+
+
+def reset_coalesce_stats() -> None:
+    with _lock:
+        for name in _counters:
+            _counters[name] = 0
@@ -0,0 +1,184 @@
+import itertools
+import zlib
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from urllib3.util.request import ACCEPT_ENCODING
+
+from reverse_proxy.config.consts import COMPRESSION_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.streams import ClosingStream, AsyncClosingStream
+
+
+# Content codings urllib3 can decode here (brotli / zstandard are optional
+# installs), so any body we ask the origin for can still be transformed.
+DECODABLE_ENCODINGS = [encoding.strip() for encoding in ACCEPT_ENCODING.split(",")]
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def client_accepts(accept_encoding: Optional[str], coding: str) -> bool:
+    accepted = parse_accept_encoding(accept_encoding)
+    q = accepted.get(coding, accepted.get("*", 0.0))
+    return q > 0
+
+
+def upstream_accept_encoding(client_header: Optional[str], compression_config: Dict = COMPRESSION_CONFIG) -> Optional[str]:
+    """Accept-Encoding to send upstream
+
+    Asks for every coding we can decode, preferring the ones the client also
+    accepts so the body can usually be passed through untouched.
+    """
+    if not compression_config.get("enabled"):
+        return None
+    preferred: List[str] = []
+    fallback: List[str] = []
+    for coding in DECODABLE_ENCODINGS:
+        (preferred if client_accepts(client_header, coding) else fallback).append(coding)
+    return ", ".join(preferred + [f"{coding};q=0.5" for coding in fallback])
+
+
+def content_coding(headers) -> Optional[str]:
+    """The single content coding of a response, None for identity"""
+    coding = (headers.get("Content-Encoding") or "").strip().lower()
+    return None if coding in ("", "identity") else coding
+
+
+def can_pass_through(headers, accept_encoding: Optional[str], compression_config: Dict = COMPRESSION_CONFIG) -> bool:
+    """Whether an encoded upstream body can go to the client as-is"""
+    coding = content_coding(headers)
+    return (
+        bool(compression_config.get("enabled") and compression_config.get("passthrough"))
+        and coding is not None
+        and "," not in coding
+        and client_accepts(accept_encoding, coding)
+    )
+
+
+def is_compressible(content_type: Optional[str], compression_config: Dict = COMPRESSION_CONFIG) -> bool:
+    content_type = (content_type or "").lower()
+    return any(content_type.startswith(prefix) for prefix in compression_config.get("types", []))
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a byte stream incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compressed_chunks():
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    # pass a client disconnect on to the source stream
+    return ClosingStream(compressed_chunks(), source=chunks)
+
+
+def _prepend(head: List[bytes], chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # unlike itertools.chain, passes close() on to the source stream
+    return ClosingStream(itertools.chain(head, chunks), source=chunks)
+
+
+def may_compress(response: Dict, accept_encoding: Optional[str], compression_config: Dict = COMPRESSION_CONFIG) -> bool:
+    """Whether compress_stream_response would consider gzipping this response, decided from headers only"""
+    if not compression_config.get("enabled") or response.get("content_encoding") or response.get("stream") is None:
+        return False
+    if not (content_coding(response.get("headers") or {}) or compression_config.get("compress_uncompressed")):
+        return False
+    return is_compressible(response.get("content_type")) and client_accepts(accept_encoding, "gzip")
+
+
+def compress_stream_response(response: Dict, accept_encoding: Optional[str], compression_config: Dict = COMPRESSION_CONFIG) -> Dict:
+    """Gzip a decoded streamed response for the client
+
+    Applies to bodies the origin compressed but that had to be decoded (for
+    a transform, or a coding the client doesn't take) and, when
+    compress_uncompressed is set, to identity bodies. Bodies under min_size
+    are left alone; the first min_size bytes are read ahead to decide.
+    """
+    if not may_compress(response, accept_encoding, compression_config):
+        return response
+
+    chunks = iter(response["stream"])
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= compression_config.get("min_size", 0):
+            break
+
+    if size < compression_config.get("min_size", 0):
+        response["stream"] = _prepend(head, chunks)
+        return response
+
+    response["stream"] = gzip_stream(_prepend(head, chunks), compression_config.get("level", 6))
+    response["content_encoding"] = "gzip"
+    pipeline_logger.info("Compressing response with gzip")
+    return response
+
+
+def gzip_stream_async(chunks: AsyncIterable[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """gzip_stream for an async byte stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    async def compressed_chunks():
+        async for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    return AsyncClosingStream(compressed_chunks(), source=chunks)
+
+
+def _prepend_async(head: List[bytes], chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    async def joined():
+        for chunk in head:
+            yield chunk
+        async for chunk in chunks:
+            yield chunk
+
+    return AsyncClosingStream(joined(), source=chunks)
+
+
+async def compress_stream_response_async(response: Dict, accept_encoding: Optional[str], compression_config: Dict = COMPRESSION_CONFIG) -> Dict:
+    """compress_stream_response for a response whose "stream" is an async chunk iterator"""
+    if not may_compress(response, accept_encoding, compression_config):
+        return response
+
+    chunks = response["stream"]
+    head = []
+    size = 0
+    while size < compression_config.get("min_size", 0):
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            break
+        head.append(chunk)
+        size += len(chunk)
+
+    if size < compression_config.get("min_size", 0):
+        response["stream"] = _prepend_async(head, chunks)
+        return response
+
+    response["stream"] = gzip_stream_async(_prepend_async(head, chunks), compression_config.get("level", 6))
+    response["content_encoding"] = "gzip"
+    pipeline_logger.info("Compressing response with gzip")
+    return response
@@ -1,3 +1,5 @@
+import os
+
 ROUTE_CONFIG = {
     "/google": "https://www.google.com",
     "/hollandandbarrett": "https://www.hollandandbarrett.com/",
@@ -5,4 +7,194 @@ ROUTE_CONFIG = {
     "/jsonplaceholder": "https://jsonplaceholder.typicode.com/posts"
 }
 
-VALID_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS']
\ No newline at end of file
+VALID_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS']
+
+# Client headers the HTTP adapters (Flask / ASGI) never forward upstream
+# (Accept-Encoding is kept for negotiation and rewritten by prepare_request_headers)
+HEADERS_TO_SKIP = [
+    'Host',
+    'Content-Length',
+    'Connection',
+    'Transfer-Encoding'
+]
+
+# Upstream connection pooling (one keep-alive session per target host)
+POOL_CONFIG = {
+    "pool_size": 10,                    # idle keep-alive connections retained per host
+    "max_connections_per_host": None,   # hard cap, blocks callers once reached (None = no cap)
+    "max_idle_seconds": 60,             # recycle a host's pool after this long unused
+    "max_age_seconds": 300,             # recycle a host's pool after this long regardless
+    "prewarm": True,                    # open pools for every route at startup
+    "prewarm_timeout": 5
+}
+
+# Streaming pass-through: bytes read from the upstream per chunk sent to the client
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# In-process upstream response cache (between routing and execution)
+CACHE_CONFIG = {
+    "enabled": True,
+    "max_bytes": 64 * 1024 * 1024,       # total body bytes held before LRU eviction
+    "max_entry_bytes": 4 * 1024 * 1024,  # larger bodies are never cached
+    "default_ttl": 0,                    # freshness for responses without Cache-Control/Expires
+    "methods": ['GET', 'HEAD'],
+    "statuses": [200, 203, 300, 301, 308]
+}
+
+# Memoized transform_response output, keyed on body digest + transform options
+TRANSFORM_CACHE_CONFIG = {
+    "enabled": True,
+    "max_bytes": 32 * 1024 * 1024,       # memory held by cached transformed bodies
+    "max_entry_bytes": 4 * 1024 * 1024
+}
+
+# Route table file (JSON or YAML) replacing ROUTE_CONFIG, reloadable at runtime
+ROUTES_FILE = os.getenv("REVERSE_PROXY_ROUTES_FILE")
+ROUTES_WATCH_INTERVAL = float(os.getenv("REVERSE_PROXY_ROUTES_WATCH_INTERVAL", "0"))  # seconds, 0 disables
+
+# Named upstream groups, routed to with an "upstream://<group>/<path>" target, e.g.
+#   "api": {
+#       "strategy": "least_outstanding",   # round_robin | weighted | least_outstanding | p2c
+#       "targets": [{"url": "https://api-1.example.com", "weight": 3}, {"url": "https://api-2.example.com"}],
+#       "health_check": {"path": "/health", "interval": 10}
+#   }
+UPSTREAM_GROUPS = {}
+
+UPSTREAM_DEFAULTS = {
+    "strategy": "round_robin",
+    "max_consecutive_failures": 5,   # passive outlier ejection after this many errors/timeouts in a row
+    "base_ejection_seconds": 30,     # doubles with every repeated ejection
+    "max_ejection_seconds": 300,
+    "health_check": {
+        "path": None,                # None disables active checks for the group
+        "interval": 10,
+        "timeout": 2,
+        "unhealthy_threshold": 2,
+        "healthy_threshold": 2
+    }
+}
+
+METRICS_CONFIG = {
+    "enabled": True,
+    # histogram bucket upper bounds in seconds, shared by request and stage timings
+    "buckets": [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+}
+
+# Single-flight: concurrent identical requests share one upstream call
+COALESCE_CONFIG = {
+    "enabled": True,
+    "methods": ["GET", "HEAD"],
+    "key_params": True,                  # include query params in the key
+    "key_headers": ["Accept", "Accept-Language", "Authorization", "Cookie"],
+    "follower_timeout": 10,              # seconds a follower waits before calling the upstream itself
+    "max_body_bytes": 4 * 1024 * 1024    # streamed bodies are only shared when their Content-Length fits
+}
+
+COMPRESSION_CONFIG = {
+    "enabled": True,
+    "passthrough": True,             # relay bodies the origin compressed without decoding them
+    "compress_uncompressed": False,  # also gzip bodies the origin sent uncompressed
+    "min_size": 1024,                # bytes, smaller bodies are sent uncompressed
+    "level": 6,
+    "types": ["text/", "application/json", "application/javascript", "application/xml", "image/svg+xml"]
+}
+
+# Rate limits (GCRA), checked after routing and before any upstream work.
+# Every matching rule must allow a request, e.g.
+#   {"name": "hb-per-client", "routes": ["/hollandandbarrett"], "key": "client_ip", "rate": 5, "burst": 10}
+#   {"name": "api-keys", "key": "header:X-Api-Key", "rate": 50, "burst": 100}
+# "key" is "route", "client_ip" or "header:<name>" (falling back to the client IP
+# when the header is missing); "routes" lists route patterns, omitted for all.
+RATE_LIMIT_CONFIG = {
+    "enabled": True,
+    "backend": os.getenv("REVERSE_PROXY_RATE_LIMIT_BACKEND", "memory"),   # memory | redis
+    "redis_url": os.getenv("REVERSE_PROXY_REDIS_URL", "redis://localhost:6379/0"),
+    "trust_forwarded_for": False,   # take the client IP from X-Forwarded-For
+    "max_keys": 100000,             # memory backend sweeps idle keys past this many
+    "rules": []
+}
+
+# Per-host circuit breakers and adaptive timeouts
+BREAKER_CONFIG = {
+    "enabled": True,
+    "window_seconds": 30,            # sliding window of recent calls per host
+    "max_samples": 200,
+    "min_requests": 20,              # calls needed in the window before the breaker can trip
+    "error_rate_threshold": 0.5,     # trip when this share of calls failed...
+    "slow_call_seconds": 5,
+    "slow_rate_threshold": 0.8,      # ...or this share took longer than slow_call_seconds
+    "open_seconds": 30,              # fail fast this long before letting probes through
+    "half_open_probes": 1,
+    "serve_stale": True,             # answer from a stale cache entry while open
+    # timeout = p99 latency * multiplier, kept within [min_timeout, max_timeout]
+    "timeout_multiplier": 3,
+    "min_timeout": 1,
+    "max_timeout": 30
+}
+
+# Retries and hedging for idempotent requests. Routes override per route with
+# "retries": n, "hedge": true | {"delay": seconds} and "alternate": "https://mirror..."
+RETRY_CONFIG = {
+    "methods": ["GET", "HEAD", "OPTIONS"],
+    "retries": 1,                    # extra attempts after an upstream failure
+    "base_backoff": 0.05,            # seconds, doubled per attempt with full jitter
+    "max_backoff": 1.0,
+    # retry budget shared by every route: each request earns budget_ratio of a
+    # retry, plus min_per_second, up to budget_cap; a retry or hedge spends one
+    "budget_ratio": 0.1,
+    "min_per_second": 10,
+    "budget_cap": 100,
+    # hedges fire after the route's p95 upstream latency once min_samples are known
+    "hedge_min_samples": 20
+}
+
+# POST /proxy/batch: independent proxy calls fanned out over a shared pool
+BATCH_CONFIG = {
+    "max_items": 50,                 # larger batches are rejected with 400
+    "workers": 16,                   # proxy calls in flight across every batch in the process
+    "per_batch": 4,                  # proxy calls in flight for any one batch
+    "default_deadline": 10,          # seconds for the whole batch, items still running get 504
+    "max_deadline": 60
+}
+
+# Streaming-media mode for routes marked {"media": true} (HLS/DASH): playlists
+# and manifests are cached briefly whatever the origin says, segments as
+# immutable, and the newest segments a playlist refresh reveals are fetched
+# into the cache before players ask for them
+MEDIA_CONFIG = {
+    "playlist_ttl": 1,                        # seconds a playlist / manifest is served from cache
+    "segment_ttl": 300,                       # segments never change once published
+    "max_segment_bytes": 16 * 1024 * 1024,    # larger segments are neither cached nor shared
+    "prefetch_segments": 3,                   # segments prefetched per playlist refresh
+    "prefetch_workers": 8,
+    "max_playlists": 1000,                    # playlists whose segments are tracked
+    "playlist_extensions": [".m3u8", ".mpd"],
+    "segment_extensions": [".ts", ".m4s", ".mp4", ".m4a", ".m4v", ".aac", ".mp3", ".vtt", ".webvtt", ".cmfv", ".cmfa"]
+}
+
+# Response cache tier shared by every worker process on the host, behind the
+# in-process cache: a memory-mapped slot index plus one file per body under
+# directory. Unset REVERSE_PROXY_SHARED_CACHE_DIR to keep caches per process
+SHARED_CACHE_CONFIG = {
+    "directory": os.getenv("REVERSE_PROXY_SHARED_CACHE_DIR"),
+    "max_bytes": 1024 * 1024 * 1024,           # body bytes on disk before sampled-LRU eviction
+    "max_entry_bytes": 256 * 1024 * 1024,      # bodies above the in-process limit are teed to disk while streaming
+    "slots": 65536,                            # index entries, fixed once the index file exists
+    "zero_copy_min_bytes": 64 * 1024,          # larger hits are sent from their file, smaller ones are loaded into the process
+    "fsync": False                             # fsync bodies before publishing them (survives power loss, not just crashes)
+}
+
+# Stages a route's requests go through when it doesn't list its own
+# ("stages": [...] on the route, see reverse_proxy/stages.py)
+DEFAULT_STAGES = ["ratelimit", "cache", "upstream", "transform", "compress"]
+
+# Log output (reverse_proxy/config/logging.py). Records are handed to a
+# background writer thread, formatting and I/O happen off the request path.
+LOGGING_CONFIG = {
+    "level": os.getenv("REVERSE_PROXY_LOG_LEVEL", "INFO"),
+    "format": os.getenv("REVERSE_PROXY_LOG_FORMAT", "json"),   # json | text
+    "async": os.getenv("REVERSE_PROXY_LOG_ASYNC", "1") != "0",  # 0 writes on the logging thread
+    "queue_size": 10000,          # records waiting for the writer, newer ones are dropped when full
+    "sample_rate": 1.0,           # fraction of requests whose INFO/DEBUG lines are kept, warnings and errors always are
+    "route_sample_rates": {}      # route pattern -> sample rate, e.g. {"/google": 0.01}
+}
@@ -1,5 +1,208 @@
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from uuid import uuid4
+
+from reverse_proxy.config.consts import LOGGING_CONFIG
+
+
+# Log pipeline: request threads only build a LogRecord, stamp it with the
+# current request's ID and route and put it on a bounded queue. A background
+# thread formats (lazily, %-style args are only interpolated there) and
+# writes it, as JSON lines by default:
+#
+#   {"time": "...", "level": "INFO", "logger": "pipeline", "message": "Validated: GET /google", "request_id": "9f0c...", "route": "/google"}
+#
+# Adapters bind a request ID per client request (bind_request, taken from
+# X-Request-ID when the client sends one). INFO/DEBUG lines are sampled per
+# request, LOGGING_CONFIG["route_sample_rates"] overriding "sample_rate" once
+# the request is routed, so a request's lines are kept or dropped together.
+# Warnings and errors are always kept. When the queue is full records are
+# dropped and counted rather than blocking the request.
+
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(request_id)s:%(message)s"
+STOP_TIMEOUT = 5  # seconds stop_logging waits for the writer to make room in a full queue
+
+_request = contextvars.ContextVar("log_request", default=None)
+
+_state = {"handler": None, "listener": None, "queue": None, "config": None}
+_stats = {"dropped": 0, "sampled_out": 0}
+_lock = threading.Lock()
+
+
+def bind_request(request_id: Optional[str] = None) -> contextvars.Token:
+    """Start a request's log context, with a new ID unless one is given
+
+    Returns the token for reset_request.
+    """
+    return _request.set({"request_id": request_id or uuid4().hex, "route": None, "draw": random.random()})
+
+
+def reset_request(token: contextvars.Token) -> None:
+    _request.reset(token)
+
+
+def current_request_id() -> Optional[str]:
+    context = _request.get()
+    return context["request_id"] if context else None
+
+
+def set_log_route(pattern: str) -> None:
+    """Record the matched route, its sample rate applies to the rest of the request"""
+    context = _request.get()
+    if context:
+        context["route"] = pattern
+
+
+def header_request_id(headers: Optional[Dict]) -> Optional[str]:
+    """The client's X-Request-ID, if it is usable as one"""
+    for name, value in (headers or {}).items():
+        if name.lower() == "x-request-id":
+            if isinstance(value, str) and 0 < len(value) <= 128 and value.isprintable():
+                return value
+            return None
+    return None
+
+
+def _sample_rate(route: Optional[str], config: Dict) -> float:
+    if route is not None and route in config["route_sample_rates"]:
+        return config["route_sample_rates"][route]
+    return config["sample_rate"]
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the request ID and route, drops unsampled INFO/DEBUG lines"""
+
+    def __init__(self, config: Dict):
+        super().__init__()
+        self.config = config
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request.get()
+        record.request_id = context["request_id"] if context else None
+        record.route = context["route"] if context else None
+        if context and record.levelno < logging.WARNING and context["draw"] >= _sample_rate(context["route"], self.config):
+            with _lock:
+                _stats["sampled_out"] += 1
+            return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in ["request_id", "route"]:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _Enqueue(QueueHandler):
+    """QueueHandler that leaves formatting to the writer thread and never blocks"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _lock:
+                _stats["dropped"] += 1
+
+
+class _Writer(QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of raising queue.Full"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel, timeout=STOP_TIMEOUT)
+
+
+def _writer_handler(config: Dict) -> logging.Handler:
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if config["format"] == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def _start_writer(handler: logging.Handler, config: Dict) -> None:
+    records = queue.Queue(maxsize=config["queue_size"])
+    listener = _Writer(records, _writer_handler(config))
+    handler.queue = records
+    _state.update(listener=listener, queue=records)
+    listener.start()
+
+
+def configure_logging(config: Dict = LOGGING_CONFIG) -> None:
+    """Install the log pipeline on the root logger, replacing a previous one"""
+    root = logging.getLogger()
+    stop_logging()
+
+    if config["async"]:
+        handler = _Enqueue(None)
+        _start_writer(handler, config)
+    else:
+        handler = _writer_handler(config)
+    handler.addFilter(RequestContextFilter(config))
+
+    root.addHandler(handler)
+    root.setLevel(config["level"])
+    _state.update(handler=handler, config=config)
+
+
+def stop_logging() -> None:
+    """Write out queued records and remove the pipeline's handler"""
+    listener = _state["listener"]
+    if listener is not None:
+        try:
+            listener.stop()
+        except queue.Full:
+            # the writer made no progress for STOP_TIMEOUT, give up on what is queued
+            pass
+    if _state["handler"] is not None:
+        logging.getLogger().removeHandler(_state["handler"])
+    _state.update(handler=None, listener=None, queue=None)
+
+
+def flush_logs() -> None:
+    """Block until the writer has written every queued record (e.g. before a Lambda freezes)"""
+    if _state["listener"] is not None:
+        _state["queue"].join()
+
+
+def log_stats() -> Dict:
+    with _lock:
+        stats = dict(_stats)
+    stats["queued"] = _state["queue"].qsize() if _state["queue"] is not None else 0
+    return stats
+
+
+def _restart_writer() -> None:
+    # the writer thread doesn't survive fork, forked workers start their own
+    if _state["listener"] is not None:
+        _start_writer(_state["handler"], _state["config"])
+
+
+configure_logging()
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_writer)
 
-logging.basicConfig(level=logging.INFO)
 adapter_logger = logging.getLogger("adapter")
 pipeline_logger = logging.getLogger("pipeline")
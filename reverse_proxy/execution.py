@@ -1,9 +1,13 @@
 import json
 import logging
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
+from reverse_proxy.config.consts import STREAM_CHUNK_SIZE, BREAKER_CONFIG
 from reverse_proxy.validate import is_valid_url
+from reverse_proxy.pool import get_session
 from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.compression import upstream_accept_encoding, can_pass_through, content_coding
+from reverse_proxy.streams import ClosingStream
 
 
 def prepare_request_body(data: Any, headers: Optional[Dict]) -> Any:
@@ -19,18 +23,14 @@ def prepare_request_body(data: Any, headers: Optional[Dict]) -> Any:
     return data 
 
 
-def execute_request(method: str, url: str, params=None, data=None, headers=None) -> requests.Response:
-    """Execute HTTP request to target server"""
-    if not is_valid_url(url): 
-        raise ValueError(f"Invalid URL: {url}")
-
-    prepared_data = prepare_request_body(data, headers)
-
+def prepare_request_headers(headers: Optional[Dict]) -> Dict:
+    """Strip headers that must not be forwarded and fill in the essentials"""
     if headers is None:
         headers = {}
     
-    # Remove Flask-specific headers that might cause issues
-    headers_to_remove = ['Host', 'Content-Length']
+    # Remove Flask-specific and hop-by-hop headers that might cause issues
+    # (a forwarded "Connection: close" would defeat upstream keep-alive)
+    headers_to_remove = ['Host', 'Content-Length', 'Connection', 'Keep-Alive']
     for header in headers_to_remove:
         headers.pop(header, None)
     
@@ -40,54 +40,155 @@ def execute_request(method: str, url: str, params=None, data=None, headers=None)
     
     if 'Accept' not in headers:
         headers['Accept'] = '*/*'
-    pipeline_logger.info(f"Executing: {method.upper()} {url}")
+
+    # Ask for codings we can decode, preferring those the client can take as-is
+    client_encoding = headers.pop('Accept-Encoding', None) or headers.pop('accept-encoding', None)
+    accept_encoding = upstream_accept_encoding(client_encoding)
+    if accept_encoding:
+        headers['Accept-Encoding'] = accept_encoding
+
+    return headers
+
+
+def execute_request(method: str, url: str, params=None, data=None, headers=None, stream: bool = False, timeout: Optional[float] = None) -> requests.Response:
+    """Execute HTTP request to target server
+
+    With stream=True only the status line and headers are read, the body is
+    left on the (pooled) connection for stream_response to consume. timeout
+    (seconds) defaults to the circuit breaker ceiling.
+    """
+    if not is_valid_url(url): 
+        raise ValueError(f"Invalid URL: {url}")
+
+    prepared_data = prepare_request_body(data, headers)
+    headers = prepare_request_headers(headers)
+    pipeline_logger.info("Executing: %s %s", method.upper(), url)
 
     try: 
-        response = requests.request(
+        response = get_session(url).request(
             method=method.upper(), 
             url=url,
             params=params,
             data=prepared_data, 
             headers=headers,
-            timeout=30
+            timeout=timeout or BREAKER_CONFIG["max_timeout"],
+            stream=stream
         )
+        if stream and response.status_code >= 400:
+            # never read, so release the connection before raising
+            response.close()
         response.raise_for_status()
         return response
 
     except requests.exceptions.RequestException as e: 
-        pipeline_logger.error(f"Request failed: {e}")
+        pipeline_logger.error("Request failed: %s", e)
         raise
 
 
-def parse_response(response: requests.Response) -> Dict: 
-    """Parse HTTP response into structured dict"""
-    content_type = response.headers.get("Content-Type", "")
-
-    result = {
-        "status_code": response.status_code, 
-        "headers": dict(response.headers), 
-        "content_type": content_type, 
-        "text": response.text,
-        "json": None, 
-        "content": None
-    }
+def decode_body(body: bytes, encoding: Optional[str]) -> str:
+    """Decode a body with its declared charset, UTF-8 otherwise
 
-    if "application/json" in content_type:
-        try: 
-            result["json"] = response.json()
-            result["content"] = result["json"]
-            pipeline_logger.info("Parsed JSON response")
-        except json.JSONDecodeError:
-            result["content"] = response.text
-            pipeline_logger.warning("Failed to parse JSON, using text")
+    Charset detection only runs for undeclared bodies that aren't valid UTF-8.
+    """
+    if encoding:
+        return str(body, encoding, errors="replace")
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        detected = requests.compat.chardet.detect(body)["encoding"] if requests.compat.chardet else None
+        return str(body, detected or "latin-1", errors="replace")
 
-    
-    elif "text" in content_type or "html" in content_type: 
-        result["content"] = response.text
-        pipeline_logger.info("Parsed text/HTML response")
 
+def _is_text(content_type: str) -> bool:
+    return "text" in content_type or "html" in content_type
 
-    else: 
-        result["content"] = response.text
-    
-    return result
\ No newline at end of file
+
+class LazyResponse(dict):
+    """Response dict that decodes "text", "json" and "content" from the raw body on first access
+
+    "body" holds the upstream bytes untouched; stages that never look at the
+    text (e.g. an untransformed pass-through) never pay for decoding it.
+    Assigning any of the lazy keys replaces the decoded value as usual.
+    """
+
+    LAZY_KEYS = ("text", "json", "content")
+
+    def __missing__(self, key):
+        if key not in self.LAZY_KEYS:
+            raise KeyError(key)
+
+        body = self.get("body")
+        content_type = self.get("content_type", "")
+        if key == "text":
+            value = decode_body(body, self.get("encoding")) if body is not None else None
+
+        elif key == "json":
+            value = None
+            if body and "application/json" in content_type:
+                try:
+                    value = json.loads(body)
+                    pipeline_logger.info("Parsed JSON response")
+                except ValueError:
+                    pipeline_logger.warning("Failed to parse JSON, using text")
+
+        else:
+            # JSON bodies parse to objects, binary bodies stay bytes
+            if "application/json" in content_type and self["json"] is not None:
+                value = self["json"]
+            elif "application/json" in content_type or _is_text(content_type):
+                value = self["text"]
+            else:
+                value = body
+
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        if key in self.LAZY_KEYS and not dict.__contains__(self, key):
+            return self[key]
+        return super().get(key, default)
+
+
+def parse_response(response: requests.Response) -> Dict: 
+    """Parse HTTP response into structured dict, decoding text/JSON lazily"""
+    return LazyResponse(
+        status_code=response.status_code, 
+        headers=dict(response.headers), 
+        content_type=response.headers.get("Content-Type", ""), 
+        encoding=response.encoding,
+        body=response.content
+    )
+
+
+def iter_response_body(response: requests.Response, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the upstream body chunk by chunk, releasing the connection when done or closed"""
+    chunks = (chunk for chunk in response.iter_content(chunk_size=chunk_size) if chunk)
+    return ClosingStream(chunks, lambda error: response.close())
+
+
+def iter_raw_body(response: requests.Response, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the upstream body exactly as sent, still content-encoded"""
+    chunks = (chunk for chunk in response.raw.stream(chunk_size, decode_content=False) if chunk)
+    return ClosingStream(chunks, lambda error: response.close())
+
+
+def stream_response(response: requests.Response, chunk_size: int = STREAM_CHUNK_SIZE, accept_encoding: Optional[str] = None) -> Dict:
+    """Wrap a streamed HTTP response into the structured dict without reading the body
+
+    Same shape as parse_response, but text/json/content stay None and the body
+    is exposed as a lazy byte-chunk generator under "stream". A compressed
+    body the client accepts (accept_encoding) is passed through still encoded,
+    "content_encoding" then names its coding.
+    """
+    passthrough = not getattr(response, "_content_consumed", False) and can_pass_through(response.headers, accept_encoding)
+    return {
+        "status_code": response.status_code,
+        "headers": dict(response.headers),
+        "content_type": response.headers.get("Content-Type", ""),
+        "text": None,
+        "json": None,
+        "content": None,
+        "encoding": response.encoding,
+        "content_encoding": content_coding(response.headers) if passthrough else None,
+        "stream": iter_raw_body(response, chunk_size) if passthrough else iter_response_body(response, chunk_size)
+    }
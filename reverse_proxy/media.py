@@ -0,0 +1,219 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import requests
+
+from reverse_proxy.config.consts import MEDIA_CONFIG, CACHE_CONFIG, COALESCE_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.cache import cache_lookup, cache_store
+from reverse_proxy.coalesce import CONDITIONAL_HEADERS, coalesce_key, single_flight
+
+
+# Streaming-media mode, enabled per route with {"target": ..., "media": true}.
+#
+# Requests are classified by extension: playlists/manifests (.m3u8, .mpd) are
+# cached for playlist_ttl seconds and segments for segment_ttl, overriding the
+# origin's Cache-Control. With the response cache and single-flight in front of
+# the origin, every viewer of a stream shares one fetch per segment.
+#
+# When an HLS media playlist is fetched from the origin, the segments it
+# lists that weren't in its previous version are prefetched into the cache in
+# the background (the newest prefetch_segments of them for live playlists,
+# the first ones for VOD). Only same-origin segments are prefetched, players
+# fetch others without going through the proxy. DASH manifests are cached but
+# not parsed: they list every representation, not the one a player is on.
+
+_playlists: "OrderedDict[str, set]" = OrderedDict()
+_lock = threading.Lock()
+_counters = {"playlists": 0, "prefetched": 0, "prefetch_skipped": 0, "prefetch_failures": 0}
+_executor = {"pool": None}
+
+HLS_CONTENT_TYPES = ["application/vnd.apple.mpegurl", "application/x-mpegurl", "audio/mpegurl"]
+
+_URI_ATTRIBUTE = re.compile(r'URI="([^"]*)"')
+
+
+def media_kind(url: str, media_config: Dict = MEDIA_CONFIG) -> Optional[str]:
+    """"playlist", "segment" or None, from the URL's extension"""
+    path = urlsplit(url).path.lower()
+    if path.endswith(tuple(media_config["playlist_extensions"])):
+        return "playlist"
+    if path.endswith(tuple(media_config["segment_extensions"])):
+        return "segment"
+    return None
+
+
+def media_cache_config(kind: Optional[str], media_config: Dict = MEDIA_CONFIG, cache_config: Dict = CACHE_CONFIG) -> Dict:
+    """Response cache config for a media request, the plain one for anything else"""
+    if kind == "playlist":
+        return {**cache_config, "force_ttl": media_config["playlist_ttl"]}
+    if kind == "segment":
+        return {**cache_config, "force_ttl": media_config["segment_ttl"], "max_entry_bytes": media_config["max_segment_bytes"]}
+    return cache_config
+
+
+def media_coalesce_config(kind: Optional[str], media_config: Dict = MEDIA_CONFIG, coalesce_config: Dict = COALESCE_CONFIG) -> Dict:
+    """Single-flight config that shares whole segments with concurrent viewers"""
+    if kind == "segment":
+        return {**coalesce_config, "max_body_bytes": media_config["max_segment_bytes"]}
+    return coalesce_config
+
+
+def resolve_uri(base_url: str, uri: str) -> str:
+    """Absolute URL of a playlist entry"""
+    parts = urlsplit(base_url)
+    if parts.scheme in ["http", "https"]:
+        return urljoin(base_url, uri)
+
+    # urljoin leaves entries relative under schemes it doesn't know (upstream://group)
+    joined = urlsplit(urljoin(urlunsplit(("http",) + tuple(parts[1:])), uri))
+    if joined.scheme == "http" and joined.netloc == parts.netloc:
+        joined = joined._replace(scheme=parts.scheme)
+    return urlunsplit(joined)
+
+
+def parse_hls_playlist(text: str, base_url: str) -> Dict:
+    """Absolute segment (or variant) URLs and flags of an HLS playlist
+
+    Raises ValueError if the text isn't an HLS playlist.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise ValueError(f"Not an HLS playlist: {base_url}")
+
+    playlist = {"master": False, "endlist": False, "target_duration": None, "segments": [], "variants": []}
+    for line in lines[1:]:
+        if not line.startswith("#"):
+            entries = playlist["variants"] if playlist["master"] else playlist["segments"]
+            entries.append(resolve_uri(base_url, line))
+            continue
+
+        tag, _, value = line.partition(":")
+        if tag == "#EXT-X-STREAM-INF":
+            playlist["master"] = True
+        elif tag == "#EXT-X-TARGETDURATION":
+            playlist["target_duration"] = float(value)
+        elif tag == "#EXT-X-ENDLIST":
+            playlist["endlist"] = True
+        elif tag == "#EXT-X-MAP":
+            # fMP4 initialization segment, fetched once by every new viewer
+            uri = _URI_ATTRIBUTE.search(value)
+            if uri and resolve_uri(base_url, uri.group(1)) not in playlist["segments"]:
+                playlist["segments"].append(resolve_uri(base_url, uri.group(1)))
+
+    return playlist
+
+
+def is_hls(url: str, response: requests.Response) -> bool:
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    return content_type in HLS_CONTENT_TYPES or urlsplit(url).path.lower().endswith(".m3u8")
+
+
+def prefetch_candidates(playlist_key: str, playlist: Dict, base_url: str, media_config: Dict = MEDIA_CONFIG) -> List[str]:
+    """Segments a playlist refresh revealed that are worth fetching ahead of players"""
+    if playlist["master"]:
+        return []
+
+    origin = urlsplit(base_url)[:2]
+    segments = [url for url in playlist["segments"] if urlsplit(url)[:2] == origin]
+
+    with _lock:
+        seen = _playlists.pop(playlist_key, set())
+        _playlists[playlist_key] = set(segments)
+        while len(_playlists) > media_config["max_playlists"]:
+            _playlists.popitem(last=False)
+        _counters["playlists"] += 1
+
+    revealed = [url for url in segments if url not in seen]
+    count = media_config["prefetch_segments"]
+    if count <= 0:
+        return []
+    # players join a live stream near its end, a VOD one at its start
+    return revealed[:count] if playlist["endlist"] else revealed[-count:]
+
+
+def _split_query(url: str) -> Tuple[str, Dict]:
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(query="")), dict(parse_qsl(parts.query))
+
+
+def prefetch_segment(url: str, fetch: Callable[[str, Dict, Dict], requests.Response], headers: Dict, media_config: Dict = MEDIA_CONFIG) -> None:
+    """Fetch one segment into the cache unless it is already there
+
+    The cache and single-flight keys match those of a player requesting the
+    same segment, so a player arriving mid-prefetch waits for it.
+    """
+    base, params = _split_query(url)
+    try:
+        lookup = cache_lookup("GET", base, params, headers, media_cache_config("segment", media_config), count=False)
+        if lookup is None or lookup["fresh"]:
+            with _lock:
+                _counters["prefetch_skipped"] += 1
+            return
+
+        key = coalesce_key("GET", base, params, headers)
+        response = single_flight(key, lambda: fetch(base, params, headers), coalesce_config=media_coalesce_config("segment", media_config))
+        cache_store(lookup, response)
+        response.close()
+        with _lock:
+            _counters["prefetched"] += 1
+    except Exception as e:
+        with _lock:
+            _counters["prefetch_failures"] += 1
+        pipeline_logger.warning("Segment prefetch failed for %s: %s", url, e)
+
+
+def _pool(media_config: Dict) -> ThreadPoolExecutor:
+    if _executor["pool"] is None:
+        with _lock:
+            if _executor["pool"] is None:
+                _executor["pool"] = ThreadPoolExecutor(max_workers=media_config["prefetch_workers"], thread_name_prefix="media-prefetch")
+    return _executor["pool"]
+
+
+def prefetch_playlist(url: str, params: Optional[Dict], response: requests.Response, fetch: Callable[[str, Dict, Dict], requests.Response],
+                      headers: Optional[Dict] = None, media_config: Dict = MEDIA_CONFIG) -> List[str]:
+    """Parse a playlist fetched from the origin and prefetch the segments it revealed
+
+    headers are the playlist request's, so prefetched segments are cached
+    under the same Vary values as the players' own requests. Returns the
+    URLs queued for prefetch.
+    """
+    if response.status_code != 200 or not is_hls(url, response):
+        return []
+
+    try:
+        playlist = parse_hls_playlist(response.text, url)
+    except ValueError as e:
+        pipeline_logger.warning("%s", e)
+        return []
+
+    playlist_key = url + ("?" + urlencode(sorted(params.items())) if params else "")
+    urls = prefetch_candidates(playlist_key, playlist, url, media_config)
+
+    segment_headers = {k: v for k, v in (headers or {}).items() if k.lower() not in [h.lower() for h in CONDITIONAL_HEADERS]}
+    for segment_url in urls:
+        _pool(media_config).submit(prefetch_segment, segment_url, fetch, segment_headers, media_config)
+    if urls:
+        pipeline_logger.info("Prefetching %s segments of %s", len(urls), url)
+    return urls
+
+
+def media_stats() -> Dict:
+    """Prefetch counters and the number of playlists tracked, for /cache/stats"""
+    with _lock:
+        stats = dict(_counters)
+        stats["tracked_playlists"] = len(_playlists)
+    return stats
+
+
+def reset_media() -> None:
+    """Forget every tracked playlist and reset the counters"""
+    with _lock:
+        _playlists.clear()
+        for name in _counters:
+            _counters[name] = 0
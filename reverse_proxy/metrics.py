@@ -0,0 +1,267 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from reverse_proxy.config.consts import METRICS_CONFIG
+from reverse_proxy.streams import ClosingStream, AsyncClosingStream
+
+
+# In-process pipeline metrics, rendered in the Prometheus text format by
+# /metrics. A request collects its stage timings locally and records them all
+# under one lock acquisition when it finishes, so the hot path only pays for
+# a perf_counter() call per stage.
+#
+# Routes are labelled by their pattern ("/users/{id}"), never the raw path,
+# to keep label cardinality bounded by the route table.
+
+UNMATCHED_ROUTE = "unmatched"
+QUANTILES = [0.5, 0.95, 0.99]
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple, Dict] = {}     # (name, labels) -> {"counts", "sum", "count"}
+_counters: Dict[Tuple, float] = {}      # (name, labels) -> value
+_gauges = {"in_flight": 0}
+
+_HELP = {
+    "proxy_request_duration_seconds": ("histogram", "End-to-end pipeline latency per route, including streamed bodies"),
+    "proxy_stage_duration_seconds": ("histogram", "Latency of each pipeline stage per route"),
+    "proxy_requests_total": ("counter", "Proxied requests per route and response status"),
+    "proxy_response_bytes_total": ("counter", "Response body bytes per route, by source (upstream or cache), before transforms")
+}
+
+
+def start_request() -> Optional[Dict]:
+    """Begin timing a request, None when metrics are disabled"""
+    if not METRICS_CONFIG.get("enabled"):
+        return None
+    now = time.perf_counter()
+    with _lock:
+        _gauges["in_flight"] += 1
+    return {"route": UNMATCHED_ROUTE, "source": "upstream", "started": now, "mark": now, "stages": [], "bytes": 0}
+
+
+def mark_stage(timer: Optional[Dict], stage: str) -> None:
+    """Close the current stage: time since the previous mark is attributed to it"""
+    if timer is None:
+        return
+    now = time.perf_counter()
+    timer["stages"].append((stage, now - timer["mark"]))
+    timer["mark"] = now
+
+
+def set_route(timer: Optional[Dict], route: str) -> None:
+    if timer is not None:
+        timer["route"] = route
+
+
+def set_source(timer: Optional[Dict], source: str) -> None:
+    if timer is not None:
+        timer["source"] = source
+
+
+def add_bytes(timer: Optional[Dict], count: int) -> None:
+    if timer is not None:
+        timer["bytes"] += count
+
+
+def _observe(name: str, labels: Tuple, value: float) -> None:
+    """Add one observation to a histogram (caller holds the lock)"""
+    histogram = _histograms.get((name, labels))
+    if histogram is None:
+        histogram = {"counts": [0] * (len(METRICS_CONFIG["buckets"]) + 1), "sum": 0.0, "count": 0}
+        _histograms[(name, labels)] = histogram
+    histogram["counts"][bisect_left(METRICS_CONFIG["buckets"], value)] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+def _increment(name: str, labels: Tuple, amount: float = 1) -> None:
+    key = (name, labels)
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def finish_request(timer: Optional[Dict], status) -> None:
+    """Record a finished request's stage timings, status and byte count"""
+    if timer is None:
+        return
+    total = time.perf_counter() - timer["started"]
+    route = (("route", timer["route"]),)
+
+    with _lock:
+        _gauges["in_flight"] -= 1
+        _observe("proxy_request_duration_seconds", route, total)
+        for stage, seconds in timer["stages"]:
+            _observe("proxy_stage_duration_seconds", route + (("stage", stage),), seconds)
+        _increment("proxy_requests_total", route + (("status", str(status)),))
+        if timer["bytes"]:
+            _increment("proxy_response_bytes_total", route + (("source", timer["source"]),), timer["bytes"])
+
+
+def count_stream(chunks: Iterable[bytes], timer: Dict) -> Iterator[bytes]:
+    """Count the bytes of a streamed body as they are read"""
+    def counted():
+        for chunk in chunks:
+            timer["bytes"] += len(chunk)
+            yield chunk
+
+    return ClosingStream(counted(), source=chunks)
+
+
+def _finisher(timer: Dict, status):
+    def finish(error) -> None:
+        mark_stage(timer, "stream")
+        finish_request(timer, status)
+    return finish
+
+
+def observe_stream(chunks: Iterable[bytes], timer: Dict, status) -> Iterator[bytes]:
+    """Finish the request once its streamed body has been relayed, or closed unread (HEAD)"""
+    return ClosingStream(chunks, _finisher(timer, status))
+
+
+def observe_stream_async(chunks: AsyncIterator[bytes], timer: Dict, status) -> AsyncIterator[bytes]:
+    """Async counterpart of count_stream and observe_stream in one (async streams are never transformed)"""
+    async def counted():
+        async for chunk in chunks:
+            timer["bytes"] += len(chunk)
+            yield chunk
+
+    return AsyncClosingStream(counted(), _finisher(timer, status), source=chunks)
+
+
+def quantile(histogram: Dict, q: float) -> Optional[float]:
+    """Estimate a quantile from bucket counts, interpolating inside the bucket"""
+    if not histogram["count"]:
+        return None
+
+    buckets = METRICS_CONFIG["buckets"]
+    rank = q * histogram["count"]
+    seen = 0
+    for index, count in enumerate(histogram["counts"]):
+        if count and seen + count >= rank:
+            if index == len(buckets):
+                # overflow bucket has no upper bound
+                return buckets[-1]
+            lower = buckets[index - 1] if index else 0.0
+            return lower + (buckets[index] - lower) * (rank - seen) / count
+        seen += count
+    return buckets[-1]
+
+
+def stage_quantile(route: str, stage: str, q: float, min_count: int = 1) -> Optional[float]:
+    """Estimated latency quantile of one stage of a route, None until min_count samples"""
+    with _lock:
+        histogram = _histograms.get(("proxy_stage_duration_seconds", (("route", route), ("stage", stage))))
+        if histogram is None or histogram["count"] < min_count:
+            return None
+        return quantile(histogram, q)
+
+
+def metrics_snapshot() -> Dict:
+    """p50/p95/p99, counts and totals per route and per stage"""
+    with _lock:
+        histograms = {key: dict(value, counts=list(value["counts"])) for key, value in _histograms.items()}
+        counters = dict(_counters)
+        in_flight = _gauges["in_flight"]
+
+    routes: Dict[str, Dict] = {}
+    for (name, labels), histogram in histograms.items():
+        labels = dict(labels)
+        route = routes.setdefault(labels["route"], {"stages": {}})
+        summary = {"count": histogram["count"], "sum": round(histogram["sum"], 6)}
+        summary.update({f"p{int(q * 100)}": quantile(histogram, q) for q in QUANTILES})
+        if name == "proxy_request_duration_seconds":
+            route["total"] = summary
+        else:
+            route["stages"][labels["stage"]] = summary
+
+    for (name, labels), value in counters.items():
+        labels = dict(labels)
+        route = routes.setdefault(labels["route"], {"stages": {}})
+        if name == "proxy_requests_total":
+            route.setdefault("statuses", {})[labels["status"]] = value
+        else:
+            route.setdefault("bytes", {})[labels["source"]] = value
+
+    return {"in_flight": in_flight, "routes": routes}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra: Tuple = ()) -> str:
+    pairs = tuple(labels) + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(extra_gauges: Optional[Dict[str, List[Tuple[Dict, float]]]] = None) -> str:
+    """Prometheus text exposition of every metric
+
+    extra_gauges maps gauge names to (labels, value) samples gathered by the
+    caller, e.g. per-target upstream stats.
+    """
+    with _lock:
+        histograms = {key: dict(value, counts=list(value["counts"])) for key, value in _histograms.items()}
+        counters = dict(_counters)
+        in_flight = _gauges["in_flight"]
+
+    buckets = METRICS_CONFIG["buckets"]
+    lines = []
+
+    for name, (kind, description) in _HELP.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_format(value)}")
+            continue
+
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, histogram["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {_format(histogram['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+
+    # bucket-estimated quantiles, for dashboards that don't run histogram_quantile()
+    lines.append("# HELP proxy_latency_quantile_seconds Estimated p50/p95/p99 latency per route and stage")
+    lines.append("# TYPE proxy_latency_quantile_seconds gauge")
+    for (metric, labels), histogram in sorted(histograms.items()):
+        if metric == "proxy_request_duration_seconds":
+            labels = labels + (("stage", "total"),)
+        for q in QUANTILES:
+            lines.append(f"proxy_latency_quantile_seconds{_labels(labels, (('quantile', q),))} {_format(quantile(histogram, q))}")
+
+    lines.append("# HELP proxy_requests_in_flight Requests currently in the pipeline, including bodies still streaming")
+    lines.append("# TYPE proxy_requests_in_flight gauge")
+    lines.append(f"proxy_requests_in_flight {in_flight}")
+
+    for name, samples in (extra_gauges or {}).items():
+        if not samples:
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels.items())} {_format(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    """Drop every recorded metric (the in-flight gauge is kept)"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
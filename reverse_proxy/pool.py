@@ -0,0 +1,165 @@
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Iterable, List
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from reverse_proxy.config.consts import POOL_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+
+
+# One keep-alive session per upstream host, shared by every worker thread.
+# Entries: {"session": requests.Session, "created_at": float, "last_used": float}
+_pools: Dict[str, Dict] = {}
+_pools_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "evictions": 0}
+_last_sweep = [0.0]
+
+
+def pool_key(url: str) -> str:
+    """Key a URL to its upstream host (scheme + netloc)"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+
+def create_session(pool_config: Dict = POOL_CONFIG) -> requests.Session:
+    """Build a session with a sized, optionally capped, connection pool"""
+    cap = pool_config.get("max_connections_per_host")
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=cap or pool_config.get("pool_size", 10),
+        pool_block=cap is not None
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    # The session is shared between clients, so upstream cookies must never be kept
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def _is_expired(entry: Dict, now: float, pool_config: Dict) -> bool:
+    """Check a pool entry against the idle and max-age limits"""
+    max_idle = pool_config.get("max_idle_seconds")
+    max_age = pool_config.get("max_age_seconds")
+
+    if max_idle is not None and now - entry["last_used"] > max_idle:
+        return True
+    if max_age is not None and now - entry["created_at"] > max_age:
+        return True
+    return False
+
+
+def _evict(key: str) -> None:
+    """Drop a host pool and close its connections (caller holds the lock)"""
+    entry = _pools.pop(key, None)
+    if entry:
+        entry["session"].close()
+        _counters["evictions"] += 1
+        pipeline_logger.info("Evicted upstream pool: %s", key)
+
+
+def _evict_expired(now: float, pool_config: Dict) -> List[str]:
+    """Evict every expired host pool (caller holds the lock)"""
+    expired = [key for key, entry in _pools.items() if _is_expired(entry, now, pool_config)]
+    for key in expired:
+        _evict(key)
+    return expired
+
+
+def get_session(url: str, pool_config: Dict = POOL_CONFIG) -> requests.Session:
+    """Return the pooled session for the URL's host, creating or recycling it as needed"""
+    key = pool_key(url)
+    now = time.monotonic()
+
+    with _pools_lock:
+        # Opportunistic sweep so hosts that stop receiving traffic release their sockets
+        sweep_interval = pool_config.get("max_idle_seconds")
+        if sweep_interval is not None and now - _last_sweep[0] > sweep_interval:
+            _last_sweep[0] = now
+            _evict_expired(now, pool_config)
+
+        entry = _pools.get(key)
+        if entry and _is_expired(entry, now, pool_config):
+            _evict(key)
+            entry = None
+
+        if entry:
+            _counters["hits"] += 1
+        else:
+            _counters["misses"] += 1
+            entry = {"session": create_session(pool_config), "created_at": now, "last_used": now}
+            _pools[key] = entry
+
+        entry["last_used"] = now
+        return entry["session"]
+
+
+def evict_idle_pools(pool_config: Dict = POOL_CONFIG) -> int:
+    """Close every host pool past its idle or age limit, returns the number evicted"""
+    with _pools_lock:
+        return len(_evict_expired(time.monotonic(), pool_config))
+
+
+def close_pools() -> None:
+    """Close every pooled session"""
+    with _pools_lock:
+        for key in list(_pools):
+            _pools.pop(key)["session"].close()
+
+
+def warm_pools(urls: Iterable[str], pool_config: Dict = POOL_CONFIG) -> None:
+    """Create pools for the given target URLs and open one connection to each host"""
+    seen = set()
+    for url in urls:
+        key = pool_key(url)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        session = get_session(url, pool_config)
+        try:
+            session.head(url, timeout=pool_config.get("prewarm_timeout", 5), allow_redirects=False).close()
+            pipeline_logger.info("Pre-warmed upstream pool: %s", key)
+        except requests.exceptions.RequestException as e:
+            pipeline_logger.warning("Pre-warm failed for %s: %s", key, e)
+
+
+def _connection_stats(session: requests.Session) -> Dict:
+    """Sum urllib3 connection/request counts across a session's connection pools"""
+    opened = 0
+    served = 0
+    for adapter in set(session.adapters.values()):
+        manager = getattr(adapter, "poolmanager", None)
+        if manager is None:
+            continue
+        for pool_id in manager.pools.keys():
+            pool = manager.pools.get(pool_id)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            served += pool.num_requests
+    return {"connections_opened": opened, "requests": served, "reused": max(served - opened, 0)}
+
+
+def pool_stats() -> Dict:
+    """Hit/miss/eviction counters plus per-host connection reuse"""
+    with _pools_lock:
+        hosts = {key: _connection_stats(entry["session"]) for key, entry in _pools.items()}
+        counters = dict(_counters)
+
+    counters["reused"] = sum(host["reused"] for host in hosts.values())
+    counters["hosts"] = hosts
+    return counters
+
+
+def reset_pool_stats() -> None:
+    """Zero the hit/miss/eviction counters"""
+    with _pools_lock:
+        for name in _counters:
+            _counters[name] = 0
@@ -1,61 +1,628 @@
 import logging
-from typing import Callable, Dict, Optional
-from reverse_proxy.config.consts import ROUTE_CONFIG
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
 from reverse_proxy.validate import validate_event
-from reverse_proxy.router import route_to_target
-from reverse_proxy.execution import execute_request, parse_response
-from reverse_proxy.transformation import transform_response
+from reverse_proxy.router import match_route, get_live_routes
+from reverse_proxy.cache import cache_lookup, cached_response, stale_response, revalidation_headers, cache_store
+from reverse_proxy.coalesce import coalesce_key, single_flight
+from reverse_proxy.ratelimit import check_rate_limits, RateLimitExceeded
+from reverse_proxy.breaker import before_request, record_result, CircuitOpenError
+from reverse_proxy.retry import retry_policy, alternate_url, hedged, call_with_retries, hedged_async, call_with_retries_async
+from reverse_proxy.config.consts import BREAKER_CONFIG, COALESCE_CONFIG
+from reverse_proxy.config.logging import set_log_route
+from reverse_proxy.execution import execute_request, parse_response, stream_response
+from reverse_proxy.upstreams import resolve_upstream, release_target, release_on_close, release_on_close_async, is_upstream_failure
+from reverse_proxy.compression import compress_stream_response, compress_stream_response_async, may_compress
+from reverse_proxy.media import media_kind, media_cache_config, media_coalesce_config, prefetch_playlist
+from reverse_proxy.stages import register_stage, compile_stages, compile_stages_async, RESPONSE
+from reverse_proxy.streams import close_stream
+from reverse_proxy.metrics import (
+    start_request, mark_stage, set_route, set_source, add_bytes, finish_request,
+    count_stream, observe_stream, observe_stream_async
+)
 
-logging.basicConfig(level=logging.INFO)
 pipeline_logger = logging.getLogger(__name__)
 
 
 
+# The async I/O stack (httpx, asyncio) and the transform stage are imported
+# on first use, so sync-only entry points that never transform (e.g. the
+# Lambda handler's cold start) don't pay for them.
+
 # proxy service takes place here, 
 # pipeline process, agnostic to any handlers, process only, pure funcs called.
 
-def proxy_request(event: Dict, transform_options: Optional[Dict] = None, route_config: Dict = ROUTE_CONFIG) -> Dict: 
+
+def _match(validated: Dict, route_config: Dict, timer: Optional[Dict]) -> Dict:
+    """Match the route, labelling the request's metrics with its pattern"""
+    match = match_route(validated["path"], route_config, host=validated.get("host"), method=validated["method"])
+    set_route(timer, match["route"]["pattern"])
+    set_log_route(match["route"]["pattern"])
+    pipeline_logger.info("Routed: %s -> %s", validated["path"], match["target_url"])
+    mark_stage(timer, "route")
+    return match
+
+
+def _body_size(response) -> int:
+    content = getattr(response, "content", None)
+    return len(content) if isinstance(content, (bytes, bytearray)) else 0
+
+
+def _execute_attempt(validated: Dict, url: str, request_headers: Optional[Dict], streaming: bool) -> Tuple: 
+    """One upstream call: pick a target, check its circuit, execute and record the outcome
+
+    Returns (response, upstream lease or None, latency).
+    """
+    # upstream://group targets resolve to one of the group's members
+    upstream_url, lease = resolve_upstream(url)
+    try: 
+        # fails fast while the host's circuit is open
+        timeout = before_request(upstream_url)
+    except CircuitOpenError: 
+        if lease: 
+            release_target(*lease, success=False)
+        raise
+
+    started = time.monotonic()
+    try: 
+        response = execute_request(
+            method=validated["method"], 
+            url=upstream_url, 
+            params=validated.get("params"),
+            data=validated.get("data"), 
+            # execute_request rewrites headers, keep each attempt's copy separate
+            headers=dict(request_headers or {}),
+            stream=streaming,
+            timeout=timeout
+        )
+    except Exception as e: 
+        failed = is_upstream_failure(e)
+        record_result(upstream_url, success=not failed, latency=time.monotonic() - started)
+        if lease: 
+            release_target(*lease, success=not failed)
+        raise
+
+    latency = time.monotonic() - started
+    record_result(upstream_url, success=True, latency=latency)
+    return response, lease, latency
+
+
+def _discard_attempt(result: Tuple) -> None: 
+    """Close the slower of two hedged attempts"""
+    response, lease, latency = result
+    response.close()
+    if lease: 
+        release_target(*lease, success=True, latency=latency)
+
+
+def _fetch_segment(url: str, params: Dict, headers: Dict):
+    """Buffered GET of a media segment for prefetch, through the same upstream and breaker checks"""
+    response, lease, latency = _execute_attempt({"method": "GET", "params": params, "data": None}, url, headers, False)
+    if lease:
+        release_target(*lease, success=True, latency=latency)
+    return response
+
+
+# Built-in stages, see reverse_proxy/stages.py. Each factory runs once per
+# route; ctx carries the request through the chain.
+
+def _ratelimit_stage(route: Dict) -> Callable: 
+    pattern = route["pattern"]
+
+    def ratelimit(ctx: Dict, call_next: Callable) -> None: 
+        check_rate_limits(ctx["validated"], pattern)
+        mark_stage(ctx["timer"], "ratelimit")
+        call_next(ctx)
+
+    return ratelimit
+
+
+def _ratelimit_stage_async(route: Dict) -> Callable: 
+    pattern = route["pattern"]
+
+    async def ratelimit(ctx: Dict, call_next: Callable) -> None: 
+        check_rate_limits(ctx["validated"], pattern)
+        mark_stage(ctx["timer"], "ratelimit")
+        await call_next(ctx)
+
+    return ratelimit
+
+
+def _header_rewrite(route: Dict) -> Optional[Callable[[Dict], None]]: 
+    """Set the route's request_headers on ctx["headers"], a None value removes the header"""
+    rewrites = route.get("request_headers")
+    if not rewrites: 
+        return None
+    names = {name.lower() for name in rewrites}
+    values = {name: value for name, value in rewrites.items() if value is not None}
+
+    def rewrite(ctx: Dict) -> None: 
+        request_headers = {k: v for k, v in (ctx["headers"] or {}).items() if k.lower() not in names}
+        request_headers.update(values)
+        ctx["headers"] = request_headers
+
+    return rewrite
+
+
+def _headers_stage(route: Dict) -> Optional[Callable]: 
+    rewrite = _header_rewrite(route)
+    if rewrite is None: 
+        return None
+
+    def headers(ctx: Dict, call_next: Callable) -> None: 
+        rewrite(ctx)
+        call_next(ctx)
+
+    return headers
+
+
+def _headers_stage_async(route: Dict) -> Optional[Callable]: 
+    rewrite = _header_rewrite(route)
+    if rewrite is None: 
+        return None
+
+    async def headers(ctx: Dict, call_next: Callable) -> None: 
+        rewrite(ctx)
+        await call_next(ctx)
+
+    return headers
+
+
+def _cache_check(ctx: Dict, media) -> Tuple[Optional[str], Optional[Dict]]: 
+    """Look the request up in the cache, a fresh hit becomes ctx["raw"]
+
+    Returns (media kind, lookup) for _cache_fill.
+    """
+    validated = ctx["validated"]
+
+    # media routes cache playlists and segments by their own TTLs, see reverse_proxy/media.py
+    kind = media_kind(ctx["target_url"]) if media else None
+    if kind == "playlist": 
+        # playlists are small and parsed for prefetch, so they are always buffered
+        ctx["stream"] = False
+
+    lookup = cache_lookup(validated["method"], ctx["target_url"], validated.get("params"), ctx["headers"], media_cache_config(kind))
+    mark_stage(ctx["timer"], "cache")
+
+    if lookup and lookup["fresh"]: 
+        ctx["raw"] = cached_response(lookup)
+        ctx["cached_file"] = getattr(ctx["raw"], "cached_file", None)
+        set_source(ctx["timer"], "cache")
+        return kind, lookup
+
+    ctx["headers"] = revalidation_headers(lookup, ctx["headers"])
+    ctx["coalesce_config"] = media_coalesce_config(kind)
+    return kind, lookup
+
+
+def _cache_stale(ctx: Dict, lookup: Optional[Dict]) -> bool: 
+    """Answer with the stale entry while the upstream's circuit is open, if there is one"""
+    ctx["raw"] = stale_response(lookup) if BREAKER_CONFIG.get("serve_stale") else None
+    if ctx["raw"] is None: 
+        return False
+    set_source(ctx["timer"], "cache")
+    return True
+
+
+def _cache_fill(ctx: Dict, kind: Optional[str], lookup: Optional[Dict]) -> None: 
+    validated = ctx["validated"]
+    ctx["raw"] = cache_store(lookup, ctx["raw"], stream=ctx["stream"])
+    if kind == "playlist" and validated["method"] == "GET": 
+        prefetch_playlist(ctx["target_url"], validated.get("params"), ctx["raw"], _fetch_segment, validated.get("headers"))
+
+
+def _cache_stage(route: Dict) -> Callable: 
+    media = route.get("media")
+
+    def cache(ctx: Dict, call_next: Callable) -> None: 
+        kind, lookup = _cache_check(ctx, media)
+        if ctx["raw"] is not None: 
+            return
+        try: 
+            call_next(ctx)
+        except CircuitOpenError: 
+            if not _cache_stale(ctx, lookup): 
+                raise
+            return
+        _cache_fill(ctx, kind, lookup)
+
+    return cache
+
+
+def _cache_stage_async(route: Dict) -> Callable: 
+    media = route.get("media")
+
+    async def cache(ctx: Dict, call_next: Callable) -> None: 
+        kind, lookup = _cache_check(ctx, media)
+        if ctx["raw"] is not None: 
+            return
+        try: 
+            await call_next(ctx)
+        except CircuitOpenError: 
+            if not _cache_stale(ctx, lookup): 
+                raise
+            return
+        # async streams are relayed as they are, only buffered responses are stored
+        if not ctx["stream"]: 
+            _cache_fill(ctx, kind, lookup)
+
+    return cache
+
+
+def _transform_stage(route: Dict) -> Callable: 
+    def transform(ctx: Dict) -> None: 
+        options = ctx["transform_options"]
+        if not options: 
+            return
+        from reverse_proxy.transformation import transform_response, transform_stream_response
+        apply = transform_stream_response if ctx["stream"] else transform_response
+        ctx["response"] = apply(
+            ctx["response"], 
+            page_title=options.get("page_title"), 
+            text_replaces=options.get("text_replaces")
+        )
+        mark_stage(ctx["timer"], "transform")
+
+    return transform
+
+
+def _compress_stage(route: Dict) -> Callable: 
+    def compress(ctx: Dict) -> None: 
+        if ctx["stream"]: 
+            ctx["response"] = compress_stream_response(ctx["response"], ctx["accept_encoding"])
+            mark_stage(ctx["timer"], "compress")
+
+    return compress
+
+
+def _compress_stage_async(route: Dict) -> Callable: 
+    async def compress(ctx: Dict) -> None: 
+        if ctx["stream"]: 
+            ctx["response"] = await compress_stream_response_async(ctx["response"], ctx["accept_encoding"])
+            mark_stage(ctx["timer"], "compress")
+
+    return compress
+
+
+# the async pipeline buffers bodies it transforms, so transform's sync form serves both
+register_stage("ratelimit", _ratelimit_stage, async_factory=_ratelimit_stage_async)
+register_stage("headers", _headers_stage, async_factory=_headers_stage_async)
+register_stage("cache", _cache_stage, async_factory=_cache_stage_async)
+register_stage("transform", _transform_stage, RESPONSE)
+register_stage("compress", _compress_stage, RESPONSE, async_factory=_compress_stage_async)
+
+
+def _upstream(ctx: Dict) -> None: 
+    """The "upstream" stage: coalesced call to the route's target with retries, hedging and circuit breaking"""
+    validated = ctx["validated"]
+    target_url = ctx["target_url"]
+    request_headers = ctx["headers"]
+    streaming = ctx["stream"]
+    retries, hedge_delay = retry_policy(ctx["route"], validated["method"])
+
+    def attempt(index): 
+        # retries and hedges go to the route's alternate origin when it has one
+        url = alternate_url(target_url, ctx["route"].get("alternate")) if index else target_url
+        return _execute_attempt(validated, url, request_headers, streaming)
+
+    def hedged_attempt(index): 
+        return hedged(attempt, hedge_delay, _discard_attempt)
+
+    def fetch(): 
+        call = attempt if hedge_delay is None else hedged_attempt
+        upstream_response, ctx["lease"], ctx["latency"] = call_with_retries(call, retries, is_upstream_failure)
+        return upstream_response
+
+    # identical concurrent requests share one upstream call
+    key = coalesce_key(validated["method"], target_url, validated.get("params"), request_headers)
+    ctx["raw"] = single_flight(key, fetch, stream=streaming, coalesce_config=ctx["coalesce_config"])
+    mark_stage(ctx["timer"], "upstream")
+
+
+def _respond(ctx: Dict) -> None: 
+    """Turn the raw response into the response dict and release the upstream target"""
+    raw_response = ctx["raw"]
+    timer = ctx["timer"]
+
+    if ctx["stream"]: 
+        # compressed bodies pass through untouched unless they are about to be transformed
+        response = stream_response(raw_response, accept_encoding=None if ctx["transform_options"] else ctx["accept_encoding"])
+        cached_file = ctx["cached_file"]
+        if (cached_file and not ctx["transform_options"]
+                and not ("compress" in ctx["route"]["stages"] and may_compress(response, ctx["accept_encoding"]))): 
+            # large shared-cache hit, the server sends the body straight from its file (see server/app.py)
+            response.update(stream=None, file=cached_file["file"], content_length=cached_file["size"])
+            add_bytes(timer, cached_file["size"])
+        elif timer: 
+            response["stream"] = count_stream(response["stream"], timer)
+    else: 
+        response = parse_response(raw_response)
+        add_bytes(timer, _body_size(raw_response))
+    mark_stage(timer, "parse")
+
+    lease = ctx["lease"]
+    if lease: 
+        # streamed bodies stay in flight against the target until fully relayed (or closed unread)
+        if ctx["stream"]: 
+            response["stream"] = release_on_close(response["stream"], lease, ctx["latency"])
+        else: 
+            release_target(*lease, success=True, latency=ctx["latency"])
+        ctx["lease"] = None
+
+    ctx["response"] = response
+
+
+def _abandon(ctx: Optional[Dict], error: Exception) -> None: 
+    """Give back the upstream target and connection of a request that failed after its upstream call"""
+    if not ctx: 
+        return
+    if ctx["lease"]: 
+        release_target(*ctx["lease"], success=not is_upstream_failure(error), latency=ctx["latency"])
+        ctx["lease"] = None
+    # a response stream built before the failure holds the lease from here on
+    if ctx["response"] and ctx["response"].get("stream") is not None: 
+        close_stream(ctx["response"]["stream"])
+    close_stream(ctx["raw"])
+
+
+def _pipeline(route: Dict) -> Callable[[Dict], Dict]: 
+    """The route's compiled stage chain, built on its first request"""
+    pipeline = route.get("pipeline")
+    if pipeline is None: 
+        pipeline = route["pipeline"] = compile_stages(route, _upstream, _respond)
+    return pipeline
+
+
+def proxy_request(event: Dict, transform_options: Optional[Dict] = None, route_config: Optional[Dict] = None, stream: bool = False) -> Dict: 
     """Main proxy function - coordinated the request pipeline
     
-    Pipeline: validate -> route -> execute -> parse -> transform (Optional)
+    Pipeline: validate -> route -> the route's stages (default: rate limit -> cache -> upstream -> transform (Optional) -> compress (streams)),
+    where upstream is coalesce -> select upstream -> circuit breaker -> execute, followed by parse
 
     Args: 
-        events: Request event with method, path, params, data, headers
-        transform_options: Optional dict with page_title and/or text_replaces
-        route_config: Path-to-URL mapping
+        events: Request event with method, path, params, data, headers and
+            optionally the client-facing host (for host-based routes) and
+            client_ip (for per-client rate limits)
+        transform_options: Optional dict with page_title and/or text_replaces,
+            ignored on routes without the transform stage
+        route_config: Path-to-URL mapping, defaults to the live routes
+            (snapshotted once, so a reload never changes an in-flight request)
+        stream: Pass the upstream body through as a chunk generator under
+            "stream" instead of buffering it, transforms are applied chunk by chunk.
+            A compressed body the client accepts is relayed still encoded
+            ("content_encoding" names the coding)
 
     Returns:
         Response dict with status_code, headers, content, etc.     
     """
 
+    if route_config is None: 
+        route_config = get_live_routes()
+
+    # per-stage timings, see reverse_proxy/metrics.py
+    timer = start_request()
+    ctx = None
+
     try: 
         validated = validate_event(event)
+        mark_stage(timer, "validate")
+
+        match = _match(validated, route_config, timer)
+        route = match["route"]
+        target_url = match["target_url"]
+
+        ctx = {
+            "validated": validated, 
+            "route": route, 
+            "target_url": target_url, 
+            "transform_options": transform_options if transform_options and "transform" in route["stages"] else None, 
+            "stream": stream, 
+            "accept_encoding": (validated.get("headers") or {}).get("Accept-Encoding"), 
+            "headers": validated.get("headers"), 
+            "timer": timer, 
+            "coalesce_config": COALESCE_CONFIG, 
+            "raw": None, 
+            "lease": None, 
+            "latency": None, 
+            "cached_file": None, 
+            "response": None
+        }
+        response = _pipeline(route)(ctx)
+
+        if ctx["stream"] and timer and response["stream"] is not None: 
+            # the request stays in flight until the body has been relayed
+            response["stream"] = observe_stream(response["stream"], timer, response["status_code"])
+        else: 
+            finish_request(timer, response["status_code"])
+        
+        pipeline_logger.info("Successfully proxied to %s", target_url)
+
+        return response 
+
+    except (RateLimitExceeded, CircuitOpenError) as e: 
+        _abandon(ctx, e)
+        finish_request(timer, e.status_code)
+        raise
 
-        target_url = route_to_target(validated["path"], route_config)
+    except Exception as e: 
+        # e.g. reading the body for the cache or a follower failed before it was relayed
+        _abandon(ctx, e)
+        finish_request(timer, "error")
+        pipeline_logger.error("Proxy error: %s", e, exc_info=True)
+        raise
+
+
+async def _execute_attempt_async(validated: Dict, url: str, request_headers: Optional[Dict], streaming: bool) -> Tuple: 
+    """_execute_attempt on the async client"""
+    from reverse_proxy.async_execution import execute_request_async, is_upstream_failure_async
+
+    upstream_url, lease = resolve_upstream(url)
+    try: 
+        timeout = before_request(upstream_url)
+    except CircuitOpenError: 
+        if lease: 
+            release_target(*lease, success=False)
+        raise
 
-        raw_response = execute_request(
+    started = time.monotonic()
+    try: 
+        response = await execute_request_async(
             method=validated["method"], 
-            url=target_url, 
+            url=upstream_url, 
             params=validated.get("params"),
             data=validated.get("data"), 
-            headers=validated.get("headers")
+            headers=dict(request_headers or {}),
+            stream=streaming,
+            timeout=timeout
         )
+    except Exception as e: 
+        failed = is_upstream_failure_async(e)
+        record_result(upstream_url, success=not failed, latency=time.monotonic() - started)
+        if lease: 
+            release_target(*lease, success=not failed)
+        raise
 
-        response = parse_response(raw_response)
+    latency = time.monotonic() - started
+    record_result(upstream_url, success=True, latency=latency)
+    return response, lease, latency
+
+
+async def _discard_attempt_async(result: Tuple) -> None: 
+    response, lease, latency = result
+    await response.aclose()
+    if lease: 
+        release_target(*lease, success=True, latency=latency)
+
+
+async def _upstream_async(ctx: Dict) -> None: 
+    """The "upstream" stage of the async pipeline, retried and hedged like _upstream but never coalesced
+
+    Buffered responses are read into a requests.Response, so the cache and
+    _respond handle them as they do on the sync pipeline.
+    """
+    from reverse_proxy.async_execution import read_response_async, is_upstream_failure_async
+
+    validated = ctx["validated"]
+    target_url = ctx["target_url"]
+    retries, hedge_delay = retry_policy(ctx["route"], validated["method"])
+
+    async def attempt(index): 
+        url = alternate_url(target_url, ctx["route"].get("alternate")) if index else target_url
+        return await _execute_attempt_async(validated, url, ctx["headers"], ctx["stream"])
+
+    async def hedged_attempt(index): 
+        return await hedged_async(attempt, hedge_delay, _discard_attempt_async)
+
+    call = attempt if hedge_delay is None else hedged_attempt
+    upstream_response, ctx["lease"], ctx["latency"] = await call_with_retries_async(call, retries, is_upstream_failure_async)
+    ctx["raw"] = upstream_response if ctx["stream"] else await read_response_async(upstream_response)
+    mark_stage(ctx["timer"], "upstream")
+
+
+def _respond_async(ctx: Dict) -> None: 
+    """_respond for the async pipeline, streamed upstream bodies become async chunk iterators"""
+    from reverse_proxy.async_execution import stream_response_async, is_upstream_failure_async
+
+    if not ctx["stream"] or isinstance(ctx["raw"], requests.Response): 
+        # buffered, or answered by the cache
+        ctx["stream"] = False
+        _respond(ctx)
+        return
+
+    response = stream_response_async(ctx["raw"], accept_encoding=None if ctx["transform_options"] else ctx["accept_encoding"])
+    mark_stage(ctx["timer"], "parse")
+    if ctx["lease"]: 
+        # streamed bodies stay in flight against the target until relayed or closed
+        response["stream"] = release_on_close_async(response["stream"], ctx["lease"], ctx["latency"], is_upstream_failure_async)
+        ctx["lease"] = None
+    ctx["response"] = response
 
-        if transform_options: 
-            response = transform_response(
-                response, 
-                page_title=transform_options.get("page_title"), 
-                text_replaces=transform_options.get("text_replaces")
-            )
+
+async def _abandon_async(ctx: Optional[Dict], error: Exception) -> None: 
+    """_abandon for the async pipeline"""
+    from reverse_proxy.async_execution import is_upstream_failure_async
+
+    if not ctx: 
+        return
+    if ctx["lease"]: 
+        release_target(*ctx["lease"], success=not is_upstream_failure_async(error), latency=ctx["latency"])
+        ctx["lease"] = None
+    for resource in [(ctx["response"] or {}).get("stream"), ctx["raw"]]: 
+        aclose = getattr(resource, "aclose", None)
+        if aclose: 
+            await aclose()
+        else: 
+            close_stream(resource)
+
+
+def _pipeline_async(route: Dict) -> Callable: 
+    """The route's compiled async stage chain, built on its first async request"""
+    pipeline = route.get("async_pipeline")
+    if pipeline is None: 
+        pipeline = route["async_pipeline"] = compile_stages_async(route, _upstream_async, _respond_async)
+    return pipeline
+
+
+async def proxy_request_async(event: Dict, transform_options: Optional[Dict] = None, route_config: Optional[Dict] = None, stream: bool = False) -> Dict: 
+    """Async proxy function - runs the route's stages like proxy_request, on asyncio
+
+    Only the upstream I/O is awaited, validation, routing and the stages
+    reuse the sync code. A streamed response carries an async chunk
+    generator under "stream". Identical requests are not coalesced here.
+    """
+    if route_config is None: 
+        route_config = get_live_routes()
+
+    timer = start_request()
+    ctx = None
+
+    try: 
+        validated = validate_event(event)
+        mark_stage(timer, "validate")
+
+        match = _match(validated, route_config, timer)
+        route = match["route"]
+        target_url = match["target_url"]
+        transform_options = transform_options if transform_options and "transform" in route["stages"] else None
+
+        ctx = {
+            "validated": validated, 
+            "route": route, 
+            "target_url": target_url, 
+            "transform_options": transform_options, 
+            # transform_stream works on sync chunk iterators, so transforms are buffered here
+            "stream": stream and not transform_options, 
+            "accept_encoding": (validated.get("headers") or {}).get("Accept-Encoding"), 
+            "headers": validated.get("headers"), 
+            "timer": timer, 
+            "coalesce_config": COALESCE_CONFIG, 
+            "raw": None, 
+            "lease": None, 
+            "latency": None, 
+            "cached_file": None, 
+            "response": None
+        }
+        response = await _pipeline_async(route)(ctx)
+
+        if ctx["stream"] and timer and response["stream"] is not None: 
+            response["stream"] = observe_stream_async(response["stream"], timer, response["status_code"])
+        else: 
+            finish_request(timer, response["status_code"])
         
-        pipeline_logger.info(f"Successfully proxied to {target_url}")
+        pipeline_logger.info("Successfully proxied to %s", target_url)
 
         return response 
 
-    except Exception as e: 
-        pipeline_logger.error(f"Proxy error: {e}", exc_info=True)
+    except (RateLimitExceeded, CircuitOpenError) as e: 
+        await _abandon_async(ctx, e)
+        finish_request(timer, e.status_code)
         raise
 
-        
\ No newline at end of file
+    except Exception as e: 
+        await _abandon_async(ctx, e)
+        finish_request(timer, "error")
+        pipeline_logger.error("Proxy error: %s", e, exc_info=True)
+        raise
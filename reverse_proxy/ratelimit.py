@@ -0,0 +1,175 @@
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from reverse_proxy.config.consts import RATE_LIMIT_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+
+
+# Generic cell rate algorithm: each key stores one number, its theoretical
+# arrival time (TAT). A request is allowed if it doesn't arrive more than
+# `burst` emission intervals (1 / rate) ahead of the TAT, and pushes the TAT
+# one interval further. Equivalent to a token bucket of size `burst` refilled
+# at `rate` per second, with O(1) time and space per key.
+
+class RateLimitExceeded(Exception):
+    """Raised when a rate limit rejects a request, served as 429"""
+
+    status_code = 429
+
+    def __init__(self, rule: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded: {rule}")
+        self.rule = rule
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds"""
+        return str(max(math.ceil(self.retry_after), 1))
+
+
+def gcra(tat: Optional[float], now: float, rate: float, burst: int) -> Tuple[bool, float, float]:
+    """One GCRA decision: (allowed, new TAT, seconds until allowed)"""
+    interval = 1.0 / rate
+    new_tat = max(tat or now, now) + interval
+    allow_at = new_tat - burst * interval
+    if now < allow_at:
+        return False, tat, allow_at - now
+    return True, new_tat, 0.0
+
+
+class MemoryStore:
+    """Per-process GCRA state"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_CONFIG["max_keys"]):
+        self.tats: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def check(self, key: str, now: float, rate: float, burst: int) -> Tuple[bool, float]:
+        with self.lock:
+            allowed, tat, retry_after = gcra(self.tats.get(key), now, rate, burst)
+            if allowed:
+                if key not in self.tats and len(self.tats) >= self.max_keys:
+                    self._sweep(now)
+                self.tats[key] = tat
+        return allowed, retry_after
+
+    def _sweep(self, now: float) -> None:
+        """Drop keys whose TAT has passed, they behave exactly like new keys"""
+        for key in [key for key, tat in self.tats.items() if tat <= now]:
+            del self.tats[key]
+
+
+# Same decision as gcra(), run atomically inside Redis
+_REDIS_GCRA = """
+local tat = tonumber(redis.call('GET', KEYS[1]))
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+if not tat or tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - burst * interval
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1)
+return {1, '0'}
+"""
+
+
+class RedisStore:
+    """GCRA state shared by every worker through Redis (needs the optional redis package)"""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("The redis package is required for the redis rate limit backend")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(_REDIS_GCRA)
+
+    def check(self, key: str, now: float, rate: float, burst: int) -> Tuple[bool, float]:
+        allowed, retry_after = self.script(keys=[f"ratelimit:{key}"], args=[now, 1.0 / rate, burst])
+        return bool(int(allowed)), float(retry_after)
+
+
+_store = {"store": None}
+_counters: Dict[str, Dict[str, int]] = {}
+_counters_lock = threading.Lock()
+
+
+def get_store(rate_limit_config: Dict = RATE_LIMIT_CONFIG):
+    """Backend store, created on first use"""
+    if _store["store"] is None:
+        if rate_limit_config.get("backend") == "redis":
+            _store["store"] = RedisStore(rate_limit_config["redis_url"])
+        else:
+            _store["store"] = MemoryStore(rate_limit_config.get("max_keys", 100000))
+    return _store["store"]
+
+
+def set_store(store) -> None:
+    """Replace the backend store (e.g. a shared one in tests or a custom backend)"""
+    _store["store"] = store
+
+
+def client_ip(event: Dict, rate_limit_config: Dict = RATE_LIMIT_CONFIG) -> str:
+    """Client address of an event, optionally from X-Forwarded-For"""
+    if rate_limit_config.get("trust_forwarded_for"):
+        forwarded = (event.get("headers") or {}).get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return event.get("client_ip") or "unknown"
+
+
+def limit_key(rule: Dict, event: Dict, route: str, rate_limit_config: Dict = RATE_LIMIT_CONFIG) -> str:
+    """Bucket key of one rule for one request"""
+    key_type = rule.get("key", "client_ip")
+    if key_type == "route":
+        value = route
+    elif key_type.startswith("header:"):
+        value = (event.get("headers") or {}).get(key_type[len("header:"):]) or client_ip(event, rate_limit_config)
+    else:
+        value = client_ip(event, rate_limit_config)
+    return f"{rule['name']}:{route}:{value}"
+
+
+def _count(rule: str, outcome: str) -> None:
+    with _counters_lock:
+        counters = _counters.setdefault(rule, {"allowed": 0, "limited": 0})
+        counters[outcome] += 1
+
+
+def check_rate_limits(event: Dict, route: str, rate_limit_config: Dict = RATE_LIMIT_CONFIG, now: Optional[float] = None) -> None:
+    """Apply every rule matching the route, raising RateLimitExceeded on the first rejection"""
+    if not rate_limit_config.get("enabled") or not rate_limit_config.get("rules"):
+        return
+
+    store = get_store(rate_limit_config)
+    now = time.time() if now is None else now
+    for rule in rate_limit_config["rules"]:
+        routes = rule.get("routes")
+        if routes and route not in routes:
+            continue
+
+        allowed, retry_after = store.check(limit_key(rule, event, route, rate_limit_config), now, rule["rate"], rule.get("burst", 1))
+        if not allowed:
+            _count(rule["name"], "limited")
+            pipeline_logger.warning("Rate limited by %s: %s, retry in %.2fs", rule['name'], event.get('path'), retry_after)
+            raise RateLimitExceeded(rule["name"], retry_after)
+        _count(rule["name"], "allowed")
+
+
+def rate_limit_stats() -> Dict:
+    """Allowed/limited counts per rule"""
+    with _counters_lock:
+        return {rule: dict(counters) for rule, counters in _counters.items()}
+
+
+def reset_rate_limits() -> None:
+    """Forget all bucket state and counters"""
+    _store["store"] = None
+    with _counters_lock:
+        _counters.clear()
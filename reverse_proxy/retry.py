@@ -0,0 +1,239 @@
+import contextvars
+import inspect
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit, urlunsplit
+
+from reverse_proxy.config.consts import RETRY_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.metrics import stage_quantile
+
+
+T = TypeVar("T")
+
+# Global retry budget (as in Finagle / gRPC retry throttling): every request
+# deposits budget_ratio, retries and hedges withdraw 1, so extra attempts stay
+# a bounded fraction of traffic however badly the upstreams behave.
+_budget = {"balance": 0.0, "updated": time.monotonic()}
+_lock = threading.Lock()
+_counters = {"retries": 0, "hedges": 0, "hedge_wins": 0, "budget_exhausted": 0}
+
+# Hedged attempts run on a small pool owned by the request thread, so a
+# primary never queues behind other requests' attempts and hedges don't wait
+# for a shared pool exactly when it is saturated.
+_local = threading.local()
+
+
+def deposit(retry_config: Dict = RETRY_CONFIG) -> None:
+    """Credit the budget for one request"""
+    with _lock:
+        _budget["balance"] = min(_budget["balance"] + retry_config["budget_ratio"], retry_config["budget_cap"])
+
+
+def withdraw(kind: str, retry_config: Dict = RETRY_CONFIG) -> bool:
+    """Spend one extra attempt ("retries" or "hedges"), False if the budget is exhausted"""
+    now = time.monotonic()
+    with _lock:
+        refill = (now - _budget["updated"]) * retry_config["min_per_second"]
+        _budget["balance"] = min(_budget["balance"] + refill, retry_config["budget_cap"])
+        _budget["updated"] = now
+        if _budget["balance"] < 1:
+            _counters["budget_exhausted"] += 1
+            return False
+        _budget["balance"] -= 1
+        _counters[kind] += 1
+        return True
+
+
+def backoff(attempt: int, retry_config: Dict = RETRY_CONFIG) -> float:
+    """Full-jitter exponential backoff before retry number attempt + 1"""
+    ceiling = min(retry_config["max_backoff"], retry_config["base_backoff"] * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def retry_policy(route: Dict, method: str, retry_config: Dict = RETRY_CONFIG) -> Tuple[int, Optional[float]]:
+    """(retries, hedge delay or None) for a request on a matched route
+
+    Only idempotent methods are retried or hedged. A hedge without an
+    explicit delay waits for the route's p95 upstream latency.
+    """
+    if method.upper() not in retry_config["methods"]:
+        return 0, None
+
+    retries = route.get("retries", retry_config["retries"])
+
+    hedge = route.get("hedge")
+    delay = None
+    if isinstance(hedge, dict) and hedge.get("delay") is not None:
+        delay = hedge["delay"]
+    elif hedge:
+        delay = stage_quantile(route["pattern"], "upstream", 0.95, retry_config["hedge_min_samples"])
+    return retries, delay
+
+
+def alternate_url(url: str, alternate: Optional[str]) -> str:
+    """Point a target URL at the route's alternate origin, keeping path and query"""
+    if not alternate:
+        return url
+    parts = urlsplit(url)
+    base = urlsplit(alternate)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+def _pool() -> Dict:
+    """This request thread's attempt pool (a primary and a hedge)
+
+    A losing attempt of an earlier request may still hold a worker, the pool
+    is then left to finish it and replaced.
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is not None and pool["running"]:
+        pool["executor"].shutdown(wait=False)
+        pool = None
+    if pool is None:
+        pool = {"executor": ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge"), "running": 0}
+        _local.pool = pool
+    return pool
+
+
+def _submit(pool: Dict, attempt: Callable[[int], T], index: int) -> Future:
+    """Run attempt(index) on the pool in a copy of the caller's context (request ID, log route)"""
+    context = contextvars.copy_context()
+
+    def run() -> T:
+        try:
+            return context.run(attempt, index)
+        finally:
+            # before the result is set, so the next request sees the pool free
+            with _lock:
+                pool["running"] -= 1
+
+    with _lock:
+        pool["running"] += 1
+    return pool["executor"].submit(run)
+
+
+def _forget_pools() -> None:
+    # pool threads don't survive fork
+    _local.__dict__.pop("pool", None)
+
+
+def hedged(attempt: Callable[[int], T], delay: float, discard: Callable[[T], None], retry_config: Dict = RETRY_CONFIG) -> T:
+    """Run attempt(0), and attempt(1) too if the first hasn't answered after delay
+
+    Returns the first successful result; the other one is passed to discard
+    when it completes. Raises the primary's error if both attempts fail.
+    """
+    pool = _pool()
+    primary = _submit(pool, attempt, 0)
+    done, _ = wait([primary], timeout=delay)
+    if done or not withdraw("hedges", retry_config):
+        return primary.result()
+
+    pipeline_logger.info("Hedging request after %.3fs", delay)
+    hedge = _submit(pool, attempt, 1)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    with _lock:
+                        _counters["hedge_wins"] += 1
+                for loser in pending:
+                    loser.add_done_callback(lambda f: discard(f.result()) if f.exception() is None else None)
+                return future.result()
+
+    return primary.result()
+
+
+def call_with_retries(call: Callable[[int], T], retries: int, retryable: Callable[[Exception], bool], retry_config: Dict = RETRY_CONFIG) -> T:
+    """call(attempt) with up to retries more attempts on retryable errors, within the budget"""
+    deposit(retry_config)
+    attempt = 0
+    while True:
+        try:
+            return call(attempt)
+        except Exception as e:
+            if attempt >= retries or not retryable(e) or not withdraw("retries", retry_config):
+                raise
+            delay = backoff(attempt, retry_config)
+            pipeline_logger.warning("Retrying after %s (attempt %s) in %.3fs", e, attempt + 2, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+async def hedged_async(attempt: Callable, delay: float, discard: Callable, retry_config: Dict = RETRY_CONFIG):
+    """hedged for the async pipeline: attempt is a coroutine function, both attempts run on the event loop
+
+    discard may return an awaitable, it is scheduled on the loop.
+    """
+    import asyncio
+
+    def discard_loser(task) -> None:
+        if not task.cancelled() and task.exception() is None:
+            result = discard(task.result())
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+
+    primary = asyncio.ensure_future(attempt(0))
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done or not withdraw("hedges", retry_config):
+        return await primary
+
+    pipeline_logger.info("Hedging request after %.3fs", delay)
+    hedge = asyncio.ensure_future(attempt(1))
+    pending = {primary, hedge}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                if task is hedge:
+                    with _lock:
+                        _counters["hedge_wins"] += 1
+                for loser in pending:
+                    loser.add_done_callback(discard_loser)
+                return task.result()
+
+    return primary.result()
+
+
+async def call_with_retries_async(call: Callable, retries: int, retryable: Callable[[Exception], bool], retry_config: Dict = RETRY_CONFIG):
+    """call_with_retries for a coroutine function, backing off without blocking the event loop"""
+    import asyncio
+
+    deposit(retry_config)
+    attempt = 0
+    while True:
+        try:
+            return await call(attempt)
+        except Exception as e:
+            if attempt >= retries or not retryable(e) or not withdraw("retries", retry_config):
+                raise
+            delay = backoff(attempt, retry_config)
+            pipeline_logger.warning("Retrying after %s (attempt %s) in %.3fs", e, attempt + 2, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def retry_stats() -> Dict:
+    """Retry/hedge counters and the remaining budget"""
+    with _lock:
+        stats = dict(_counters)
+        stats["budget"] = round(_budget["balance"], 2)
+    return stats
+
+
+def reset_retry_budget(balance: float = 0.0) -> None:
+    with _lock:
+        _budget["balance"] = balance
+        _budget["updated"] = time.monotonic()
+        for name in _counters:
+            _counters[name] = 0
+
+
+os.register_at_fork(after_in_child=_forget_pools)
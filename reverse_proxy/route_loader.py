@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from reverse_proxy.config.consts import ROUTES_FILE, ROUTES_WATCH_INTERVAL
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.router import set_live_routes, get_live_routes
+from reverse_proxy.upstreams import build_groups, install_groups
+
+
+_watcher = {"thread": None, "stop": None}
+
+
+def load_route_document(path: str) -> Dict:
+    """Read a JSON or YAML route file"""
+    with open(path, "r") as fh:
+        raw = fh.read()
+
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("PyYAML is required for YAML route files")
+        try:
+            routes = yaml.safe_load(raw)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid route file {path}: {e}")
+    else:
+        try:
+            routes = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid route file {path}: {e}")
+
+    return routes
+
+
+def parse_route_file(path: str) -> Dict:
+    """Read a JSON or YAML route file into a route config dict"""
+    return extract_routes(load_route_document(path), path)
+
+
+def extract_routes(document, path: str) -> Dict:
+    """Route table of a route document, which may sit under a top-level "routes" key"""
+    routes = document
+    if isinstance(routes, dict) and isinstance(routes.get("routes"), dict):
+        routes = routes["routes"]
+
+    if not isinstance(routes, dict) or not all(isinstance(k, str) and k.startswith("/") for k in routes):
+        raise ValueError(f"Invalid route file {path}: expected a mapping of '/path' -> target")
+
+    return routes
+
+
+def reload_routes(path: Optional[str] = ROUTES_FILE) -> Dict:
+    """Load the route file and atomically swap it in as the live table
+
+    A document of the form {"routes": {...}, "upstreams": {...}} also
+    replaces the upstream groups.
+
+    Raises ValueError (keeping the current routes) if the file is missing or invalid.
+    """
+    if not path:
+        raise ValueError("No route file configured (REVERSE_PROXY_ROUTES_FILE)")
+
+    try:
+        document = load_route_document(path)
+    except OSError as e:
+        raise ValueError(f"Cannot read route file {path}: {e}")
+
+    routes = extract_routes(document, path)
+    upstreams = document.get("upstreams") if isinstance(document.get("routes"), dict) else None
+
+    groups = None
+    if upstreams is not None:
+        if not isinstance(upstreams, dict):
+            raise ValueError(f"Invalid route file {path}: \"upstreams\" must be a mapping")
+        groups = build_groups(upstreams)
+
+    # only swap anything in once both halves are known to be valid
+    set_live_routes(routes)
+    if groups is not None:
+        install_groups(groups)
+    pipeline_logger.info("Reloaded routes from %s", path)
+    return routes
+
+
+def _file_signature(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def watch_routes(path: Optional[str] = ROUTES_FILE, interval: float = ROUTES_WATCH_INTERVAL) -> Optional[threading.Thread]:
+    """Poll the route file in a background thread and reload it when it changes"""
+    if not path or interval <= 0 or _watcher["thread"] is not None:
+        return _watcher["thread"]
+
+    stop = threading.Event()
+
+    def run() -> None:
+        last = _file_signature(path)
+        while not stop.wait(interval):
+            current = _file_signature(path)
+            if current is None or current == last:
+                continue
+            last = current
+            try:
+                reload_routes(path)
+            except ValueError as e:
+                pipeline_logger.error("Route reload failed, keeping current routes: %s", e)
+
+    thread = threading.Thread(target=run, name="route-watcher", daemon=True)
+    _watcher.update(thread=thread, stop=stop)
+    thread.start()
+    return thread
+
+
+def stop_watching_routes() -> None:
+    """Stop the route file watcher"""
+    thread, stop = _watcher["thread"], _watcher["stop"]
+    if thread is None:
+        return
+    stop.set()
+    thread.join()
+    _watcher.update(thread=None, stop=None)
+
+
+def init_routes(path: Optional[str] = ROUTES_FILE) -> Dict:
+    """Load the configured route file at startup, ROUTE_CONFIG stays live without one"""
+    if path:
+        return reload_routes(path)
+    return get_live_routes()
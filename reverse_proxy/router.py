@@ -1,14 +1,246 @@
-from typing import Dict
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
 
 from reverse_proxy.config.consts import ROUTE_CONFIG
 from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.stages import route_stages
 
-def route_to_target(path:str, route_config: Dict = ROUTE_CONFIG) -> str: 
-    """Map request path to target URL"""
-    if path not in route_config: 
-        available = ", ".join(route_config.keys())
-        raise ValueError(f"Unknown path: {path}, Available: {available}")
 
-    target_url = route_config[path]
-    pipeline_logger.info(f"Routed: {path} -> {target_url}")
-    return target_url
\ No newline at end of file
+# Route patterns are matched segment by segment through a prefix tree:
+#   "/google"                 static segments, longest prefix wins and the
+#                             unmatched tail is appended ("/google/search" ->
+#                             "https://www.google.com/search")
+#   "/users/{id}/posts"       {name} captures one segment, usable in the target
+#                             as "https://api.example.com/users/{id}/posts"
+#   "/assets/*/latest"        * matches any one segment without capturing
+#
+# A route value is a target URL, a dict:
+#   {"target": "https://...", "host": "api.example.com", "methods": ["GET"]}
+# or a list of such dicts sharing one pattern with different host/method
+# predicates (host-specific routes are tried first, then in list order).
+
+_compiled: Dict[int, Tuple[Dict, Dict]] = {}
+_compiled_lock = threading.Lock()
+
+# Live route table, replaced wholesale by set_live_routes. Readers take one
+# reference per request, so a swap never affects a request already routed.
+_live = {"config": ROUTE_CONFIG, "table": None, "version": 0}
+
+
+def _new_node() -> Dict:
+    return {"static": {}, "param": None, "wildcard": None, "routes": []}
+
+
+def _split(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+def _is_traversal(segment: str) -> bool:
+    """Whether a segment is, or (percent-decoded) contains, a "." or ".." path segment"""
+    decoded = unquote(segment).replace("\\", "/")
+    return any(part in (".", "..") for part in decoded.split("/"))
+
+
+def normalize_route(pattern: str, value) -> Dict:
+    """Expand a route config entry into its full dict form"""
+    route = {"target": value} if isinstance(value, str) else dict(value)
+    if not route.get("target"):
+        raise ValueError(f"Route {pattern} has no target")
+
+    route["pattern"] = pattern
+    route["host"] = route["host"].lower() if route.get("host") else None
+    route["methods"] = [method.upper() for method in route["methods"]] if route.get("methods") else None
+    route["stages"] = route_stages(route)
+    return route
+
+
+def normalize_routes(pattern: str, value) -> List[Dict]:
+    """Expand a route config value, single or list, into route dicts"""
+    values = value if isinstance(value, list) else [value]
+    return [normalize_route(pattern, item) for item in values]
+
+
+def compile_routes(route_config: Dict) -> Dict:
+    """Compile a route config into a prefix tree of path segments"""
+    root = _new_node()
+
+    for pattern, value in route_config.items():
+        node = root
+        for segment in _split(pattern):
+            if segment == "*":
+                node["wildcard"] = node["wildcard"] or _new_node()
+                node = node["wildcard"]
+            elif segment.startswith("{") and segment.endswith("}"):
+                if node["param"] is None:
+                    node["param"] = (segment[1:-1], _new_node())
+                elif node["param"][0] != segment[1:-1]:
+                    raise ValueError(f"Conflicting parameter names at {pattern}")
+                node = node["param"][1]
+            else:
+                node = node["static"].setdefault(segment, _new_node())
+
+        node["routes"].extend(normalize_routes(pattern, value))
+        # host-specific routes are tried before generic ones
+        node["routes"].sort(key=lambda r: r["host"] is None)
+
+    return root
+
+
+def get_route_table(route_config: Dict) -> Dict:
+    """Compiled table for a route config, compiled once per config object
+
+    Configs are treated as immutable once routed against; build a new dict
+    (or call compile_routes) to change the routes.
+    """
+    live = _live
+    if route_config is live["config"] and live["table"] is not None:
+        return live["table"]
+
+    key = id(route_config)
+    cached = _compiled.get(key)
+    if cached is not None and cached[0] is route_config:
+        return cached[1]
+
+    table = compile_routes(route_config)
+    with _compiled_lock:
+        if len(_compiled) >= 16:
+            _compiled.clear()
+        _compiled[key] = (route_config, table)
+    return table
+
+
+def get_live_routes() -> Dict:
+    """Current route config snapshot"""
+    return _live["config"]
+
+
+def live_routes_version() -> int:
+    """Number of times the live routes have been replaced"""
+    return _live["version"]
+
+
+def set_live_routes(route_config: Dict) -> Dict:
+    """Compile a route config and atomically make it the live table
+
+    Raises ValueError, leaving the current table in place, if it doesn't compile.
+    """
+    global _live
+    table = compile_routes(route_config)
+    with _compiled_lock:
+        _live = {"config": route_config, "table": table, "version": _live["version"] + 1}
+    pipeline_logger.info("Live routes replaced: %s routes (version %s)", len(route_config), _live['version'])
+    return route_config
+
+
+def _select(routes: List[Dict], host: Optional[str], method: Optional[str]) -> Optional[Dict]:
+    """First route at a node whose host/method predicates accept the request"""
+    for route in routes:
+        if route["host"] and route["host"] != host:
+            continue
+        if route["methods"] and method and method.upper() not in route["methods"]:
+            continue
+        return route
+    return None
+
+
+def _walk(node: Dict, segments: List[str], index: int, params: Dict, host: Optional[str], method: Optional[str]) -> Optional[Tuple[Dict, int, Dict]]:
+    """Deepest route reachable from node, preferring static > param > wildcard"""
+    if index < len(segments):
+        segment = segments[index]
+
+        child = node["static"].get(segment)
+        if child is not None:
+            found = _walk(child, segments, index + 1, params, host, method)
+            if found:
+                return found
+
+        if node["param"] is not None:
+            name, child = node["param"]
+            found = _walk(child, segments, index + 1, {**params, name: segment}, host, method)
+            if found:
+                return found
+
+        if node["wildcard"] is not None:
+            found = _walk(node["wildcard"], segments, index + 1, params, host, method)
+            if found:
+                return found
+
+    route = _select(node["routes"], host, method) if node["routes"] else None
+    return (route, index, params) if route else None
+
+
+def build_target_url(target: str, params: Dict, remainder: str) -> str:
+    """Fill captured params into the target and append the unmatched path
+
+    Params and remainder segments arrive decoded, each is percent-encoded
+    whole, so a "?", "#", "@", ":" or "/" in one can't add a query, change
+    the host or split the segment.
+    """
+    for name, value in params.items():
+        target = target.replace("{" + name + "}", quote(value, safe=""))
+
+    if not remainder:
+        return target
+
+    remainder = "/".join(quote(segment, safe="") for segment in remainder.split("/"))
+    scheme, netloc, path, query, fragment = urlsplit(target)
+    return urlunsplit((scheme, netloc, path.rstrip("/") + remainder, query, fragment))
+
+
+def match_route(path: str, route_config: Optional[Dict] = None, host: Optional[str] = None, method: Optional[str] = None) -> Dict:
+    """Find the route for a request path
+
+    Matches against the live routes unless a route config is given.
+    Returns a dict with the matched "route" options, captured "params" and
+    the rewritten "target_url". Lookup cost depends on the path length, not
+    on the number of routes.
+    """
+    table = get_route_table(route_config if route_config is not None else _live["config"])
+    host = host.split(":")[0].lower() if host else None
+    segments = _split(path)
+    # remainders and params are joined onto the target's path, a dot segment
+    # (also %2e%2e, ..%2f) would climb out of the route's base path upstream
+    if any(_is_traversal(segment) for segment in segments):
+        raise ValueError(f"Invalid path: {path}")
+
+    found = _walk(table, segments, 0, {}, host, method)
+    if not found:
+        raise ValueError(f"Unknown path: {path}")
+
+    route, consumed, params = found
+    remainder = ""
+    if consumed < len(segments):
+        remainder = "/" + "/".join(segments[consumed:])
+        if path.endswith("/"):
+            remainder += "/"
+
+    return {
+        "route": route,
+        "params": params,
+        "target_url": build_target_url(route["target"], params, remainder)
+    }
+
+
+def route_to_target(path: str, route_config: Optional[Dict] = None, host: Optional[str] = None, method: Optional[str] = None) -> str:
+    """Map request path to target URL (the live routes unless a config is given)"""
+    target_url = match_route(path, route_config, host, method)["target_url"]
+    pipeline_logger.info("Routed: %s -> %s", path, target_url)
+    return target_url
+
+
+def route_origins(route_config: Optional[Dict] = None) -> List[str]:
+    """Distinct upstream origins (scheme://host/) referenced by a route config"""
+    if route_config is None:
+        route_config = _live["config"]
+
+    origins = []
+    for pattern, value in route_config.items():
+        for route in normalize_routes(pattern, value):
+            parts = urlsplit(route["target"])
+            if parts.scheme not in ["http", "https"]:
+                continue
+            origin = f"{parts.scheme}://{parts.netloc}/"
+            if origin not in origins:
+                origins.append(origin)
+    return origins
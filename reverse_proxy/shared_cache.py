@@ -0,0 +1,515 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from reverse_proxy.config.consts import SHARED_CACHE_CONFIG, STREAM_CHUNK_SIZE
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.streams import close_stream
+
+
+# Response cache tier shared by the worker processes of one host, consulted
+# by cache.py after an in-process miss (see SHARED_CACHE_CONFIG).
+#
+#   <directory>/index-<slots>     memory-mapped slots of (key digest, expires at, last access, body size)
+#   <directory>/bodies/<digest>   metadata header followed by the body
+#   <directory>/tmp/              bodies still being written
+#
+# A body is written under tmp/ and renamed into bodies/ before its slot is
+# published, so readers never see a partial file and a crashed writer leaves
+# only a temp file, removed by the next process that opens the cache. Index
+# updates are serialized with flock; lookups take no lock and check the body
+# file's own header instead. Each key holds one variant, served only to
+# requests with the same values for its Vary headers. Times are wall-clock,
+# monotonic clocks can't be compared across processes.
+
+INDEX_MAGIC = b"RPXIDX01"
+BODY_MAGIC = b"RPXB"
+PROBES = 8              # slots a key may occupy, starting at its hash
+EVICTION_SAMPLE = 16    # slots sampled per eviction, the least recently used one goes
+
+_HEADER = struct.Struct("<8sQ")         # magic, total body bytes
+_SLOT = struct.Struct("<16sddQ")        # key digest, expires at, last access, body size
+_BODY_HEADER = struct.Struct("<4sI")    # magic, metadata length
+_LAST_ACCESS = struct.Struct("<d")
+_LAST_ACCESS_AT = 24                    # offset of last access within a slot
+_EMPTY = bytes(16)
+
+_state = {"pid": None, "directory": None, "index": None, "lock_fd": None, "slots": 0}
+_lock = threading.Lock()  # flock doesn't exclude the threads of one process
+_counters = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0, "write_errors": 0}
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_orphans(tmp_dir: str) -> None:
+    """Delete temp bodies whose writer process is gone"""
+    for name in os.listdir(tmp_dir):
+        parts = name.split(".")
+        if len(parts) > 1 and parts[1].isdigit() and _alive(int(parts[1])):
+            continue
+        try:
+            os.unlink(os.path.join(tmp_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def _remove_bodies(bodies_dir: str) -> None:
+    for name in os.listdir(bodies_dir):
+        try:
+            os.unlink(os.path.join(bodies_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def _open(config: Dict) -> Optional[Dict]:
+    """This process's handle on the shared cache, None when it is disabled
+
+    Reopened after a fork: flock locks belong to the open file, which a child
+    would otherwise share with its parent.
+    """
+    directory = config.get("directory")
+    if not directory:
+        return None
+    if _state["pid"] == os.getpid() and _state["directory"] == directory:
+        return _state
+
+    with _lock:
+        if _state["pid"] == os.getpid() and _state["directory"] == directory:
+            return _state
+
+        for sub in ["bodies", "tmp"]:
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        lock_fd = os.open(os.path.join(directory, "lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        slots = config["slots"]
+        size = _HEADER.size + _SLOT.size * slots
+
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            fd = os.open(os.path.join(directory, f"index-{slots}"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size != size:
+                    os.ftruncate(fd, size)
+                index = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+
+            if index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                # a new index knows none of the bodies already on disk
+                _remove_bodies(os.path.join(directory, "bodies"))
+                index[:] = bytes(size)
+                _HEADER.pack_into(index, 0, INDEX_MAGIC, 0)
+            _remove_orphans(os.path.join(directory, "tmp"))
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+        if _state["lock_fd"] is not None:
+            # the previous directory's, or the parent's before a fork
+            os.close(_state["lock_fd"])
+        _state.update(pid=os.getpid(), directory=directory, index=index, lock_fd=lock_fd, slots=slots)
+        pipeline_logger.info("Shared cache opened at %s (%s slots)", directory, slots)
+    return _state
+
+
+@contextmanager
+def _locked(state: Dict) -> Iterator[None]:
+    with _lock:
+        fcntl.flock(state["lock_fd"], fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(state["lock_fd"], fcntl.LOCK_UN)
+
+
+def _digest(primary: Tuple) -> bytes:
+    return hashlib.blake2b(repr(primary).encode("utf-8"), digest_size=16).digest()
+
+
+def _offset(slot: int) -> int:
+    return _HEADER.size + slot * _SLOT.size
+
+
+def _probe(state: Dict, digest: bytes) -> List[int]:
+    start = int.from_bytes(digest[:8], "little") % state["slots"]
+    return [(start + i) % state["slots"] for i in range(min(PROBES, state["slots"]))]
+
+
+def _find(state: Dict, digest: bytes) -> Optional[int]:
+    for slot in _probe(state, digest):
+        if state["index"][_offset(slot):_offset(slot) + len(digest)] == digest:
+            return slot
+    return None
+
+
+def _body_path(state: Dict, digest: bytes) -> str:
+    return os.path.join(state["directory"], "bodies", digest.hex())
+
+
+def _total(state: Dict) -> int:
+    return _HEADER.unpack_from(state["index"], 0)[1]
+
+
+def _add_total(state: Dict, size: int) -> None:
+    _HEADER.pack_into(state["index"], 0, INDEX_MAGIC, max(0, _total(state) + size))
+
+
+def _evict_slot(state: Dict, slot: int) -> None:
+    """Free a slot and delete its body, readers holding the file open keep it (called locked)"""
+    digest, _, _, size = _SLOT.unpack_from(state["index"], _offset(slot))
+    if digest == _EMPTY:
+        return
+    state["index"][_offset(slot):_offset(slot) + _SLOT.size] = bytes(_SLOT.size)
+    _add_total(state, -size)
+    try:
+        os.unlink(_body_path(state, digest))
+    except FileNotFoundError:
+        pass
+    _counters["evictions"] += 1
+
+
+def _claim(state: Dict, digest: bytes, now: float) -> int:
+    """Slot for a new key in its probe window: a free one, else an expired one, else the least recently used"""
+    def rank(slot):
+        occupant, expires_at, last_access, _ = _SLOT.unpack_from(state["index"], _offset(slot))
+        return (occupant != _EMPTY, expires_at > now, last_access)
+
+    return min(_probe(state, digest), key=rank)
+
+
+def _evict_over_budget(state: Dict, max_bytes: int, keep: int) -> None:
+    """Sampled LRU eviction until the bodies fit max_bytes (called locked)"""
+    index = state["index"]
+
+    def occupied(slot):
+        return slot != keep and index[_offset(slot):_offset(slot) + len(_EMPTY)] != _EMPTY
+
+    while _total(state) > max_bytes:
+        sample = random.sample(range(state["slots"]), min(EVICTION_SAMPLE, state["slots"]))
+        candidates = [slot for slot in sample if occupied(slot)] or [slot for slot in range(state["slots"]) if occupied(slot)]
+        if not candidates:
+            break
+        _evict_slot(state, min(candidates, key=lambda slot: _SLOT.unpack_from(index, _offset(slot))[2]))
+
+
+def _commit(state: Dict, digest: bytes, tmp_path: str, size: int, expires_at: float, config: Dict) -> None:
+    """Publish a fully written body under its key"""
+    with _locked(state):
+        now = time.time()
+        slot = _find(state, digest)
+        if slot is None:
+            slot = _claim(state, digest, now)
+            _evict_slot(state, slot)
+        else:
+            _add_total(state, -_SLOT.unpack_from(state["index"], _offset(slot))[3])
+
+        os.replace(tmp_path, _body_path(state, digest))
+        _SLOT.pack_into(state["index"], _offset(slot), digest, expires_at, now, size)
+        _add_total(state, size)
+        _counters["stored"] += 1
+        _evict_over_budget(state, config["max_bytes"], keep=slot)
+
+
+def _read_header(file, digest: bytes) -> Optional[Dict]:
+    head = file.read(_BODY_HEADER.size)
+    if len(head) < _BODY_HEADER.size:
+        return None
+    magic, length = _BODY_HEADER.unpack(head)
+    if magic != BODY_MAGIC:
+        return None
+    try:
+        meta = json.loads(file.read(length))
+    except ValueError:
+        return None
+    return meta if meta.get("digest") == digest.hex() else None
+
+
+def _load(state: Dict, digest: bytes, size: int, request_headers: CaseInsensitiveDict, now: float, config: Dict) -> Optional[Dict]:
+    try:
+        file = open(_body_path(state, digest), "rb")
+    except FileNotFoundError:
+        return None
+
+    meta = _read_header(file, digest)
+    body_offset = file.tell()
+    if (meta is None
+            or os.fstat(file.fileno()).st_size - body_offset != size
+            or any(request_headers.get(name) != value for name, value in meta["vary"].items())):
+        file.close()
+        return None
+
+    clock = time.monotonic()
+    entry = {
+        "status_code": meta["status_code"],
+        "reason": meta["reason"],
+        "url": meta["url"],
+        "encoding": meta["encoding"],
+        "headers": meta["headers"],
+        "body": None,
+        "file": None,
+        "size": size,
+        "vary": list(meta["vary"]),
+        "etag": meta["etag"],
+        "last_modified": meta["last_modified"],
+        "stored_at": clock - (now - meta["stored_at"]),
+        "initial_age": meta["initial_age"],
+        "expires_at": clock + (meta["expires_at"] - now)
+    }
+    if size < config["zero_copy_min_bytes"]:
+        entry["body"] = file.read()
+        file.close()
+    else:
+        # positioned at the body, for wsgi.file_wrapper
+        entry["file"] = file
+    return entry
+
+
+def shared_lookup(primary: Tuple, request_headers: CaseInsensitiveDict, config: Dict = SHARED_CACHE_CONFIG) -> Optional[Dict]:
+    """Fresh entry stored by any worker for this key, None on a miss or when the tier is disabled
+
+    Bodies under zero_copy_min_bytes are read into "body", larger ones are
+    left in their file, open under "file".
+    """
+    state = _open(config)
+    if state is None:
+        return None
+
+    digest = _digest(primary)
+    now = time.time()
+    entry = None
+    slot = _find(state, digest)
+    if slot is not None:
+        _, expires_at, _, size = _SLOT.unpack_from(state["index"], _offset(slot))
+        if expires_at > now:
+            entry = _load(state, digest, size, request_headers, now, config)
+    if entry is not None:
+        # unlocked, a racing update only blurs the LRU order
+        _LAST_ACCESS.pack_into(state["index"], _offset(slot) + _LAST_ACCESS_AT, now)
+
+    with _lock:
+        _counters["hits" if entry else "misses"] += 1
+    return entry
+
+
+def _begin(state: Dict, primary: Tuple, vary: List[str], request_headers: CaseInsensitiveDict, entry: Dict) -> Dict:
+    """Open a temp body file and write the entry's metadata header"""
+    digest = _digest(primary)
+    now, clock = time.time(), time.monotonic()
+    meta = {
+        "digest": digest.hex(),
+        "status_code": entry["status_code"],
+        "reason": entry["reason"],
+        "url": entry["url"],
+        "encoding": entry["encoding"],
+        "headers": entry["headers"],
+        "vary": {name: request_headers.get(name) for name in vary},
+        "etag": entry["etag"],
+        "last_modified": entry["last_modified"],
+        "stored_at": now - (clock - entry["stored_at"]),
+        "initial_age": entry["initial_age"],
+        "expires_at": now + (entry["expires_at"] - clock)
+    }
+    data = json.dumps(meta).encode("utf-8")
+
+    path = os.path.join(state["directory"], "tmp", f"{digest.hex()}.{os.getpid()}.{threading.get_ident()}.tmp")
+    file = open(path, "wb")
+    file.write(_BODY_HEADER.pack(BODY_MAGIC, len(data)) + data)
+    return {"state": state, "digest": digest, "path": path, "file": file, "size": 0, "expires_at": meta["expires_at"], "done": False}
+
+
+def _abort(writer: Dict) -> None:
+    writer["done"] = True
+    writer["file"].close()
+    try:
+        os.unlink(writer["path"])
+    except FileNotFoundError:
+        pass
+
+
+def _finish(writer: Dict, config: Dict) -> None:
+    writer["done"] = True
+    try:
+        writer["file"].flush()
+        if config.get("fsync"):
+            os.fsync(writer["file"].fileno())
+        writer["file"].close()
+        _commit(writer["state"], writer["digest"], writer["path"], writer["size"], writer["expires_at"], config)
+    except OSError as e:
+        _write_failed(writer, e)
+
+
+def _write_failed(writer: Dict, error: OSError) -> None:
+    _abort(writer)
+    with _lock:
+        _counters["write_errors"] += 1
+    pipeline_logger.warning("Shared cache write failed: %s", error)
+
+
+def shared_store(primary: Tuple, vary: List[str], request_headers: CaseInsensitiveDict, entry: Dict, config: Dict = SHARED_CACHE_CONFIG) -> None:
+    """Publish an entry whose body is in memory to the other workers"""
+    state = _open(config)
+    if state is None or entry["size"] > config["max_entry_bytes"]:
+        return
+
+    try:
+        writer = _begin(state, primary, vary, request_headers, entry)
+    except OSError as e:
+        pipeline_logger.warning("Shared cache write failed: %s", e)
+        return
+    try:
+        writer["file"].write(entry["body"])
+    except OSError as e:
+        _write_failed(writer, e)
+        return
+    writer["size"] = entry["size"]
+    _finish(writer, config)
+
+
+class _ChunkReader:
+    """Minimal file-like raw for a requests.Response, read by iter_content chunk by chunk
+
+    on_close runs once on close(), also when chunks was never started (its
+    generator's finally wouldn't run then).
+    """
+
+    def __init__(self, chunks: Iterator[bytes], on_close: Optional[Callable[[], None]] = None):
+        self.chunks = chunks
+        self.on_close = on_close
+
+    def read(self, size: int = -1) -> bytes:
+        return next(self.chunks, b"")
+
+    def close(self) -> None:
+        on_close, self.on_close = self.on_close, None
+        try:
+            close_stream(self.chunks)
+        finally:
+            if on_close is not None:
+                on_close()
+
+
+def iter_file(file, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a file from its current position, closing it when done"""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+def file_reader(file) -> _ChunkReader:
+    return _ChunkReader(iter_file(file), file.close)
+
+
+def _tee(response: requests.Response, writer: Optional[Dict], config: Dict) -> Iterator[bytes]:
+    complete = False
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if not chunk:
+                continue
+            if writer is not None:
+                try:
+                    writer["file"].write(chunk)
+                    writer["size"] += len(chunk)
+                except OSError as e:
+                    _write_failed(writer, e)
+                    writer = None
+                if writer is not None and writer["size"] > config["max_entry_bytes"]:
+                    _abort(writer)
+                    writer = None
+            yield chunk
+        complete = True
+    finally:
+        response.close()
+        if writer is not None:
+            if complete:
+                _finish(writer, config)
+            else:
+                # the client went away or the upstream broke off, nothing is published
+                _abort(writer)
+
+
+def tee_response(response: requests.Response, primary: Tuple, vary: List[str], request_headers: CaseInsensitiveDict, entry: Dict,
+                 headers: Optional[Dict] = None, config: Dict = SHARED_CACHE_CONFIG) -> requests.Response:
+    """Stream a response too large for the in-process cache into the shared tier as it is relayed
+
+    entry holds the metadata cache_store would keep (everything but the
+    body). The body is published once it has been read to the end. Returns
+    the response to relay, decoded like any cached body, with headers (the
+    entry's by default).
+    """
+    state = _open(config)
+    declared = response.headers.get("Content-Length")
+    if state is None or (declared and declared.isdigit() and int(declared) > config["max_entry_bytes"]):
+        return response
+
+    try:
+        writer = _begin(state, primary, vary, request_headers, entry)
+    except OSError as e:
+        pipeline_logger.warning("Shared cache write failed: %s", e)
+        return response
+
+    def release() -> None:
+        # a teed body that is never relayed (HEAD, an error before the first
+        # chunk) never runs _tee's finally
+        response.close()
+        if not writer["done"]:
+            _abort(writer)
+
+    teed = requests.Response()
+    teed.status_code = response.status_code
+    teed.reason = response.reason
+    teed.url = response.url
+    teed.encoding = response.encoding
+    teed.headers = CaseInsensitiveDict(headers if headers is not None else entry["headers"])
+    teed.raw = _ChunkReader(_tee(response, writer, config), release)
+    return teed
+
+
+def shared_stats(config: Dict = SHARED_CACHE_CONFIG) -> Dict:
+    """Counters of this worker plus the entries and bytes held for the whole host"""
+    state = _open(config)
+    if state is None:
+        return {"enabled": False}
+
+    with _lock:
+        stats = dict(_counters)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["enabled"] = True
+    stats["entries"] = sum(1 for slot in range(state["slots"]) if state["index"][_offset(slot):_offset(slot) + len(_EMPTY)] != _EMPTY)
+    stats["bytes"] = _total(state)
+    stats["max_bytes"] = config["max_bytes"]
+    return stats
+
+
+def clear_shared(config: Dict = SHARED_CACHE_CONFIG) -> None:
+    """Drop every shared entry and reset this worker's counters"""
+    state = _open(config)
+    if state is not None:
+        with _locked(state):
+            for slot in range(state["slots"]):
+                _evict_slot(state, slot)
+    with _lock:
+        for name in _counters:
+            _counters[name] = 0
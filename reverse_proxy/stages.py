@@ -0,0 +1,193 @@
+import inspect
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from reverse_proxy.config.consts import DEFAULT_STAGES
+
+
+# Per-route request pipelines.
+#
+# A route lists the stages its requests go through, in order (DEFAULT_STAGES
+# when it lists none):
+#
+#   {"target": "https://api.example.com", "stages": ["ratelimit", "headers", "upstream"]}
+#
+# Stages before "upstream" are middleware around the upstream call, called as
+# stage(ctx, call_next): they may change the request, see ctx["raw"] (the
+# upstream response) once call_next returns, or answer the request themselves
+# by setting ctx["raw"] without calling call_next, as a cache hit does (see
+# stage_response). The raw response is then turned into the response dict,
+# and stages after "upstream" are called as stage(ctx) to rewrite
+# ctx["response"].
+#
+# A stage is registered with a factory taking the route dict, called once
+# per route; it returns the stage callable, or None when the stage has
+# nothing to do for that route. The chain is composed into one function the
+# first time a route is used, so a request only runs its own route's stages.
+#
+# The async pipeline (proxy_request_async) runs the same stage lists from
+# each stage's async form, where request stages are awaited as
+# stage(ctx, call_next) and await call_next(ctx). Request stages without an
+# async form can't run there; once require_async_stages() has been called
+# (the ASGI adapter does on startup) routes using one are rejected as they
+# load. Response stages without an async form run their sync form, with an
+# async chunk iterator under ctx["response"]["stream"].
+
+REQUEST = "request"
+RESPONSE = "response"
+UPSTREAM = "upstream"
+
+# built-in stages, implemented and registered by reverse_proxy/proxy_service.py
+BUILTIN_STAGES = {
+    "ratelimit": REQUEST,
+    "headers": REQUEST,
+    "cache": REQUEST,
+    "transform": RESPONSE,
+    "compress": RESPONSE
+}
+
+Stage = Callable[..., None]
+StageFactory = Callable[[Dict], Optional[Stage]]
+
+_registry: Dict[str, Dict] = {}
+_checks = {"async": False}
+
+
+def register_stage(name: str, factory: StageFactory, phase: str = REQUEST, async_factory: Optional[StageFactory] = None) -> None:
+    """Make a stage available to route stage lists
+
+    phase is REQUEST for middleware running before the upstream call,
+    RESPONSE for stages rewriting the response dict after it. async_factory
+    builds the stage's form for the async pipeline.
+    """
+    if phase not in [REQUEST, RESPONSE]:
+        raise ValueError(f"Unknown stage phase: {phase}")
+    if name == UPSTREAM:
+        raise ValueError(f"{UPSTREAM} is not a registrable stage")
+    _registry[name] = {"factory": factory, "phase": phase, "async_factory": async_factory}
+
+
+def require_async_stages(required: bool = True) -> None:
+    """Reject routes whose stages can't all run on the async pipeline from now on"""
+    _checks["async"] = required
+
+
+def validate_stages(names: List[str]) -> List[str]:
+    """Check a route's stage list, returning it as a list
+
+    Raises ValueError for unknown stages, a missing "upstream", or a stage
+    on the wrong side of it.
+    """
+    if not isinstance(names, (list, tuple)) or not all(isinstance(name, str) for name in names):
+        raise ValueError(f"Stages must be a list of names, got {names!r}")
+    if list(names).count(UPSTREAM) != 1:
+        raise ValueError(f"Stages must include {UPSTREAM!r} exactly once: {list(names)}")
+
+    phases = {**BUILTIN_STAGES, **{name: stage["phase"] for name, stage in _registry.items()}}
+    split = list(names).index(UPSTREAM)
+    for position, name in enumerate(names):
+        if name == UPSTREAM:
+            continue
+        if name not in phases:
+            raise ValueError(f"Unknown stage: {name}")
+        expected = REQUEST if position < split else RESPONSE
+        if phases[name] != expected:
+            side = "before" if phases[name] == REQUEST else "after"
+            raise ValueError(f"Stage {name!r} must come {side} {UPSTREAM!r}")
+        # built-in stages all have async forms
+        if _checks["async"] and expected == REQUEST and name in _registry and _registry[name]["async_factory"] is None:
+            raise ValueError(f"Stage {name!r} has no async form, it can't run on the async pipeline")
+    return list(names)
+
+
+def stage_response(status_code: int, body: bytes = b"", headers: Optional[Dict] = None) -> requests.Response:
+    """A local response for a stage answering the request itself, set as ctx["raw"]"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict({"Content-Type": "text/plain", **(headers or {})})
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+def route_stages(route: Dict) -> List[str]:
+    return validate_stages(route.get("stages") or DEFAULT_STAGES)
+
+
+def _build(name: str, route: Dict) -> Optional[Stage]:
+    if name not in _registry:
+        raise ValueError(f"Stage {name!r} is not registered")
+    return _registry[name]["factory"](route)
+
+
+def _wrap(stage: Stage, call_next: Callable[[Dict], None]) -> Callable[[Dict], None]:
+    def handler(ctx: Dict) -> None:
+        stage(ctx, call_next)
+    return handler
+
+
+def compile_stages(route: Dict, upstream: Callable[[Dict], None], respond: Callable[[Dict], None]) -> Callable[[Dict], Dict]:
+    """Compose a route's stages around upstream (sets ctx["raw"]) and respond (sets ctx["response"])"""
+    names = route_stages(route)
+    split = names.index(UPSTREAM)
+
+    handler = upstream
+    for name in reversed(names[:split]):
+        stage = _build(name, route)
+        if stage is not None:
+            handler = _wrap(stage, handler)
+
+    steps = tuple(step for step in (_build(name, route) for name in names[split + 1:]) if step is not None)
+
+    def pipeline(ctx: Dict) -> Dict:
+        handler(ctx)
+        respond(ctx)
+        for step in steps:
+            step(ctx)
+        return ctx["response"]
+
+    return pipeline
+
+
+def _build_async(name: str, route: Dict) -> Optional[Stage]:
+    if name not in _registry:
+        raise ValueError(f"Stage {name!r} is not registered")
+    stage = _registry[name]
+    if stage["async_factory"] is not None:
+        return stage["async_factory"](route)
+    if stage["phase"] == REQUEST:
+        raise ValueError(f"Stage {name!r} has no async form, it can't run on the async pipeline")
+    return stage["factory"](route)
+
+
+def _wrap_async(stage: Stage, call_next: Callable) -> Callable:
+    async def handler(ctx: Dict) -> None:
+        await stage(ctx, call_next)
+    return handler
+
+
+def compile_stages_async(route: Dict, upstream: Callable, respond: Callable[[Dict], None]) -> Callable:
+    """compile_stages for the async pipeline, upstream and the request stages are coroutine functions"""
+    names = route_stages(route)
+    split = names.index(UPSTREAM)
+
+    handler = upstream
+    for name in reversed(names[:split]):
+        stage = _build_async(name, route)
+        if stage is not None:
+            handler = _wrap_async(stage, handler)
+
+    steps = tuple(step for step in (_build_async(name, route) for name in names[split + 1:]) if step is not None)
+
+    async def pipeline(ctx: Dict) -> Dict:
+        await handler(ctx)
+        respond(ctx)
+        for step in steps:
+            result = step(ctx)
+            if inspect.isawaitable(result):
+                await result
+        return ctx["response"]
+
+    return pipeline
@@ -0,0 +1,104 @@
+import inspect
+from typing import AsyncIterable, Callable, Iterable, Optional
+
+
+# Streamed bodies are chains of chunk iterators (upstream body -> transforms ->
+# compression -> lease release -> metrics). A generator's finally block only
+# runs once the generator has started, so a body that is never iterated (a
+# HEAD request, an error before the first chunk) would never give back its
+# upstream connection, lease or in-flight count. ClosingStream layers always
+# clean up: close() closes the layer's own iterator and its source, then runs
+# on_close, exactly once, whether the body was relayed, cut short or never
+# started. Running out of chunks or failing closes the stream as well.
+#
+# on_close gets the exception that ended iteration, or None.
+
+
+def close_stream(chunks) -> None:
+    """Close a chunk iterator if it can be closed"""
+    close = getattr(chunks, "close", None)
+    if close:
+        close()
+
+
+class ClosingStream:
+    """Chunk iterator over chunks whose close() always runs, see the module comment
+
+    source is the iterator chunks reads from, when chunks is a generator
+    wrapping it (generators don't pass close() on before they start).
+    """
+
+    def __init__(self, chunks: Iterable[bytes], on_close: Optional[Callable[[Optional[BaseException]], None]] = None, source=None):
+        self._chunks = chunks
+        self._iterator = iter(chunks)
+        self._source = source
+        self._on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        if self.closed:
+            raise StopIteration
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self.close()
+            raise
+        except BaseException as e:
+            self.close(e)
+            raise
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close_stream(self._chunks)
+            if self._source is not None:
+                close_stream(self._source)
+        finally:
+            if self._on_close is not None:
+                self._on_close(error)
+
+
+class AsyncClosingStream:
+    """Async counterpart of ClosingStream, closed with aclose(); on_close may be a coroutine function"""
+
+    def __init__(self, chunks: AsyncIterable[bytes], on_close: Optional[Callable] = None, source=None):
+        self._chunks = chunks
+        self._iterator = chunks.__aiter__()
+        self._source = source
+        self._on_close = on_close
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+        except BaseException as e:
+            await self.aclose(e)
+            raise
+
+    async def aclose(self, error: Optional[BaseException] = None) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            for chunks in [self._chunks, self._source]:
+                aclose = getattr(chunks, "aclose", None)
+                if aclose:
+                    await aclose()
+        finally:
+            if self._on_close is not None:
+                result = self._on_close(error)
+                if inspect.isawaitable(result):
+                    await result
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from reverse_proxy.config.consts import TRANSFORM_CACHE_CONFIG
+from reverse_proxy.config.logging import pipeline_logger
+
+
+# Transformed bodies keyed on (digest of the upstream text, canonical options),
+# LRU-evicted once the memory held by cached strings passes max_bytes.
+_entries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "evictions": 0}
+_size = [0]
+
+
+def options_key(page_title: Optional[str], text_replaces: Optional[Dict]) -> str:
+    """Canonical string for a set of transform options
+
+    Replacements run in a single order-independent pass, so they are sorted.
+    """
+    replaces = sorted((str(k), str(v)) for k, v in text_replaces.items()) if isinstance(text_replaces, dict) else None
+    return json.dumps([page_title, replaces], separators=(",", ":"), ensure_ascii=False)
+
+
+def content_digest(text: str) -> str:
+    """Digest of the untransformed body"""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def transform_cache_key(text: str, page_title: Optional[str], text_replaces: Optional[Dict]) -> Tuple[str, str]:
+    """Memo key for one transform of one body"""
+    return content_digest(text), options_key(page_title, text_replaces)
+
+
+def get_transformed(key: Tuple[str, str], cache_config: Dict = TRANSFORM_CACHE_CONFIG) -> Optional[str]:
+    """Return the memoized output for a key, or None"""
+    if not cache_config.get("enabled"):
+        return None
+
+    with _lock:
+        result = _entries.get(key)
+        if result is None:
+            _counters["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _counters["hits"] += 1
+
+    pipeline_logger.debug("Transform cache hit: %s", key[0])
+    return result
+
+
+def put_transformed(key: Tuple[str, str], result: str, cache_config: Dict = TRANSFORM_CACHE_CONFIG) -> None:
+    """Memoize a transform output, evicting least recently used entries over budget"""
+    if not cache_config.get("enabled"):
+        return
+
+    size = sys.getsizeof(result)
+    if size > cache_config.get("max_entry_bytes", 0):
+        return
+
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _size[0] -= sys.getsizeof(previous)
+        _entries[key] = result
+        _size[0] += size
+
+        while _entries and _size[0] > cache_config.get("max_bytes", 0):
+            _, evicted = _entries.popitem(last=False)
+            _size[0] -= sys.getsizeof(evicted)
+            _counters["evictions"] += 1
+
+
+def transform_cache_stats() -> Dict:
+    """Hit ratio, counters and memory usage of the transform cache"""
+    with _lock:
+        stats = dict(_counters)
+        stats["entries"] = len(_entries)
+        stats["bytes"] = _size[0]
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["max_bytes"] = TRANSFORM_CACHE_CONFIG.get("max_bytes")
+    return stats
+
+
+def clear_transform_cache() -> None:
+    """Drop every entry and reset the counters"""
+    with _lock:
+        _entries.clear()
+        _size[0] = 0
+        for name in _counters:
+            _counters[name] = 0
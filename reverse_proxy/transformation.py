@@ -1,36 +1,242 @@
 
+import codecs
+import html
+import itertools
+import re
+from functools import lru_cache
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from typing import Dict, Optional, Any, Callable
+from typing import Dict, Optional, Any, Callable, Iterable, Iterator, Pattern, Tuple
+from reverse_proxy.compression import content_coding
+from reverse_proxy.config.consts import TRANSFORM_CACHE_CONFIG
 from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.streams import ClosingStream
+from reverse_proxy.transform_cache import transform_cache_key, get_transformed, put_transformed
+
+# Markup that can appear before the <title> inside <head>; comments, scripts and
+# styles are skipped whole so a "<title>" inside them is never rewritten.
+_HEAD_TOKEN = re.compile(r"<(?:(!--)|(script|style|title)\b|(/head|body)\b)", re.IGNORECASE)
+_CLOSING_TAGS = {
+    "script": re.compile(r"</script\s*>", re.IGNORECASE),
+    "style": re.compile(r"</style\s*>", re.IGNORECASE),
+    "title": re.compile(r"</title\s*>", re.IGNORECASE)
+}
+# Longest token prefix that may be split across chunks ("<script" / "<style")
+_TOKEN_HOLDBACK = 8
+# Give up looking for <title> if a single unterminated construct grows past this
+HEAD_SCAN_LIMIT = 1024 * 1024
+
+
+def _scan_head(buffer: str, new_title: str, final: bool) -> Tuple[str, str, bool]:
+    """Scan buffered <head> markup for the title
+
+    Returns (text safe to emit, text to keep buffering, whether scanning is done).
+    """
+    out = []
+    position = 0
+
+    while True: 
+        token = _HEAD_TOKEN.search(buffer, position)
+
+        if token is None: 
+            keep = 0 if final else min(len(buffer) - position, _TOKEN_HOLDBACK)
+            cut = len(buffer) - keep
+            out.append(buffer[position:cut])
+            return "".join(out), buffer[cut:], final
+
+        if token.group(3): 
+            # </head> or <body> without a title: nothing to rewrite
+            out.append(buffer[position:])
+            return "".join(out), "", True
+
+        if token.group(1): 
+            end = buffer.find("-->", token.end())
+            end = end + 3 if end != -1 else -1
+        else: 
+            name = token.group(2).lower()
+            open_end = buffer.find(">", token.end())
+            closing = _CLOSING_TAGS[name].search(buffer, open_end + 1) if open_end != -1 else None
+
+            if closing and name == "title": 
+                out.append(buffer[position:open_end + 1])
+                out.append(new_title)
+                pipeline_logger.info("Updated title: %s", new_title)
+                return "".join(out), buffer[closing.start():], True
+
+            end = closing.end() if closing else -1
+
+        if end == -1: 
+            # construct continues in a later chunk
+            out.append(buffer[position:token.start()])
+            rest = buffer[token.start():]
+            if final or len(rest) > HEAD_SCAN_LIMIT: 
+                out.append(rest)
+                return "".join(out), "", True
+            return "".join(out), rest, False
+
+        out.append(buffer[position:end])
+        position = end
+
+
+def rewrite_title_stream(chunks: Iterable[str], new_title: str) -> Iterator[str]: 
+    """Replace the <title> text of a streamed HTML document
+
+    Tokenizes only as far as the title (or </head>/<body> if there is none),
+    everything after that is passed through untouched without a DOM.
+    """
+    escaped_title = html.escape(new_title, quote=False)
+    buffer = ""
+    done = False
+
+    for chunk in chunks: 
+        if done: 
+            yield chunk
+            continue
+
+        buffer += chunk
+        out, buffer, done = _scan_head(buffer, escaped_title, final=False)
+        if out: 
+            yield out
+        if done and buffer: 
+            yield buffer
+            buffer = ""
+
+    if buffer: 
+        out, buffer, _ = _scan_head(buffer, escaped_title, final=True)
+        yield out + buffer
+
 
 def update_html_title(html: str, new_title: str) -> str:
     """update HTML page title"""
-    soup = BeautifulSoup(html, "html_parser")
-    if soup.title:
-        soup.title.string = new_title
-        pipeline_logger.info(f"Updated title: {new_title}")
-    return str(soup)
+    return "".join(rewrite_title_stream([html], new_title))
+
+@lru_cache(maxsize=256)
+def _compile_replacements(items: Tuple[Tuple[str, str], ...]) -> Tuple[Optional[Pattern], Dict[str, str], int]:
+    """Compile a replacement set into one alternation regex (cached per set)
+
+    Alternatives are ordered longest first, so Python's leftmost-first
+    alternation yields leftmost-longest matches.
+    """
+    mapping = {old: new for old, new in items if old}
+    if not mapping:
+        return None, mapping, 0
+
+    alternatives = sorted(mapping, key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(old) for old in alternatives))
+    return pattern, mapping, len(alternatives[0])
+
+
+def compile_replacements(replacements: Dict[str, str]) -> Tuple[Optional[Pattern], Dict[str, str], int]:
+    """Compiled (pattern, mapping, longest pattern length) for a replacement dict"""
+    return _compile_replacements(tuple(sorted((str(old), str(new)) for old, new in replacements.items())))
+
 
 def replace_text(text: str, replacements: Dict[str, str]) -> str: 
-    """Replace text based on replacement dict"""
-    result = text 
-    for old, new in replacements.items(): 
-        result = result.replace(old, new)
-        pipeline_logger.info(f"Replaced: '{old}' -> '{new}'")
+    """Replace text based on replacement dict
+
+    Single pass over the text: at each position the longest matching key
+    wins, and replaced output is never matched again, so the result does
+    not depend on the dict's order.
+    """
+    pattern, mapping, _ = compile_replacements(replacements)
+    if pattern is None: 
+        return text
+
+    result = pattern.sub(lambda match: mapping[match.group(0)], text)
+    pipeline_logger.info("Replaced text: %d patterns", len(mapping))
     return result 
 
+
+def replace_text_stream(chunks: Iterable[str], replacements: Dict[str, str]) -> Iterator[str]: 
+    """Apply replace_text incrementally over a stream of text chunks
+
+    Holds back at most (longest key - 1) characters between chunks, so a key
+    split across a chunk boundary is still matched, output is identical to
+    replace_text on the joined text.
+    """
+    pattern, mapping, longest = compile_replacements(replacements)
+    if pattern is None: 
+        yield from chunks
+        return
+
+    buffer = ""
+    for chunk in chunks: 
+        buffer += chunk
+        # every key starting before `safe` is fully inside the buffer
+        safe = len(buffer) - (longest - 1)
+        if safe <= 0: 
+            continue
+
+        out = []
+        position = 0
+        for match in pattern.finditer(buffer): 
+            if match.start() >= safe: 
+                break
+            out.append(buffer[position:match.start()])
+            out.append(mapping[match.group(0)])
+            position = match.end()
+
+        if position < safe: 
+            out.append(buffer[position:safe])
+            position = safe
+
+        buffer = buffer[position:]
+        if out: 
+            yield "".join(out)
+
+    if buffer: 
+        yield pattern.sub(lambda match: mapping[match.group(0)], buffer)
+
+def is_transformable(content_type: Optional[str]) -> bool: 
+    """Only text and HTML bodies are transformed"""
+    content_type = content_type or ""
+    return "text" in content_type or "html" in content_type
+
+
+def transform_stream(chunks: Iterable[bytes], encoding: Optional[str], page_title: Optional[str] = None, text_replaces: Optional[Dict] = None) -> Iterator[bytes]: 
+    """Transform a streamed body chunk by chunk (title rewrite, text replacement)
+
+    Bytes are decoded incrementally and re-encoded with the same charset, so
+    the upstream Content-Type stays accurate.
+    """
+    encoding = encoding or "utf-8"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+    def decoded() -> Iterator[str]: 
+        for chunk in chunks: 
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+
+    text_chunks = decoded()
+    if page_title: 
+        text_chunks = rewrite_title_stream(text_chunks, page_title)
+    if text_replaces and isinstance(text_replaces, dict): 
+        text_chunks = replace_text_stream(text_chunks, text_replaces)
+
+    encoded = (text.encode(encoding, errors="xmlcharrefreplace") for text in text_chunks if text)
+    # closing the transformed stream closes the upstream body
+    return ClosingStream(encoded, source=chunks)
+
+
 def transform_response(response: Dict, page_title: Optional[str] = None, text_replaces: Optional[Dict] = None) -> Dict: 
     """Transform response content (HTML manipulation, text replacememt)"""
     content_type = response.get("content_type", "")
 
-    if "text" not in content_type and "html" not in content_type: 
-        pipeline_logger.warning(f"Cannot transform: {content_type}")
+    if not is_transformable(content_type): 
+        pipeline_logger.warning("Cannot transform: %s", content_type)
         return response
     
     text = response.get("text", "")
     if not text: 
         return response
+
+    # identical body + options always transform to the same output
+    cache_key = transform_cache_key(text, page_title, text_replaces)
+    cached = get_transformed(cache_key)
+    if cached is not None: 
+        response["text"] = cached
+        response["content"] = cached
+        response.pop("body", None)
+        return response
     
     try:
         if page_title: 
@@ -39,11 +245,64 @@ def transform_response(response: Dict, page_title: Optional[str] = None, text_re
         if text_replaces and isinstance(text_replaces, dict): 
             text = replace_text(text, text_replaces)
 
+        put_transformed(cache_key, text)
+
         response["text"] = text
         response["content"] = text
+        # the raw upstream bytes no longer match the content
+        response.pop("body", None)
 
         return response
 
     except Exception as e: 
-        pipeline_logger.error(f"Transformation failed: {e}")
-        return response
\ No newline at end of file
+        pipeline_logger.error("Transformation failed: %s", e)
+        return response
+
+
+def _declared_length(headers: Optional[Dict]) -> Optional[int]: 
+    for name, value in (headers or {}).items(): 
+        if name.lower() == "content-length": 
+            return int(value) if str(value).isdigit() else None
+    return None
+
+
+def transform_stream_response(response: Dict, page_title: Optional[str] = None, text_replaces: Optional[Dict] = None,
+                              cache_config: Dict = TRANSFORM_CACHE_CONFIG) -> Dict: 
+    """Wrap a streamed response's chunk generator with transform_stream
+
+    Bodies small enough for the transform cache are read here and go
+    through transform_response instead, so their output is memoized and a
+    failed read fails the request before headers are sent. The declared
+    Content-Length only rules a body out when it is identity-encoded,
+    otherwise it is the compressed size and the decoded bytes are counted.
+    """
+    content_type = response.get("content_type", "")
+
+    if not is_transformable(content_type): 
+        pipeline_logger.warning("Cannot transform: %s", content_type)
+        return response
+
+    limit = cache_config["max_entry_bytes"]
+    headers = response.get("headers")
+    declared = _declared_length(headers) if content_coding(headers or {}) is None else None
+    if not cache_config.get("enabled") or (declared is not None and declared > limit): 
+        response["stream"] = transform_stream(response["stream"], response.get("encoding"), page_title, text_replaces)
+        return response
+
+    chunks = iter(response["stream"])
+    head = []
+    size = 0
+    for chunk in chunks: 
+        head.append(chunk)
+        size += len(chunk)
+        if size > limit: 
+            # too large to memoize after all, transform the rest as it streams
+            body = ClosingStream(itertools.chain(head, chunks), source=chunks)
+            response["stream"] = transform_stream(body, response.get("encoding"), page_title, text_replaces)
+            return response
+
+    encoding = response.get("encoding") or "utf-8"
+    text = b"".join(head).decode(encoding, errors="replace")
+    transformed = transform_response({"content_type": content_type, "text": text}, page_title, text_replaces)
+    response["stream"] = iter([transformed["text"].encode(encoding, errors="xmlcharrefreplace")] if transformed["text"] else [])
+    return response
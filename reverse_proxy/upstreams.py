@@ -0,0 +1,334 @@
+import random
+import threading
+import time
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+from reverse_proxy.config.consts import UPSTREAM_GROUPS, UPSTREAM_DEFAULTS
+from reverse_proxy.config.logging import pipeline_logger
+from reverse_proxy.pool import get_session
+from reverse_proxy.streams import ClosingStream, AsyncClosingStream
+
+
+# Routes target a group with "upstream://<group>/<path>"; each request picks
+# one of the group's targets, and the target's base URL replaces the group.
+UPSTREAM_SCHEME = "upstream"
+
+_groups: Dict[str, Dict] = {}
+_groups_lock = threading.Lock()
+_health_checker = {"thread": None, "stop": None}
+
+
+def _new_target(spec) -> Dict:
+    spec = {"url": spec} if isinstance(spec, str) else spec
+    return {
+        "url": spec["url"].rstrip("/"),
+        "weight": max(int(spec.get("weight", 1)), 1),
+        "healthy": True,
+        "ejected_until": 0.0,
+        "ejections": 0,
+        "in_flight": 0,
+        "requests": 0,
+        "failures": 0,
+        "consecutive_failures": 0,
+        "check_streak": 0,
+        "latency_ewma": None,
+        "current_weight": 0
+    }
+
+
+def build_group(name: str, spec: Dict, defaults: Dict = UPSTREAM_DEFAULTS) -> Dict:
+    """Expand a group spec with defaults and fresh per-target state"""
+    if not spec.get("targets"):
+        raise ValueError(f"Upstream group {name} has no targets")
+
+    strategy = spec.get("strategy", defaults["strategy"])
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown upstream strategy for {name}: {strategy}")
+
+    health_check = dict(defaults["health_check"])
+    health_check.update(spec.get("health_check") or {})
+
+    return {
+        "name": name,
+        "strategy": strategy,
+        "targets": [_new_target(target) for target in spec["targets"]],
+        "max_consecutive_failures": spec.get("max_consecutive_failures", defaults["max_consecutive_failures"]),
+        "base_ejection_seconds": spec.get("base_ejection_seconds", defaults["base_ejection_seconds"]),
+        "max_ejection_seconds": spec.get("max_ejection_seconds", defaults["max_ejection_seconds"]),
+        "health_check": health_check,
+        "next": 0,
+        "lock": threading.Lock()
+    }
+
+
+def build_groups(groups: Dict) -> Dict:
+    """Build every group of an upstream config, raising ValueError if any is invalid"""
+    return {name: build_group(name, spec) for name, spec in groups.items()}
+
+
+def install_groups(built: Dict) -> None:
+    """Swap in groups made by build_groups (per-target state starts fresh)"""
+    global _groups
+    with _groups_lock:
+        _groups = built
+
+
+def set_upstream_groups(groups: Dict) -> None:
+    """Replace every upstream group"""
+    install_groups(build_groups(groups))
+
+
+def get_group(name: str) -> Dict:
+    group = _groups.get(name)
+    if group is None:
+        raise ValueError(f"Unknown upstream group: {name}")
+    return group
+
+
+# --- selection strategies, each called with the group lock held ---
+
+def _round_robin(group: Dict, candidates: List[Dict]) -> Dict:
+    group["next"] += 1
+    return candidates[group["next"] % len(candidates)]
+
+
+def _weighted(group: Dict, candidates: List[Dict]) -> Dict:
+    """Smooth weighted round-robin: spreads picks evenly in proportion to weight"""
+    total = 0
+    best = None
+    for target in candidates:
+        target["current_weight"] += target["weight"]
+        total += target["weight"]
+        if best is None or target["current_weight"] > best["current_weight"]:
+            best = target
+    best["current_weight"] -= total
+    return best
+
+
+def _least_outstanding(group: Dict, candidates: List[Dict]) -> Dict:
+    """Fewest in-flight requests relative to weight, round-robin between ties"""
+    group["next"] += 1
+    offset = group["next"] % len(candidates)
+    rotated = candidates[offset:] + candidates[:offset]
+    return min(rotated, key=lambda target: target["in_flight"] / target["weight"])
+
+
+def _power_of_two(group: Dict, candidates: List[Dict]) -> Dict:
+    """Pick two at random, keep the one with fewer in-flight requests"""
+    if len(candidates) == 1:
+        return candidates[0]
+    first, second = random.sample(candidates, 2)
+    return first if first["in_flight"] / first["weight"] <= second["in_flight"] / second["weight"] else second
+
+
+STRATEGIES = {
+    "round_robin": _round_robin,
+    "weighted": _weighted,
+    "least_outstanding": _least_outstanding,
+    "p2c": _power_of_two
+}
+
+
+def _available(group: Dict, now: float) -> List[Dict]:
+    """Healthy, non-ejected targets, or every target if none are (fail open)"""
+    candidates = [t for t in group["targets"] if t["healthy"] and t["ejected_until"] <= now]
+    if not candidates:
+        pipeline_logger.warning("No healthy targets in upstream group %s, using all", group['name'])
+        candidates = group["targets"]
+    return candidates
+
+
+def acquire_target(group_name: str) -> Tuple[Dict, Dict]:
+    """Select a target from a group and count the request as in flight"""
+    group = get_group(group_name)
+    with group["lock"]:
+        target = STRATEGIES[group["strategy"]](group, _available(group, time.monotonic()))
+        target["in_flight"] += 1
+        target["requests"] += 1
+    return group, target
+
+
+def release_target(group: Dict, target: Dict, success: bool, latency: Optional[float] = None) -> None:
+    """Finish an in-flight request, updating latency and passive outlier state"""
+    with group["lock"]:
+        target["in_flight"] -= 1
+
+        if latency is not None:
+            previous = target["latency_ewma"]
+            target["latency_ewma"] = latency if previous is None else previous * 0.8 + latency * 0.2
+
+        if success:
+            target["consecutive_failures"] = 0
+            return
+
+        target["failures"] += 1
+        target["consecutive_failures"] += 1
+        if target["consecutive_failures"] >= group["max_consecutive_failures"]:
+            ejection = min(group["base_ejection_seconds"] * (2 ** target["ejections"]), group["max_ejection_seconds"])
+            target["ejected_until"] = time.monotonic() + ejection
+            target["ejections"] += 1
+            target["consecutive_failures"] = 0
+            pipeline_logger.warning("Ejected %s from %s for %ss", target['url'], group['name'], ejection)
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Errors that say something about the target: connection failures, timeouts, 5xx"""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, requests.exceptions.RequestException)
+
+
+def resolve_upstream(url: str) -> Tuple[str, Optional[Tuple[Dict, Dict]]]:
+    """Replace an upstream://group URL with a selected target
+
+    Returns the concrete URL and the (group, target) lease to release, or
+    the URL unchanged and None for ordinary targets.
+    """
+    parts = urlsplit(url)
+    if parts.scheme != UPSTREAM_SCHEME:
+        return url, None
+
+    group, target = acquire_target(parts.netloc)
+    base = urlsplit(target["url"])
+    resolved = urlunsplit((base.scheme, base.netloc, base.path + parts.path, parts.query, parts.fragment))
+    return resolved, (group, target)
+
+
+def release_on_close(chunks: Iterable[bytes], lease: Tuple[Dict, Dict], latency: float) -> Iterator[bytes]:
+    """Keep a streamed request in flight until its body has been relayed or closed
+
+    The target is released on close() even if the body was never read (HEAD).
+    """
+    def release(error):
+        # a client disconnect (close before the end) is not the target's fault
+        success = error is None or not is_upstream_failure(error)
+        release_target(lease[0], lease[1], success, latency)
+
+    return ClosingStream(chunks, release)
+
+
+def release_on_close_async(chunks: AsyncIterable[bytes], lease: Tuple[Dict, Dict], latency: float, is_failure: Callable[[BaseException], bool]) -> AsyncIterator[bytes]:
+    """Async counterpart of release_on_close, released on aclose()"""
+    def release(error):
+        success = error is None or not is_failure(error)
+        release_target(lease[0], lease[1], success, latency)
+
+    return AsyncClosingStream(chunks, release)
+
+
+# --- active health checks ---
+
+def check_target(group: Dict, target: Dict) -> bool:
+    """Probe one target's health check path"""
+    check = group["health_check"]
+    try:
+        response = get_session(target["url"]).get(target["url"] + check["path"], timeout=check["timeout"])
+        response.close()
+        return response.status_code < 500
+    except requests.exceptions.RequestException:
+        return False
+
+
+def run_health_checks(now: Optional[float] = None) -> None:
+    """Probe every target of every group with a health check path"""
+    for group in list(_groups.values()):
+        check = group["health_check"]
+        if not check.get("path"):
+            continue
+
+        for target in group["targets"]:
+            passed = check_target(group, target)
+            with group["lock"]:
+                # streak counts consecutive results that disagree with the current state
+                target["check_streak"] = target["check_streak"] + 1 if passed != target["healthy"] else 0
+                threshold = check["healthy_threshold"] if passed else check["unhealthy_threshold"]
+                if target["check_streak"] >= threshold:
+                    target["healthy"] = passed
+                    target["check_streak"] = 0
+                    pipeline_logger.warning("%s in %s is now %s", target['url'], group['name'], 'healthy' if passed else 'unhealthy')
+
+
+def health_check_interval(defaults: Dict = UPSTREAM_DEFAULTS) -> Tuple[float, bool]:
+    """(seconds until the next round, whether any group is checked) for the current groups"""
+    intervals = [g["health_check"]["interval"] for g in list(_groups.values()) if g["health_check"].get("path")]
+    if not intervals:
+        return defaults["health_check"]["interval"], False
+    return min(intervals), True
+
+
+def start_health_checks() -> threading.Thread:
+    """Run active health checks in a background thread
+
+    The interval is taken from the groups installed at each round, so groups
+    swapped in by a route reload are checked too.
+    """
+    if _health_checker["thread"] is not None:
+        return _health_checker["thread"]
+
+    stop = threading.Event()
+
+    def run() -> None:
+        while True:
+            interval, checked = health_check_interval()
+            if stop.wait(interval):
+                return
+            if checked:
+                run_health_checks()
+
+    thread = threading.Thread(target=run, name="upstream-health-checks", daemon=True)
+    _health_checker.update(thread=thread, stop=stop)
+    thread.start()
+    return thread
+
+
+def stop_health_checks() -> None:
+    thread, stop = _health_checker["thread"], _health_checker["stop"]
+    if thread is None:
+        return
+    stop.set()
+    thread.join()
+    _health_checker.update(thread=None, stop=None)
+
+
+def upstream_origins() -> List[str]:
+    """Origins of every upstream target, for pool pre-warming"""
+    return [target["url"] + "/" for group in _groups.values() for target in group["targets"]]
+
+
+def upstream_stats() -> Dict:
+    """Per-target health, in-flight and latency stats for /health"""
+    now = time.monotonic()
+    stats = {}
+    for name, group in list(_groups.items()):
+        with group["lock"]:
+            stats[name] = {
+                "strategy": group["strategy"],
+                "targets": [{
+                    "url": target["url"],
+                    "weight": target["weight"],
+                    "healthy": target["healthy"],
+                    "ejected": target["ejected_until"] > now,
+                    "in_flight": target["in_flight"],
+                    "requests": target["requests"],
+                    "failures": target["failures"],
+                    "latency_ms": round(target["latency_ewma"] * 1000, 2) if target["latency_ewma"] is not None else None
+                } for target in group["targets"]]
+            }
+    return stats
+
+
+def upstream_gauges() -> Dict:
+    """Per-target gauges for /metrics"""
+    gauges = {"upstream_target_in_flight": [], "upstream_target_healthy": []}
+    for name, stats in upstream_stats().items():
+        for target in stats["targets"]:
+            labels = {"group": name, "target": target["url"]}
+            gauges["upstream_target_in_flight"].append((labels, target["in_flight"]))
+            gauges["upstream_target_healthy"].append((labels, int(target["healthy"] and not target["ejected"])))
+    return gauges
+
+
+set_upstream_groups(UPSTREAM_GROUPS)
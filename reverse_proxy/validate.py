@@ -21,7 +21,7 @@ def validate_event(event: Dict) -> Dict:
     if "headers" in event and not isinstance(event["headers"], dict):
         raise ValueError("Headers must be a dictionary")
 
-    pipeline_logger.info(f"Validated: {method} {event['path']}")
+    pipeline_logger.info("Validated: %s %s", method, event["path"])
     return event
 
 
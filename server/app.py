@@ -1,15 +1,53 @@
 import os
 import sys
 import json
-from flask import Flask, jsonify, request, Response
-from reverse_proxy.config.logging import adapter_logger
-from reverse_proxy.config.consts import ROUTE_CONFIG
+from flask import Flask, g, jsonify, request, Response, stream_with_context
+from werkzeug.wsgi import wrap_file
+from reverse_proxy.config.logging import adapter_logger, bind_request, reset_request, current_request_id, header_request_id, log_stats
+from reverse_proxy.config.consts import POOL_CONFIG, HEADERS_TO_SKIP
 from reverse_proxy.proxy_service import proxy_request
+from reverse_proxy.pool import pool_stats, warm_pools, close_pools
+from reverse_proxy.router import route_origins, get_live_routes, live_routes_version
+from reverse_proxy.route_loader import init_routes, reload_routes, watch_routes, stop_watching_routes
+from reverse_proxy.upstreams import upstream_stats, upstream_origins, upstream_gauges, start_health_checks, stop_health_checks
+from reverse_proxy.metrics import render_metrics
+from reverse_proxy.cache import cache_stats
+from reverse_proxy.transform_cache import transform_cache_stats
+from reverse_proxy.coalesce import coalesce_stats
+from reverse_proxy.media import media_stats
+from reverse_proxy.shared_cache import shared_stats
+from reverse_proxy.ratelimit import RateLimitExceeded, rate_limit_stats
+from reverse_proxy.breaker import CircuitOpenError, breaker_stats
+from reverse_proxy.retry import retry_stats
+from reverse_proxy.batch import parse_batch, run_batch
+from reverse_proxy.streams import close_stream
 
 
 # Go server equivalent used for local development. 
 app = Flask(__name__) 
 
+# Route file (REVERSE_PROXY_ROUTES_FILE) replaces the built-in ROUTE_CONFIG when set
+init_routes()
+
+
+@app.before_request
+def bind_request_id():
+    # every log line of the request carries its ID (the client's X-Request-ID when sent)
+    g.log_token = bind_request(header_request_id(request.headers))
+
+
+@app.after_request
+def add_request_id(response):
+    response.headers["X-Request-ID"] = current_request_id()
+    return response
+
+
+@app.teardown_request
+def reset_request_id(error=None):
+    token = g.pop("log_token", None)
+    if token is not None:
+        reset_request(token)
+
 
 
 
@@ -38,13 +76,14 @@ def handle_proxy():
             "path": payload.get("path"),
             "params": payload.get("params"),
             "data": payload.get("data"),
-            "headers": payload.get("headers", {"content-Type": "application/json"})
+            "headers": payload.get("headers", {"content-Type": "application/json"}),
+            "client_ip": request.remote_addr
         }
 
 
         transformation_options = payload.get("transformation_options")
 
-        adapter_logger.info(f"Flask received: {request.method} {event['path']}")
+        adapter_logger.info("Flask received: %s %s", request.method, event["path"])
         
         response = proxy_request(event, transformation_options)
 
@@ -52,26 +91,76 @@ def handle_proxy():
             "status": "success", 
             "status_code": response["status_code"],
             "content_type": response["content_type"], 
-            "content": response["content"], 
+            "content": response["text"] if isinstance(response["content"], bytes) else response["content"], 
             "headers": response["headers"]
         }), response["status_code"]
 
+    except (RateLimitExceeded, CircuitOpenError) as e: 
+        # 429 / 503, the client may retry after the limit or circuit resets
+        adapter_logger.warning("Rejected: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), e.status_code, {"Retry-After": e.retry_after_header}
+
     except ValueError as e: 
-        adapter_logger.error(f"Validation error: {e}")
+        adapter_logger.error("Validation error: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 400
 
     except Exception as e:
-        adapter_logger.error(f"Proxy error: {e}", exc_info=True)
+        adapter_logger.error("Proxy error: %s", e, exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500 
 
 
 
+@app.route("/proxy/batch", methods=["POST"])
+def handle_proxy_batch():
+    """
+    Run several proxy requests concurrently
+
+    Expects JSON body with:
+    {
+        "requests": [                 # events in the shape handle_proxy takes
+            {"id": "a", "method": "GET", "path": "/google", "params": {"q": "x"}},
+            {"id": "b", "method": "POST", "path": "/api", "data": {"body": "data"}}
+        ],
+        "deadline": 5,                # optional, seconds for the whole batch
+        "stream": false               # optional, same as Accept: application/x-ndjson
+    }
+
+    Returns {"results": [...]} in request order once every item is done, or
+    one NDJSON line per result as each completes. Every result has its own
+    status_code; items unfinished at the deadline get 504.
+    """
+    payload = request.get_json(force=True, silent=True)
+
+    try: 
+        items, deadline = parse_batch(payload)
+    except ValueError as e: 
+        adapter_logger.error("Validation error: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    adapter_logger.info("Flask received batch: %d requests, deadline %ss", len(items), deadline)
+
+    results = run_batch(items, deadline, request.remote_addr)
+
+    if payload.get("stream") or "application/x-ndjson" in request.headers.get("Accept", ""):
+        return Response(
+            stream_with_context(json.dumps(result) + "\n" for result in results),
+            status=200,
+            content_type="application/x-ndjson"
+        )
+
+    return jsonify({
+        "status": "success",
+        "results": sorted(results, key=lambda result: result["index"])
+    }), 200
+
+
 @app.route("/proxy/<path:target_path>", methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
 def handle_proxy_with_path(target_path): 
     """
     Alternative route using URL path for target selection
 
-    Headers are currently skipped for response chunking purposes
+    Responses are streamed back chunk by chunk, transforms (page_title,
+    text_replace) are applied to the chunks on the way through.
 
     Example: GET /proxy/google?key=value
     """
@@ -81,35 +170,65 @@ def handle_proxy_with_path(target_path):
         headers = dict(request.headers)
         
         # Remove headers that shouldn't be forwarded
-        headers_to_skip = [
-            'Host',
-            'Content-Length',
-            'Connection',
-            'Accept-Encoding',
-            'Transfer-Encoding'
-        ]
-        
-        for header in headers_to_skip:
+        for header in HEADERS_TO_SKIP:
             headers.pop(header, None)
 
         event = {
             "method": request.method,
             "path": "/" + target_path,
+            "host": request.host,
+            "client_ip": request.remote_addr,
             "params": dict(request.args), 
             "data": request.get_json(silent=True), 
-            "headers": dict(request.headers)
+            "headers": headers
         }
 
         transform_options = None
         if request.args.get("page_title") or request.args.get("text_replace"): 
             transform_options = {
                 "page_title": request.args.get("page_title"), 
-                "text_replace": json.loads(request.args.get("text_replace", "{}"))
+                "text_replaces": json.loads(request.args.get("text_replace", "{}"))
             }
 
-        adapter_logger.info(f"Flask received: {request.method} / {target_path}")
-
-        response = proxy_request(event, transform_options)
+        adapter_logger.info("Flask received: %s / %s", request.method, target_path)
+
+        response = proxy_request(event, transform_options, stream=True)
+
+        if response.get('file') is not None:
+            # Large shared-cache hit: the server copies the file to the socket (sendfile under `reverse-proxy serve`)
+            flask_response = Response(
+                wrap_file(request.environ, response['file']),
+                status=response['status_code'],
+                content_type=response['content_type'] or None,
+                direct_passthrough=True
+            )
+            flask_response.headers['Content-Length'] = response['content_length']
+            return flask_response
+
+        if response.get('stream') is not None:
+            # Relay upstream chunks as they arrive (chunked transfer, no Content-Length)
+            flask_response = Response(
+                stream_with_context(response['stream']),
+                status=response['status_code'],
+                content_type=response['content_type'] or None,
+                direct_passthrough=True
+            )
+            if response.get('content_encoding'):
+                flask_response.headers['Content-Encoding'] = response['content_encoding']
+                flask_response.headers['Vary'] = 'Accept-Encoding'
+            # stream_with_context doesn't close a body that was never iterated (HEAD),
+            # this releases the upstream connection and target either way
+            stream = response['stream']
+            flask_response.call_on_close(lambda: close_stream(stream))
+            return flask_response
+
+        body = response.get('body')
+        if body is not None:
+            # untransformed: relay the upstream bytes without decoding them
+            flask_response = Response(body, status=response['status_code'])
+            flask_response.headers['Content-Type'] = response['content_type']
+            flask_response.headers['Content-Length'] = len(body)
+            return flask_response
 
         content = response['content']
         
@@ -137,12 +256,17 @@ def handle_proxy_with_path(target_path):
         return flask_response
 
 
+    except (RateLimitExceeded, CircuitOpenError) as e: 
+        # 429 / 503, the client may retry after the limit or circuit resets
+        adapter_logger.warning("Rejected: %s", e)
+        return jsonify({"error": str(e)}), e.status_code, {"Retry-After": e.retry_after_header}
+
     except ValueError as e: 
-        adapter_logger.error(f"Validation error: {e}")
+        adapter_logger.error("Validation error: %s", e)
         return jsonify({"error": str(e)}), 400
     
     except Exception as e: 
-        adapter_logger.error(f"Proxy error: {e}", exc_info=True)
+        adapter_logger.error("Proxy error: %s", e, exc_info=True)
         return jsonify({"error": str(e)}), 500 
 
 @app.route("/health", methods=["GET"])
@@ -151,15 +275,61 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "reverse-proxy", 
-        "routes": list(ROUTE_CONFIG.keys())
+        "routes": list(get_live_routes().keys()),
+        "routes_version": live_routes_version(),
+        "upstreams": upstream_stats(),
+        "rate_limits": rate_limit_stats(),
+        "breakers": breaker_stats(),
+        "retries": retry_stats(),
+        "logging": log_stats()
         }), 200 
 
 
+@app.route("/pools", methods=["GET"])
+def list_pools():
+    """Upstream connection pool hit/miss/reuse counters"""
+    return jsonify(pool_stats()), 200
+
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Response (in-process and shared) and transform cache hit ratios and memory usage, coalesced upstream calls and media prefetches"""
+    return jsonify({
+        "responses": cache_stats(),
+        "transforms": transform_cache_stats(),
+        "coalesced": coalesce_stats(),
+        "media": media_stats(),
+        "shared": shared_stats()
+    }), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus text metrics: per-route and per-stage latency, bytes, in-flight gauges"""
+    return Response(render_metrics(upstream_gauges()), status=200, content_type="text/plain; version=0.0.4")
+
+
 @app.route("/routes", methods=["GET"])
 def list_routes(): 
     """List available proxy routes"""
     return jsonify({
-        "available_routes": ROUTE_CONFIG
+        "available_routes": get_live_routes()
+    }), 200
+
+
+@app.route("/routes/reload", methods=["POST"])
+def reload_route_table():
+    """Admin: reload the route file and swap it in without a restart"""
+    try:
+        routes = reload_routes()
+    except ValueError as e:
+        adapter_logger.error("Route reload failed: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify({
+        "status": "reloaded",
+        "routes": list(routes.keys()),
+        "routes_version": live_routes_version()
     }), 200
 
 @app.errorhandler(404)
@@ -169,17 +339,40 @@ def not_found(error):
 
 @app.errorhandler(500)
 def internal_error(error):
-    adapter_logger.error(f"Internal error: {error}")
+    adapter_logger.error("Internal error: %s", error)
     return jsonify({'error': 'Internal server error'}), 500
 
 
 
+def start_background_tasks() -> None:
+    """Route file watcher, upstream health checks and pool pre-warming
+
+    Threads and pooled sockets don't survive fork(), so pre-forked workers
+    call this after forking (see server/prefork.py).
+    """
+    watch_routes()
+    start_health_checks()
+
+    if POOL_CONFIG.get("prewarm"):
+        warm_pools(route_origins() + upstream_origins())
+
+
+def stop_background_tasks() -> None:
+    """Stop background threads and close pooled upstream connections"""
+    stop_watching_routes()
+    stop_health_checks()
+    close_pools()
+
+
 if __name__ == '__main__':
+    # Development server, use `reverse-proxy serve` in production
     adapter_logger.info("Starting Flask Reverse Proxy Server...")
-    adapter_logger.info(f"Available routes: {list(ROUTE_CONFIG.keys())}")
+    adapter_logger.info("Available routes: %s", list(get_live_routes().keys()))
+
+    start_background_tasks()
     
     app.run(
         host='0.0.0.0',  # Listen on all interfaces
         port=5001,
         debug=True
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,263 @@
+import json
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from reverse_proxy.async_execution import close_async_clients
+from reverse_proxy.config.consts import HEADERS_TO_SKIP
+from reverse_proxy.config.logging import adapter_logger, bind_request, header_request_id, log_stats
+from reverse_proxy.proxy_service import proxy_request_async
+from reverse_proxy.router import compile_routes, get_live_routes, live_routes_version
+from reverse_proxy.route_loader import init_routes, watch_routes, stop_watching_routes
+from reverse_proxy.stages import require_async_stages
+from reverse_proxy.upstreams import upstream_stats, upstream_gauges, start_health_checks, stop_health_checks
+from reverse_proxy.metrics import render_metrics
+from reverse_proxy.ratelimit import RateLimitExceeded, rate_limit_stats
+from reverse_proxy.breaker import CircuitOpenError, breaker_stats
+from reverse_proxy.batch import parse_batch, run_batch_async
+
+
+# ASGI counterpart of server/app.py, one event loop multiplexes every in-flight
+# upstream call. Run with any ASGI server, e.g. `uvicorn server.asgi:app`.
+
+PROXY_PREFIX = "/proxy/"
+BATCH_PATH = "/proxy/batch"
+
+
+async def read_body(receive) -> bytes:
+    """Drain the ASGI request body"""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def send_json(send, payload: Dict, status: int, headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    """Send a complete JSON response"""
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + (headers or [])
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def build_event(scope: Dict, body: bytes) -> Tuple[Dict, Optional[Dict]]:
+    """Translate an ASGI scope into the standard event plus transform options"""
+    headers = {}
+    for name, value in scope.get("headers", []):
+        headers[name.decode("latin-1").title()] = value.decode("latin-1")
+
+    for header in HEADERS_TO_SKIP:
+        headers.pop(header, None)
+
+    params = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+
+    data = None
+    if body and "application/json" in headers.get("Content-Type", ""):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+
+    host = dict(scope.get("headers", [])).get(b"host", b"").decode("latin-1") or None
+
+    event = {
+        "method": scope["method"],
+        "path": "/" + scope["path"][len(PROXY_PREFIX):],
+        "host": host,
+        "client_ip": (scope.get("client") or [None])[0],
+        "params": params,
+        "data": data,
+        "headers": headers
+    }
+
+    transform_options = None
+    if params.get("page_title") or params.get("text_replace"):
+        transform_options = {
+            "page_title": params.get("page_title"),
+            "text_replaces": json.loads(params.get("text_replace", "{}"))
+        }
+
+    return event, transform_options
+
+
+def response_headers(content_type: Optional[str], content_length: Optional[int] = None, content_encoding: Optional[str] = None) -> List[Tuple[bytes, bytes]]:
+    """Build the ASGI header list for a proxied response"""
+    headers = []
+    if content_type:
+        headers.append((b"content-type", content_type.encode("latin-1")))
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    if content_encoding:
+        headers.append((b"content-encoding", content_encoding.encode("latin-1")))
+        headers.append((b"vary", b"Accept-Encoding"))
+    return headers
+
+
+async def handle_proxy_with_path(scope: Dict, receive, send) -> None:
+    """Proxy /proxy/<path> through proxy_request_async, streaming untransformed bodies"""
+    try:
+        event, transform_options = build_event(scope, await read_body(receive))
+
+        adapter_logger.info("ASGI received: %s %s", event["method"], event["path"])
+
+        response = await proxy_request_async(event, transform_options, stream=True)
+
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        adapter_logger.warning("Rejected: %s", e)
+        return await send_json(send, {"error": str(e)}, e.status_code, [(b"retry-after", e.retry_after_header.encode())])
+
+    except ValueError as e:
+        adapter_logger.error("Validation error: %s", e)
+        return await send_json(send, {"error": str(e)}, 400)
+
+    except Exception as e:
+        adapter_logger.error("Proxy error: %s", e, exc_info=True)
+        return await send_json(send, {"error": str(e)}, 500)
+
+    if response.get("stream") is not None:
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": response["status_code"],
+                "headers": response_headers(response["content_type"], content_encoding=response.get("content_encoding"))
+            })
+            async for chunk in response["stream"]:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            # releases the upstream connection and target even if the client went away first
+            await response["stream"].aclose()
+        return
+
+    body = response.get("body")
+    if body is not None:
+        # untransformed: relay the upstream bytes without decoding them
+        await send({
+            "type": "http.response.start",
+            "status": response["status_code"],
+            "headers": response_headers(response["content_type"], len(body))
+        })
+        return await send({"type": "http.response.body", "body": body})
+
+    content = response["content"]
+    content_type = response["content_type"]
+
+    if isinstance(content, (dict, list)):
+        content = json.dumps(content)
+        content_type = "application/json"
+    elif content is None:
+        content = ""
+
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    await send({
+        "type": "http.response.start",
+        "status": response["status_code"],
+        "headers": response_headers(content_type, len(content))
+    })
+    await send({"type": "http.response.body", "body": content})
+
+
+async def handle_batch(scope: Dict, receive, send) -> None:
+    """POST /proxy/batch, results as one JSON body or NDJSON lines as they complete"""
+    try:
+        payload = json.loads(await read_body(receive) or b"null")
+        items, deadline = parse_batch(payload)
+    except ValueError as e:
+        adapter_logger.error("Validation error: %s", e)
+        return await send_json(send, {"status": "error", "message": str(e)}, 400)
+
+    adapter_logger.info("ASGI received batch: %d requests, deadline %ss", len(items), deadline)
+
+    client_ip = (scope.get("client") or [None])[0]
+    accept = dict(scope.get("headers", [])).get(b"accept", b"").decode("latin-1")
+    results = run_batch_async(items, deadline, client_ip)
+
+    if payload.get("stream") or "application/x-ndjson" in accept:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": response_headers("application/x-ndjson")
+        })
+        async for result in results:
+            await send({"type": "http.response.body", "body": (json.dumps(result) + "\n").encode("utf-8"), "more_body": True})
+        return await send({"type": "http.response.body", "body": b""})
+
+    collected = [result async for result in results]
+    await send_json(send, {"status": "success", "results": sorted(collected, key=lambda result: result["index"])}, 200)
+
+
+async def handle_lifespan(receive, send) -> None:
+    """Load the route file on startup, close pooled upstream clients on shutdown"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # route stages without an async form are rejected as routes load
+            require_async_stages()
+            try:
+                init_routes()
+                compile_routes(get_live_routes())
+            except ValueError as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            watch_routes()
+            start_health_checks()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            stop_watching_routes()
+            stop_health_checks()
+            await close_async_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: Dict, receive, send) -> None:
+    """ASGI entry point"""
+    if scope["type"] == "lifespan":
+        return await handle_lifespan(receive, send)
+
+    # log lines carry the request's ID, ASGI servers run each request in its
+    # own task, so the binding ends with the request
+    request_id = dict(scope.get("headers", [])).get(b"x-request-id", b"").decode("latin-1")
+    bind_request(header_request_id({"X-Request-ID": request_id}))
+
+    path = scope["path"]
+    method = scope["method"]
+
+    if path == BATCH_PATH and method == "POST":
+        return await handle_batch(scope, receive, send)
+
+    if path.startswith(PROXY_PREFIX) and method in ["GET", "POST", "PUT", "DELETE", "PATCH"]:
+        return await handle_proxy_with_path(scope, receive, send)
+
+    if path == "/health" and method == "GET":
+        return await send_json(send, {
+            "status": "healthy",
+            "service": "reverse-proxy",
+            "routes": list(get_live_routes().keys()),
+            "routes_version": live_routes_version(),
+            "upstreams": upstream_stats(),
+            "rate_limits": rate_limit_stats(),
+            "breakers": breaker_stats(),
+            "logging": log_stats()
+        }, 200)
+
+    if path == "/metrics" and method == "GET":
+        body = render_metrics(upstream_gauges()).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": response_headers("text/plain; version=0.0.4", len(body))
+        })
+        return await send({"type": "http.response.body", "body": body})
+
+    if path == "/routes" and method == "GET":
+        return await send_json(send, {"available_routes": get_live_routes()}, 200)
+
+    return await send_json(send, {"error": "Endpoint not found"}, 404)
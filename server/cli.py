@@ -0,0 +1,47 @@
+import os
+from enum import Enum
+
+import typer
+
+from server.prefork import serve as run_master
+
+
+app = typer.Typer(help="Reverse proxy command line")
+
+
+class Interface(str, Enum):
+    wsgi = "wsgi"
+    asgi = "asgi"
+
+
+@app.callback()
+def main() -> None:
+    """Reverse proxy command line"""
+
+
+@app.command()
+def serve(
+    host: str = typer.Option("0.0.0.0", help="Interface to listen on"),
+    port: int = typer.Option(5001, help="Port to listen on"),
+    workers: int = typer.Option(os.cpu_count() or 1, min=1, help="Pre-forked worker processes"),
+    threads: int = typer.Option(8, min=1, help="Request threads per worker (wsgi only)"),
+    reuse_port: bool = typer.Option(True, help="Give every worker its own SO_REUSEPORT socket"),
+    graceful_timeout: float = typer.Option(30, min=0, help="Seconds to drain in-flight requests on reload/shutdown"),
+    interface: Interface = typer.Option(Interface.wsgi, help="wsgi (server.app) or asgi (server.asgi, needs uvicorn)")
+) -> None:
+    """Serve the proxy with pre-forked workers
+
+    SIGTERM/SIGINT drain and stop the workers, SIGHUP replaces them with a
+    fresh generation without dropping the listening socket.
+    """
+    if interface == Interface.asgi:
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise typer.BadParameter("the asgi interface needs uvicorn (pip install uvicorn)", param_hint="--interface")
+
+    raise typer.Exit(run_master(host, port, workers, threads, reuse_port, graceful_timeout, interface.value))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,179 @@
+import base64
+import json
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from reverse_proxy.config.consts import HEADERS_TO_SKIP
+from reverse_proxy.config.logging import adapter_logger, bind_request, reset_request, header_request_id, flush_logs
+
+
+# AWS Lambda adapter for API Gateway (REST and HTTP APIs) and function URLs.
+#
+# Module scope stays nearly empty: the pipeline (requests, the route table,
+# pools) is imported on the first invocation and kept for every warm one, so
+# pooled connections, compiled routes and transform caches carry over between
+# invocations of the same execution environment. Background threads (health
+# checks, route watching) are not started, a frozen environment can't run them.
+#
+# Handler: server.lambda_handler.handler
+
+PROXY_PREFIX = "/proxy"
+
+# bodies of these types are returned as text, anything else base64 encoded
+TEXT_TYPES = ("text/", "application/json", "application/xml", "application/javascript", "+json", "+xml")
+
+_state = {"proxy_request": None, "errors": None, "cold_start_ms": None}
+
+
+def _pipeline():
+    """proxy_request and the errors it may raise, imported on first use"""
+    if _state["proxy_request"] is None:
+        started = time.perf_counter()
+        from reverse_proxy.proxy_service import proxy_request
+        from reverse_proxy.route_loader import init_routes
+        from reverse_proxy.ratelimit import RateLimitExceeded
+        from reverse_proxy.breaker import CircuitOpenError
+
+        init_routes()
+        _state["errors"] = (RateLimitExceeded, CircuitOpenError)
+        _state["proxy_request"] = proxy_request
+        _state["cold_start_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        adapter_logger.info("Lambda cold start: pipeline ready in %sms", _state['cold_start_ms'])
+    return _state["proxy_request"], _state["errors"]
+
+
+def _request_body(event: Dict) -> Optional[bytes]:
+    body = event.get("body")
+    if body is None:
+        return None
+    return base64.b64decode(body) if event.get("isBase64Encoded") else body.encode("utf-8")
+
+
+def build_event(lambda_event: Dict) -> Tuple[Dict, Optional[Dict]]:
+    """Translate an API Gateway / function URL event into the standard event plus transform options"""
+    context = lambda_event.get("requestContext") or {}
+    http = context.get("http")
+
+    if http:
+        # HTTP API (payload 2.0) and function URLs
+        method = http["method"]
+        path = lambda_event.get("rawPath") or http.get("path", "/")
+        client_ip = http.get("sourceIp")
+        params = dict(parse_qsl(lambda_event.get("rawQueryString", "")))
+    else:
+        # REST API (payload 1.0)
+        method = lambda_event["httpMethod"]
+        path = lambda_event.get("path", "/")
+        client_ip = (context.get("identity") or {}).get("sourceIp")
+        params = dict(lambda_event.get("queryStringParameters") or {})
+
+    if path == PROXY_PREFIX or path.startswith(PROXY_PREFIX + "/"):
+        path = path[len(PROXY_PREFIX):] or "/"
+
+    headers = {name.title(): value for name, value in (lambda_event.get("headers") or {}).items()}
+    host = headers.get("Host")
+    for header in HEADERS_TO_SKIP:
+        headers.pop(header, None)
+
+    data = None
+    body = _request_body(lambda_event)
+    if body and "application/json" in headers.get("Content-Type", ""):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+
+    event = {
+        "method": method,
+        "path": path,
+        "host": host,
+        "client_ip": client_ip,
+        "params": params,
+        "data": data,
+        "headers": headers
+    }
+
+    transform_options = None
+    if params.get("page_title") or params.get("text_replace"):
+        transform_options = {
+            "page_title": params.get("page_title"),
+            "text_replaces": json.loads(params.get("text_replace", "{}"))
+        }
+
+    return event, transform_options
+
+
+def _is_text(content_type: Optional[str]) -> bool:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return any(marker in content_type if marker.startswith("+") else content_type.startswith(marker) for marker in TEXT_TYPES)
+
+
+def build_lambda_response(response: Dict) -> Dict:
+    """Lambda proxy integration response for a proxy_request result"""
+    content_type = response["content_type"]
+    body = response.get("body")
+
+    if body is None:
+        # transformed or parsed content
+        content = response["content"]
+        if isinstance(content, (dict, list)):
+            body = json.dumps(content).encode("utf-8")
+            content_type = "application/json"
+        elif isinstance(content, str):
+            body = content.encode("utf-8")
+        else:
+            body = content or b""
+
+    if _is_text(content_type):
+        try:
+            text, encoded = body.decode("utf-8"), False
+        except UnicodeDecodeError:
+            text, encoded = base64.b64encode(body).decode("ascii"), True
+    else:
+        text, encoded = base64.b64encode(body).decode("ascii"), True
+
+    headers = {"Content-Type": content_type} if content_type else {}
+    return {"statusCode": response["status_code"], "headers": headers, "body": text, "isBase64Encoded": encoded}
+
+
+def _error_response(status_code: int, message: str, headers: Optional[Dict] = None) -> Dict:
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json", **(headers or {})},
+        "body": json.dumps({"error": message}),
+        "isBase64Encoded": False
+    }
+
+
+def handler(lambda_event: Dict, context=None) -> Dict:
+    """Lambda entry point"""
+    proxy_request, rejections = _pipeline()
+    # log lines carry the client's X-Request-ID, or the invocation's ID
+    token = bind_request(header_request_id(lambda_event.get("headers")) or getattr(context, "aws_request_id", None))
+
+    try:
+        event, transform_options = build_event(lambda_event)
+
+        adapter_logger.info("Lambda received: %s %s", event["method"], event["path"])
+
+        response = proxy_request(event, transform_options)
+        return build_lambda_response(response)
+
+    except rejections as e:
+        # 429 / 503, the client may retry after the limit or circuit resets
+        adapter_logger.warning("Rejected: %s", e)
+        return _error_response(e.status_code, str(e), {"Retry-After": e.retry_after_header})
+
+    except ValueError as e:
+        adapter_logger.error("Validation error: %s", e)
+        return _error_response(400, str(e))
+
+    except Exception as e:
+        adapter_logger.error("Proxy error: %s", e, exc_info=True)
+        return _error_response(500, str(e))
+
+    finally:
+        reset_request(token)
+        # the environment may be frozen as soon as this returns, write the queued lines first
+        flush_logs()
@@ -0,0 +1,325 @@
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import FileWrapper
+
+from reverse_proxy.config.logging import adapter_logger, stop_logging
+
+
+# Pre-forking process manager behind `reverse-proxy serve`.
+#
+# The master only binds the port and supervises: it never imports the proxy,
+# so every worker (and every generation after a SIGHUP reload) starts from a
+# clean import of server.app with its own pools and background threads.
+#
+#   SIGTERM / SIGINT   stop accepting, drain in-flight requests, exit
+#   SIGHUP             start a new generation of workers, then drain the old one
+#
+# With SO_REUSEPORT each worker listens on its own socket and the kernel
+# spreads connections across them; otherwise workers share the master's socket.
+
+WORKER_BOOT_ERROR = 3
+POLL_INTERVAL = 0.2
+KILL_MARGIN = 5
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def bind_socket(host: str, port: int, reuse_port: bool = False, listen: bool = True, backlog: int = 1024) -> socket.socket:
+    """TCP socket bound to host:port, listening unless told otherwise"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        if listen:
+            sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class SendfileWrapper:
+    """wsgi.file_wrapper that has the kernel copy the file to the socket
+
+    The first, empty chunk makes werkzeug send the status line and headers,
+    then the rest of the file goes out with socket.sendfile. Responses are
+    HTTP/1.0, so the body is never chunk-framed.
+    """
+
+    def __init__(self, connection: socket.socket, filelike, block_size: int = 8192):
+        self.connection = connection
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def __iter__(self):
+        if "b" not in getattr(self.filelike, "mode", ""):
+            # not a real file, read it like werkzeug would
+            yield from FileWrapper(self.filelike, self.block_size)
+            return
+        yield b""
+        self.connection.sendfile(self.filelike, offset=self.filelike.tell())
+
+    def close(self) -> None:
+        self.filelike.close()
+
+
+class WorkerRequestHandler(WSGIRequestHandler):
+    # One request per connection: an idle keep-alive client would otherwise
+    # pin one of the worker's few threads.
+    protocol_version = "HTTP/1.0"
+
+    def make_environ(self):
+        environ = super().make_environ()
+        environ["wsgi.file_wrapper"] = partial(SendfileWrapper, self.connection)
+        return environ
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handing each connection to a fixed pool of threads
+
+    Accepting blocks while every thread is busy, so a saturated worker leaves
+    new connections in the kernel backlog for its siblings.
+    """
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host: str, port: int, app, threads: int, fd: Optional[int] = None):
+        super().__init__(host, port, app, handler=WorkerRequestHandler, fd=fd)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="proxy-worker")
+        self.slots = threading.Semaphore(threads)
+        self.idle = threading.Condition()
+        self.in_flight = 0
+
+    def process_request(self, request, client_address) -> None:
+        self.slots.acquire()
+        with self.idle:
+            self.in_flight += 1
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.idle:
+                self.in_flight -= 1
+                self.idle.notify_all()
+            self.slots.release()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait for in-flight requests to finish, False if some were still running"""
+        with self.idle:
+            drained = self.idle.wait_for(lambda: self.in_flight == 0, timeout)
+        self.executor.shutdown(wait=drained)
+        return drained
+
+
+def _boot_wsgi(sock: socket.socket, options: Dict) -> Callable[[], None]:
+    from server import app as wsgi
+
+    server = PooledWSGIServer(options["host"], sock.getsockname()[1], wsgi.app, options["threads"], fd=sock.fileno())
+    wsgi.start_background_tasks()
+    return partial(_serve_wsgi, server, sock, wsgi.stop_background_tasks, options)
+
+
+def _serve_wsgi(server: PooledWSGIServer, sock: socket.socket, cleanup: Callable[[], None], options: Dict) -> None:
+    def on_term(signum, frame) -> None:
+        # shutdown() waits for serve_forever, which runs in this (main) thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_term)
+    adapter_logger.info("Worker %s serving with %s threads", os.getpid(), options['threads'])
+    try:
+        server.serve_forever()
+    finally:
+        sock.close()
+        if not server.drain(options["graceful_timeout"]):
+            adapter_logger.warning("Worker %s exiting with %s requests in flight", os.getpid(), server.in_flight)
+        cleanup()
+
+
+def _boot_asgi(sock: socket.socket, options: Dict) -> Callable[[], None]:
+    import uvicorn
+
+    # uvicorn drains on SIGTERM itself; threads don't apply to its event loop
+    config = uvicorn.Config(
+        "server.asgi:app",
+        lifespan="on",
+        timeout_graceful_shutdown=options["graceful_timeout"],
+        log_config=None
+    )
+    return partial(uvicorn.Server(config).run, sockets=[sock])
+
+
+INTERFACES = {"wsgi": _boot_wsgi, "asgi": _boot_asgi}
+
+
+def _run_worker(listener: Optional[socket.socket], options: Dict) -> int:
+    """Body of a forked worker, returns its exit code"""
+    # the master decides when workers stop, a terminal's Ctrl-C reaches it too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    try:
+        if options["reuse_port"]:
+            sock = bind_socket(options["host"], options["port"], reuse_port=True)
+        else:
+            sock = listener
+        run = INTERFACES[options["interface"]](sock, options)
+    except Exception as e:
+        adapter_logger.error("Worker %s failed to boot: %s", os.getpid(), e, exc_info=True)
+        return WORKER_BOOT_ERROR
+
+    try:
+        run()
+    except Exception as e:
+        adapter_logger.error("Worker %s crashed: %s", os.getpid(), e, exc_info=True)
+        return 1
+    return 0
+
+
+def _spawn(listener: socket.socket, options: Dict, workers: Dict[int, Dict], generation: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            code = _run_worker(None if options["reuse_port"] else listener, options)
+        finally:
+            # os._exit skips atexit, write out queued log records (exit warnings, tracebacks) first
+            stop_logging()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    workers[pid] = {"generation": generation, "kill_at": None}
+    return pid
+
+
+def _terminate(workers: Dict[int, Dict], pids, graceful_timeout: float) -> None:
+    """Ask workers to drain and exit, scheduling a SIGKILL if they take too long"""
+    for pid in pids:
+        if workers[pid]["kill_at"] is None:
+            workers[pid]["kill_at"] = time.monotonic() + graceful_timeout + KILL_MARGIN
+            _signal(pid, signal.SIGTERM)
+
+
+def _signal(pid: int, signum: int) -> None:
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _reap(workers: Dict[int, Dict]) -> Dict[int, int]:
+    """Collect exited workers, returns {pid: exit code}"""
+    exited = {}
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            break
+        exited[pid] = os.waitstatus_to_exitcode(status)
+        workers.pop(pid, None)
+    return exited
+
+
+def serve(host: str = "0.0.0.0", port: int = 5001, workers: Optional[int] = None, threads: int = 8,
+          reuse_port: bool = True, graceful_timeout: float = 30, interface: str = "wsgi") -> int:
+    """Run the master process until SIGTERM/SIGINT, returns the exit code"""
+    if interface not in INTERFACES:
+        raise ValueError(f"Unknown interface: {interface}")
+
+    if reuse_port and not reuse_port_supported():
+        adapter_logger.warning("SO_REUSEPORT is not supported here, workers will share one socket")
+        reuse_port = False
+
+    # with SO_REUSEPORT the master's socket only reserves the port (and resolves
+    # port 0), it never listens so the kernel doesn't route connections to it
+    listener = bind_socket(host, port, reuse_port=reuse_port, listen=not reuse_port)
+    options = {
+        "host": host,
+        "port": listener.getsockname()[1],
+        "threads": threads,
+        "reuse_port": reuse_port,
+        "graceful_timeout": graceful_timeout,
+        "interface": interface
+    }
+    count = workers or os.cpu_count() or 1
+
+    received = []
+    for signum in [signal.SIGTERM, signal.SIGINT, signal.SIGHUP]:
+        signal.signal(signum, lambda signum, frame: received.append(signum))
+
+    adapter_logger.info("Master %s listening on %s:%s (%s, %s workers, reuse_port=%s)", os.getpid(), host, options['port'], interface, count, reuse_port)
+
+    children: Dict[int, Dict] = {}
+    generation = 0
+    stopping = False
+    exit_code = 0
+    for _ in range(count):
+        _spawn(listener, options, children, generation)
+
+    while children:
+        for pid, code in _reap(children).items():
+            if code == WORKER_BOOT_ERROR and not stopping:
+                adapter_logger.error("Worker %s failed to boot, shutting down", pid)
+                stopping = True
+                exit_code = WORKER_BOOT_ERROR
+                _terminate(children, list(children), graceful_timeout)
+            elif not stopping and code != 0:
+                adapter_logger.warning("Worker %s exited with %s, restarting", pid, code)
+
+        # keep the current generation at full strength
+        current = [pid for pid, worker in children.items() if worker["generation"] == generation]
+        if not stopping:
+            for _ in range(count - len(current)):
+                _spawn(listener, options, children, generation)
+
+        while received:
+            signum = received.pop(0)
+            if signum == signal.SIGHUP and not stopping:
+                generation += 1
+                adapter_logger.info("Reloading: starting worker generation %s", generation)
+                old = list(children)
+                for _ in range(count):
+                    _spawn(listener, options, children, generation)
+                _terminate(children, old, graceful_timeout)
+            elif signum in [signal.SIGTERM, signal.SIGINT] and not stopping:
+                adapter_logger.info("Shutting down, draining for up to %ss", graceful_timeout)
+                stopping = True
+                _terminate(children, list(children), graceful_timeout)
+
+        now = time.monotonic()
+        for pid, worker in children.items():
+            if worker["kill_at"] is not None and now >= worker["kill_at"]:
+                adapter_logger.warning("Worker %s did not drain in time, killing it", pid)
+                _signal(pid, signal.SIGKILL)
+                worker["kill_at"] = float("inf")
+
+        if not children:
+            break
+        time.sleep(POLL_INTERVAL)
+
+    listener.close()
+    adapter_logger.info("Master exiting")
+    return exit_code
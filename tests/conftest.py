@@ -0,0 +1,23 @@
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+from reverse_proxy.breaker import reset_breakers
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    # breaker windows are per host and process-wide, don't let failures leak between tests
+    reset_breakers()
+    yield
+
+
+def make_response(body=b"hello", content_type="text/plain", url="https://example.com/", headers=None, status_code=200, encoding=None):
+    """A buffered upstream response, as execute_request returns it"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.headers = CaseInsensitiveDict({"Content-Type": content_type, **(headers or {})})
+    response.encoding = encoding
+    response._content = body.encode() if isinstance(body, str) else body
+    response._content_consumed = True
+    return response
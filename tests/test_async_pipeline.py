@@ -0,0 +1,216 @@
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import patch
+from reverse_proxy import async_execution, cache, ratelimit, stages
+from reverse_proxy.async_execution import execute_request_async, parse_response_async
+from reverse_proxy.proxy_service import proxy_request_async
+from reverse_proxy.ratelimit import RateLimitExceeded
+from reverse_proxy.router import compile_routes
+from reverse_proxy.stages import register_stage, require_async_stages
+from server.asgi import app
+
+
+def mock_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_execute_and_parse_json_async():
+    def handler(request):
+        assert request.headers["Accept"] == "*/*"
+        assert "Host" not in request.headers or request.headers["Host"] == "example.com"
+        return httpx.Response(200, json={"key": "value"})
+
+    async def scenario():
+        with patch.object(async_execution, "get_async_client", return_value=mock_client(handler)):
+            raw = await execute_request_async("get", "https://example.com", headers={"Host": "proxy"})
+            return await parse_response_async(raw)
+
+    response = run(scenario())
+
+    assert response["status_code"] == 200
+    assert response["json"] == {"key": "value"}
+    assert response["content"] == {"key": "value"}
+
+
+def test_execute_request_async_rejects_invalid_url():
+    with pytest.raises(ValueError, match="Invalid URL"):
+        run(execute_request_async("GET", "ftp://example.com"))
+
+
+def test_execute_request_async_raises_for_status():
+    async def scenario():
+        client = mock_client(lambda request: httpx.Response(503))
+        with patch.object(async_execution, "get_async_client", return_value=client):
+            await execute_request_async("GET", "https://example.com")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(scenario())
+
+
+def test_proxy_request_async_streams():
+    async def scenario():
+        client = mock_client(lambda request: httpx.Response(200, content=b"x" * 50000, headers={"Content-Type": "video/mp4"}))
+        with patch.object(async_execution, "get_async_client", return_value=client):
+            response = await proxy_request_async({"method": "GET", "path": "/youtube"}, stream=True)
+            return [chunk async for chunk in response["stream"]]
+
+    chunks = run(scenario())
+
+    assert b"".join(chunks) == b"x" * 50000
+
+
+def test_proxy_request_async_multiplexes_concurrent_requests():
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, text="ok", headers={"Content-Type": "text/plain"})
+
+    async def scenario():
+        client = mock_client(handler)
+        with patch.object(async_execution, "get_async_client", return_value=client):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            responses = await asyncio.gather(*[
+                proxy_request_async({"method": "GET", "path": "/google"}) for _ in range(50)
+            ])
+            return responses, loop.time() - started
+
+    responses, elapsed = run(scenario())
+
+    assert all(response["content"] == "ok" for response in responses)
+    assert elapsed < 2
+
+
+def asgi_get(path):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.get(path)
+    return run(scenario())
+
+
+def test_asgi_health():
+    response = asgi_get("/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "healthy"
+
+
+def test_asgi_unknown_endpoint():
+    assert asgi_get("/nope").status_code == 404
+
+
+def test_asgi_proxy_streams_body():
+    async def fake_stream():
+        yield b"part-1"
+        yield b"part-2"
+
+    async def fake_proxy(event, transform_options=None, stream=False):
+        assert event["path"] == "/youtube"
+        assert event["params"] == {"v": "1"}
+        return {"status_code": 200, "content_type": "video/mp4", "content": None, "stream": fake_stream()}
+
+    with patch("server.asgi.proxy_request_async", side_effect=fake_proxy):
+        response = asgi_get("/proxy/youtube?v=1")
+
+    assert response.status_code == 200
+    assert response.content == b"part-1part-2"
+    assert response.headers["content-type"] == "video/mp4"
+
+
+def test_asgi_proxy_transform_options_and_validation_error():
+    async def fake_proxy(event, transform_options=None, stream=False):
+        assert transform_options == {"page_title": "New", "text_replaces": {"a": "b"}}
+        raise ValueError("Unknown path")
+
+    query = "page_title=New&text_replace=" + json.dumps({"a": "b"})
+    with patch("server.asgi.proxy_request_async", side_effect=fake_proxy):
+        response = asgi_get("/proxy/missing?" + query)
+
+    assert response.status_code == 400
+    assert response.json() == {"error": "Unknown path"}
+
+
+def proxy_with(handler, event, routes, **kwargs):
+    async def scenario():
+        with patch.object(async_execution, "get_async_client", return_value=mock_client(handler)):
+            return await proxy_request_async(event, route_config=routes, **kwargs)
+
+    return run(scenario())
+
+
+def test_async_pipeline_applies_request_header_rewrites():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers)
+        return httpx.Response(200, text="ok", headers={"Content-Type": "text/plain"})
+
+    routes = {"/api": {"target": "https://api.example.com", "request_headers": {"Authorization": None, "X-Env": "prod"},
+                       "stages": ["headers", "upstream"]}}
+    event = {"method": "GET", "path": "/api", "headers": {"Authorization": "Bearer secret"}}
+    proxy_with(handler, event, routes)
+
+    assert "Authorization" not in seen[0] and seen[0]["X-Env"] == "prod"
+
+
+def test_async_pipeline_skips_stages_the_route_leaves_out():
+    def handler(request):
+        return httpx.Response(200, text="<html><head><title>Origin</title></head></html>", headers={"Content-Type": "text/html"})
+
+    ratelimit.reset_rate_limits()
+    config = dict(ratelimit.RATE_LIMIT_CONFIG, rules=[{"name": "one", "key": "route", "rate": 0.001, "burst": 1}])
+    routes = {"/bare": {"target": "https://bare.example.com", "stages": ["upstream"]}}
+    event = {"method": "GET", "path": "/bare"}
+    try:
+        with patch.dict(ratelimit.RATE_LIMIT_CONFIG, config):
+            for _ in range(3):
+                response = proxy_with(handler, event, routes, transform_options={"page_title": "Proxied"})
+                assert "<title>Origin</title>" in response["content"]
+
+            limited = {"/limited": {"target": "https://bare.example.com", "stages": ["ratelimit", "upstream"]}}
+            proxy_with(handler, {"method": "GET", "path": "/limited"}, limited)
+            with pytest.raises(RateLimitExceeded):
+                proxy_with(handler, {"method": "GET", "path": "/limited"}, limited)
+    finally:
+        ratelimit.reset_rate_limits()
+
+
+def test_async_pipeline_caches_and_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, text="fresh", headers={"Content-Type": "text/plain", "Cache-Control": "max-age=60"})
+
+    cache.clear_cache()
+    routes = {"/cached": {"target": "https://cached.example.com", "retries": 1, "stages": ["cache", "upstream"]}}
+    event = {"method": "GET", "path": "/cached"}
+    try:
+        with patch("reverse_proxy.retry.backoff", return_value=0):
+            first = proxy_with(handler, event, routes)
+            second = proxy_with(handler, event, routes, stream=True)
+    finally:
+        cache.clear_cache()
+
+    assert first["content"] == "fresh" and second["content"] == "fresh"
+    assert len(calls) == 2
+
+
+def test_sync_only_request_stages_are_rejected_for_the_async_pipeline():
+    register_stage("sync_only", lambda route: lambda ctx, call_next: call_next(ctx))
+    routes = {"/api": {"target": "https://api.example.com", "stages": ["sync_only", "upstream"]}}
+    try:
+        compile_routes(routes)
+        require_async_stages()
+        with pytest.raises(ValueError, match="no async form"):
+            compile_routes(routes)
+    finally:
+        require_async_stages(False)
+        stages._registry.pop("sync_only", None)
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from reverse_proxy.batch import parse_batch, run_batch, run_batch_async
+from reverse_proxy.ratelimit import RateLimitExceeded
+from server.app import app
+from server.asgi import app as asgi_app
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def _response(content, status_code=200):
+    return {"status_code": status_code, "headers": {}, "content_type": "application/json", "content": content}
+
+
+def fake_proxy(event, transform_options=None):
+    if event["path"] == "/bad":
+        raise ValueError("Unknown path: /bad")
+    if event["path"] == "/limited":
+        raise RateLimitExceeded("Rate limit exceeded", 2)
+    if event["path"] == "/boom":
+        raise RuntimeError("upstream exploded")
+    if event["path"] == "/slow":
+        time.sleep(0.5)
+    return _response({"path": event["path"], "method": event["method"]})
+
+
+@patch("reverse_proxy.batch.proxy_request", side_effect=fake_proxy)
+def test_batch_isolates_item_errors_and_keeps_request_order(mock_proxy, client):
+    response = client.post("/proxy/batch", json={"requests": [
+        {"id": "a", "path": "/slow"},
+        {"id": "b", "path": "/bad"},
+        {"id": "c", "method": "post", "path": "/api", "data": {"x": 1}},
+        {"id": "d", "path": "/limited"},
+        {"id": "e", "path": "/boom"}
+    ]})
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["id"] for result in results] == ["a", "b", "c", "d", "e"]
+    assert [result["status_code"] for result in results] == [200, 400, 200, 429, 500]
+    assert results[0]["content"] == {"path": "/slow", "method": "GET"}
+    assert results[2]["content"] == {"path": "/api", "method": "POST"}
+    assert results[1]["status"] == "error" and "Unknown path" in results[1]["message"]
+
+
+@patch("reverse_proxy.batch.proxy_request", side_effect=fake_proxy)
+def test_batch_streams_ndjson_as_items_complete(mock_proxy, client):
+    response = client.post(
+        "/proxy/batch",
+        json={"requests": [{"id": "slow", "path": "/slow"}, {"id": "fast", "path": "/fast"}]},
+        headers={"Accept": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line["id"] for line in lines] == ["fast", "slow"]
+    assert [line["index"] for line in lines] == [1, 0]
+
+
+@patch("reverse_proxy.batch.proxy_request", side_effect=fake_proxy)
+def test_batch_deadline_reports_unfinished_items_as_504(mock_proxy, client):
+    started = time.monotonic()
+    response = client.post("/proxy/batch", json={
+        "requests": [{"path": "/slow"}, {"path": "/fast"}],
+        "deadline": 0.1
+    })
+    elapsed = time.monotonic() - started
+
+    results = response.get_json()["results"]
+    assert [result["status_code"] for result in results] == [504, 200]
+    assert "deadline" in results[0]["message"]
+    assert elapsed < 0.5
+
+
+@patch("reverse_proxy.batch.proxy_request", side_effect=fake_proxy)
+def test_a_large_batch_does_not_hold_up_other_batches(mock_proxy):
+    big = threading.Thread(target=lambda: list(run_batch([{"path": "/slow"}] * 20, deadline=0.3)))
+    big.start()
+    time.sleep(0.05)
+
+    # the big batch keeps per_batch items in the pool, the rest of the workers stay free
+    results = list(run_batch([{"path": "/a"}, {"path": "/b"}], deadline=0.2))
+    big.join()
+
+    assert [result["status_code"] for result in results] == [200, 200]
+    # items not started before the big batch's deadline were never run
+    assert mock_proxy.call_count == 4 + 2
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({}, "must be"),
+    ({"requests": []}, "no requests"),
+    ({"requests": [{"path": "/a"}] * 51}, "limit is 50"),
+    ({"requests": ["/a"]}, "must be an object"),
+    ({"requests": [{"path": "/a"}], "deadline": 0}, "deadline")
+])
+def test_batch_rejects_malformed_bodies(client, payload, message):
+    response = client.post("/proxy/batch", json=payload)
+
+    assert response.status_code == 400
+    assert message in response.get_json()["message"]
+
+
+def test_parse_batch_caps_deadline():
+    items, deadline = parse_batch({"requests": [{"path": "/a"}], "deadline": 600})
+
+    assert items == [{"path": "/a"}]
+    assert deadline == 60
+
+
+def test_run_batch_async_cancels_items_past_the_deadline():
+    async def fake_proxy_async(event, transform_options=None):
+        if event["path"] == "/slow":
+            await asyncio.sleep(5)
+        if event["path"] == "/bad":
+            raise ValueError("Unknown path: /bad")
+        return _response("ok")
+
+    async def collect():
+        return [result async for result in run_batch_async(
+            [{"path": "/slow"}, {"path": "/fast"}, {"path": "/bad"}], deadline=0.1
+        )]
+
+    with patch("reverse_proxy.batch.proxy_request_async", side_effect=fake_proxy_async):
+        started = time.monotonic()
+        results = asyncio.run(collect())
+
+    assert time.monotonic() - started < 1
+    by_index = {result["index"]: result["status_code"] for result in results}
+    assert by_index == {0: 504, 1: 200, 2: 400}
+
+
+def test_asgi_batch_streams_ndjson():
+    async def fake_proxy_async(event, transform_options=None):
+        return _response({"path": event["path"]})
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.post("/proxy/batch", json={"requests": [{"path": "/a"}, {"path": "/b"}], "stream": True})
+
+    with patch("reverse_proxy.batch.proxy_request_async", side_effect=fake_proxy_async):
+        response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["content"]["path"] for line in lines) == ["/a", "/b"]
@@ -0,0 +1,77 @@
+import json
+import threading
+
+import requests
+
+from benchmarks.run import SCENARIOS, compare_results, measure, percentile, proxy_driver
+from benchmarks.stub_origin import start_stub_origin
+
+
+def _serve_stub():
+    server = start_stub_origin()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_stub_origin_serves_sized_payloads():
+    server, origin = _serve_stub()
+    try:
+        document = requests.get(f"{origin}/json", params={"size": 4096})
+        assert len(document.content) >= 4096
+        assert json.loads(document.content)["items"]
+        assert document.headers["Cache-Control"] == "no-store"
+
+        page = requests.get(f"{origin}/html", params={"size": 2048})
+        assert len(page.content) >= 2048
+        assert b"<title>Stub Origin</title>" in page.content
+
+        chunked = requests.get(f"{origin}/chunked", params={"chunks": 3, "size": 100})
+        assert chunked.headers["Transfer-Encoding"] == "chunked"
+        assert len(chunked.content) == 300
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_measure_drives_proxy_request_against_stub():
+    server, origin = _serve_stub()
+    try:
+        result = measure(proxy_driver(SCENARIOS["html-256k-title"], origin), concurrency=2, duration=0.3, warmup=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result["requests"] > 0
+    assert result["errors"] == 0
+    assert result["rps"] > 0
+    assert result["p50_ms"] <= result["p99_ms"] <= result["max_ms"]
+    assert result["peak_rss_mb"] > 0
+
+
+def test_percentile_uses_nearest_rank():
+    ordered = [float(n) for n in range(1, 101)]
+    assert percentile(ordered, 0.5) == 51.0
+    assert percentile(ordered, 0.99) == 100.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_compare_results_flags_regressions_beyond_tolerance():
+    baseline = {
+        "json-1k/proxy": {"rps": 1000.0, "p99_ms": 10.0},
+        "html-16k/proxy": {"rps": 500.0, "p99_ms": 20.0},
+        "slow-50ms/proxy": {"rps": 400.0, "p99_ms": 100.0}
+    }
+    current = {
+        "json-1k/proxy": {"rps": 950.0, "p99_ms": 10.5},    # within 10%
+        "html-16k/proxy": {"rps": 400.0, "p99_ms": 20.0},   # throughput dropped 20%
+        "slow-50ms/proxy": {"rps": 400.0, "p99_ms": 130.0}, # p99 rose 30%
+        "chunked-1m/proxy": {"rps": 50.0, "p99_ms": 90.0}   # not in the baseline
+    }
+
+    rows = {row["run"]: row for row in compare_results(baseline, current, tolerance=0.1)}
+
+    assert set(rows) == {"json-1k/proxy", "html-16k/proxy", "slow-50ms/proxy"}
+    assert rows["json-1k/proxy"]["regression"] is False
+    assert rows["html-16k/proxy"]["regression"] is True
+    assert rows["html-16k/proxy"]["rps_change"] == -0.2
+    assert rows["slow-50ms/proxy"]["regression"] is True
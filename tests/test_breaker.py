@@ -0,0 +1,106 @@
+import time
+import pytest
+import requests
+from unittest.mock import patch
+from reverse_proxy import breaker
+from reverse_proxy.breaker import before_request, record_result, breaker_stats, CircuitOpenError
+from reverse_proxy.cache import clear_cache
+from reverse_proxy.proxy_service import proxy_request
+from server.app import app
+
+URL = "https://origin.example.com/page"
+CONFIG = dict(breaker.BREAKER_CONFIG, min_requests=4, open_seconds=0.05, error_rate_threshold=0.5)
+
+
+def test_opens_on_error_rate_and_fails_fast():
+    for success in [True, False, True, False]:
+        before_request(URL, CONFIG)
+        record_result(URL, success, 0.01, CONFIG)
+
+    with pytest.raises(CircuitOpenError) as raised:
+        before_request(URL, CONFIG)
+    assert raised.value.retry_after <= 0.05
+    assert breaker_stats()["https://origin.example.com"]["state"] == "open"
+
+
+def test_half_open_probe_closes_or_reopens():
+    for _ in range(4):
+        record_result(URL, False, 0.01, CONFIG)
+    time.sleep(0.06)
+
+    before_request(URL, CONFIG)
+    with pytest.raises(CircuitOpenError):
+        before_request(URL, CONFIG)  # only one probe at a time
+    record_result(URL, False, 0.01, CONFIG)
+    assert breaker.get_breaker(URL)["state"] == "open"
+
+    time.sleep(0.06)
+    before_request(URL, CONFIG)
+    record_result(URL, True, 0.01, CONFIG)
+    assert breaker.get_breaker(URL)["state"] == "closed"
+    assert breaker.get_breaker(URL)["trips"] == 2
+
+
+def test_opens_on_slow_calls():
+    config = dict(CONFIG, slow_call_seconds=0.5, slow_rate_threshold=0.75)
+    for _ in range(4):
+        record_result(URL, True, 1.0, config)
+    with pytest.raises(CircuitOpenError):
+        before_request(URL, config)
+
+
+def test_timeout_adapts_to_p99_within_bounds():
+    config = dict(CONFIG, min_requests=10, timeout_multiplier=3, min_timeout=0.1, max_timeout=30)
+    assert before_request(URL, config) == 30
+
+    for _ in range(10):
+        record_result(URL, True, 0.2, config)
+    assert before_request(URL, config) == pytest.approx(0.6)
+
+    for _ in range(10):
+        record_result(URL, True, 20.0, config)
+    assert before_request(URL, config) == 30
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_open_circuit_skips_upstream_and_returns_503(mock_execute):
+    mock_execute.side_effect = requests.exceptions.Timeout("slow")
+    routes = {"/shop": "https://shop.example.com"}
+
+    with patch.dict(breaker.BREAKER_CONFIG, min_requests=3):
+        for _ in range(3):
+            with pytest.raises(requests.exceptions.Timeout):
+                proxy_request({"method": "POST", "path": "/shop"}, route_config=routes)
+
+        with pytest.raises(CircuitOpenError):
+            proxy_request({"method": "POST", "path": "/shop"}, route_config=routes)
+
+        with patch("reverse_proxy.proxy_service.get_live_routes", return_value=routes):
+            response = app.test_client().post("/proxy/shop")
+
+    assert mock_execute.call_count == 3
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert mock_execute.call_args.kwargs["timeout"] == breaker.BREAKER_CONFIG["max_timeout"]
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_open_circuit_serves_stale_cache_entry(mock_execute):
+    clear_cache()
+    fresh = requests.Response()
+    fresh.status_code = 200
+    fresh.headers.update({"Content-Type": "text/plain", "Cache-Control": "max-age=0", "ETag": '"v1"'})
+    fresh._content = b"cached body"
+    mock_execute.return_value = fresh
+    routes = {"/news": "https://news.example.com"}
+
+    proxy_request({"method": "GET", "path": "/news"}, route_config=routes)
+    for _ in range(breaker.BREAKER_CONFIG["min_requests"]):
+        record_result("https://news.example.com", False, 0.01)
+
+    response = proxy_request({"method": "GET", "path": "/news"}, route_config=routes)
+
+    assert mock_execute.call_count == 1
+    assert response["content"] == "cached body"
+    assert "Stale" in response["headers"]["Warning"]
+    clear_cache()
@@ -0,0 +1,158 @@
+import pytest
+from unittest.mock import patch
+from requests.structures import CaseInsensitiveDict
+from reverse_proxy import cache
+from reverse_proxy.proxy_service import proxy_request
+from tests.conftest import make_response
+
+
+CONFIG = {
+    "enabled": True,
+    "max_bytes": 100,
+    "max_entry_bytes": 60,
+    "default_ttl": 0,
+    "methods": ["GET", "HEAD"],
+    "statuses": [200]
+}
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    cache.clear_cache()
+    yield
+    cache.clear_cache()
+
+
+def store(body=b"hello", headers=None, request_headers=None, params=None, url="https://example.com/"):
+    lookup = cache.cache_lookup("GET", url, params, request_headers, CONFIG)
+    return cache.cache_store(lookup, make_response(body, headers=headers))
+
+
+def test_parse_cache_control():
+    assert cache.parse_cache_control('public, max-age=60, no-cache="Set-Cookie"') == {
+        "public": None, "max-age": "60", "no-cache": "Set-Cookie"
+    }
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"Cache-Control": "max-age=60"}, 60),
+    ({"Cache-Control": "max-age=60, s-maxage=10"}, 10),
+    ({"Cache-Control": "private, max-age=60"}, None),
+    ({"Cache-Control": "no-store"}, None),
+    ({"Cache-Control": "no-cache"}, 0),
+    ({"Date": "Mon, 01 Jan 2024 00:00:00 GMT", "Expires": "Mon, 01 Jan 2024 00:02:00 GMT"}, 120),
+    ({"Expires": "0"}, 0),
+    ({}, 0),
+])
+def test_freshness_lifetime(headers, expected):
+    assert cache.freshness_lifetime(CaseInsensitiveDict(headers)) == expected
+
+
+def test_fresh_hit_served_from_cache():
+    store(headers={"Cache-Control": "max-age=60"})
+
+    lookup = cache.cache_lookup("GET", "https://example.com/", None, None, CONFIG)
+
+    assert lookup["fresh"]
+    served = cache.cached_response(lookup)
+    assert served.content == b"hello"
+    assert served.text == "hello"
+    assert cache.cache_stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("cache_control, replayed", [
+    ("max-age=60", False),
+    ("public, max-age=60", True),
+])
+def test_set_cookie_only_replayed_from_public_entries(cache_control, replayed):
+    relayed = store(headers={"Cache-Control": cache_control, "Set-Cookie": "session=abc"})
+    assert relayed.headers["Set-Cookie"] == "session=abc"
+
+    served = cache.cached_response(cache.cache_lookup("GET", "https://example.com/", None, None, CONFIG))
+
+    assert ("Set-Cookie" in served.headers) is replayed
+
+
+def test_uncacheable_responses_not_stored():
+    store(headers={})
+    store(headers={"Cache-Control": "private, max-age=60"}, url="https://example.com/private")
+    store(headers={"Cache-Control": "max-age=60", "Vary": "*"}, url="https://example.com/vary")
+    store(headers={"Cache-Control": "max-age=60"}, request_headers={"Authorization": "x"}, url="https://example.com/auth")
+    store(body=b"x" * 61, headers={"Cache-Control": "max-age=60"}, url="https://example.com/big")
+
+    assert cache.cache_stats()["entries"] == 0
+
+
+def test_post_and_no_store_requests_bypass_cache():
+    assert cache.cache_lookup("POST", "https://example.com/", None, None, CONFIG) is None
+    assert cache.cache_lookup("GET", "https://example.com/", None, {"Cache-Control": "no-store"}, CONFIG) is None
+
+
+def test_key_includes_params_and_vary_headers():
+    store(body=b"en", headers={"Cache-Control": "max-age=60", "Vary": "Accept-Language"},
+          request_headers={"Accept-Language": "en"}, params={"q": "1"})
+
+    assert cache.cache_lookup("GET", "https://example.com/", {"q": "1"}, {"Accept-Language": "en"}, CONFIG)["fresh"]
+    assert not cache.cache_lookup("GET", "https://example.com/", {"q": "1"}, {"Accept-Language": "fr"}, CONFIG)["fresh"]
+    assert not cache.cache_lookup("GET", "https://example.com/", {"q": "2"}, {"Accept-Language": "en"}, CONFIG)["fresh"]
+
+
+def test_lru_eviction_by_bytes():
+    for name in ["a", "b", "c"]:
+        store(body=b"x" * 40, headers={"Cache-Control": "max-age=60"}, url=f"https://example.com/{name}")
+        # touch "a" so "b" becomes least recently used
+        cache.cache_lookup("GET", "https://example.com/a", None, None, CONFIG)
+
+    stats = cache.cache_stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 80
+    assert stats["evictions"] == 1
+    assert cache.cache_lookup("GET", "https://example.com/a", None, None, CONFIG)["entry"]
+    assert cache.cache_lookup("GET", "https://example.com/b", None, None, CONFIG)["entry"] is None
+
+
+def test_etag_revalidation_refreshes_entry():
+    store(headers={"Cache-Control": "no-cache", "ETag": '"v1"'})
+
+    lookup = cache.cache_lookup("GET", "https://example.com/", None, {"Accept": "*/*"}, CONFIG)
+    assert not lookup["fresh"]
+
+    conditional = cache.revalidation_headers(lookup, {"Accept": "*/*"})
+    assert conditional == {"Accept": "*/*", "If-None-Match": '"v1"'}
+
+    served = cache.cache_store(lookup, make_response(b"", status_code=304, headers={"ETag": '"v1"'}))
+
+    assert served.status_code == 200
+    assert served.content == b"hello"
+    assert cache.cache_stats()["revalidated"] == 1
+
+
+def test_client_if_none_match_gets_304_on_fresh_hit():
+    store(headers={"Cache-Control": "max-age=60", "ETag": '"v1"'})
+
+    lookup = cache.cache_lookup("GET", "https://example.com/", None, {"If-None-Match": '"v0", "v1"'}, CONFIG)
+    served = cache.cached_response(lookup)
+
+    assert served.status_code == 304
+    assert served.content == b""
+
+
+def test_hit_ratio():
+    store(headers={"Cache-Control": "max-age=60"})
+    for _ in range(3):
+        cache.cache_lookup("GET", "https://example.com/", None, None, CONFIG)
+
+    assert cache.cache_stats()["hit_ratio"] == 0.75
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_serves_repeat_get_from_cache(mock_execute):
+    mock_execute.return_value = make_response(b"<html>hi</html>", headers={
+        "Content-Type": "text/html", "Cache-Control": "max-age=60"
+    })
+
+    first = proxy_request({"method": "GET", "path": "/google"})
+    second = proxy_request({"method": "GET", "path": "/google"})
+
+    assert mock_execute.call_count == 1
+    assert first["content"] == second["content"] == "<html>hi</html>"
@@ -0,0 +1,144 @@
+import io
+import threading
+import time
+import pytest
+import requests
+from unittest.mock import patch
+from reverse_proxy import coalesce
+from reverse_proxy.coalesce import coalesce_key, single_flight, coalesce_stats
+from reverse_proxy.proxy_service import proxy_request
+from tests.conftest import make_response
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    coalesce.reset_coalesce_stats()
+    yield
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def worker(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_key_composition():
+    config = dict(coalesce.COALESCE_CONFIG, key_headers=["Accept"])
+
+    assert coalesce_key("POST", "https://a", None, None, config) is None
+    assert coalesce_key("get", "https://a", {"q": "1"}, {"accept": "text/html"}, config) == \
+        coalesce_key("GET", "https://a", {"q": "1"}, {"Accept": "text/html", "X-Trace": "1"}, config)
+    assert coalesce_key("GET", "https://a", None, {"Accept": "text/html"}, config) != \
+        coalesce_key("GET", "https://a", None, {"Accept": "application/json"}, config)
+    assert coalesce_key("GET", "https://a", {"q": "1"}, None, dict(config, key_params=False)) == \
+        coalesce_key("GET", "https://a", {"q": "2"}, None, dict(config, key_params=False))
+
+
+def test_concurrent_callers_share_one_fetch():
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return make_response(b"shared")
+
+    threads, results, errors = run_concurrently(5, lambda: single_flight(("GET", "https://a"), fetch))
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result.content == b"shared" for result in results)
+    assert len({id(result) for result in results}) == 5
+    stats = coalesce_stats()
+    assert stats["leaders"] == 1 and stats["saved"] == 4 and stats["in_flight"] == 0
+
+
+def test_followers_receive_leader_error():
+    release = threading.Event()
+
+    def fetch():
+        release.wait(2)
+        raise requests.exceptions.ConnectionError("down")
+
+    threads, results, errors = run_concurrently(3, lambda: single_flight(("GET", "https://b"), fetch))
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(error, requests.exceptions.ConnectionError) for error in errors)
+
+
+def test_follower_timeout_calls_upstream_itself():
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(2)
+        return make_response(b"shared")
+
+    config = dict(coalesce.COALESCE_CONFIG, follower_timeout=0.01)
+    threads, results, errors = run_concurrently(2, lambda: single_flight(("GET", "https://c"), fetch, coalesce_config=config))
+    threads[1].join()
+    release.set()
+    threads[0].join()
+
+    assert len(calls) == 2
+    assert coalesce_stats()["timeouts"] == 1
+
+
+def test_large_streamed_body_not_shared():
+    config = dict(coalesce.COALESCE_CONFIG, max_body_bytes=3)
+    response = make_response(b"shared", headers={"Content-Length": "6"})
+    assert coalesce._snapshot(response, stream=True, coalesce_config=config) is None
+    assert coalesce._snapshot(response, stream=False, coalesce_config=config)["body"] == b"shared"
+
+
+def test_lone_leader_leaves_streamed_body_unread():
+    response = requests.Response()
+    response.status_code = 200
+    response.headers.update({"Content-Type": "video/mp4", "Content-Length": "6"})
+    response.raw = body = io.BytesIO(b"stream")
+
+    returned = single_flight(("GET", "https://example.com/big", (), ()), lambda: response, stream=True)
+
+    assert returned is response and not response._content_consumed
+    assert body.tell() == 0
+    assert coalesce_stats()["in_flight"] == 0
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_coalesces_identical_gets(mock_execute):
+    release = threading.Event()
+
+    def slow(**kwargs):
+        release.wait(2)
+        return make_response(b"<p>hi</p>", "text/html", headers={"Cache-Control": "no-store"})
+
+    mock_execute.side_effect = slow
+    event = {"method": "GET", "path": "/feed"}
+    routes = {"/feed": "https://feed.example.com"}
+
+    threads, results, errors = run_concurrently(4, lambda: proxy_request(dict(event), route_config=routes))
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert mock_execute.call_count == 1
+    assert [result["content"] for result in results] == ["<p>hi</p>"] * 4
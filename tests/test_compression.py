@@ -0,0 +1,106 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from unittest.mock import patch
+from reverse_proxy import compression
+from reverse_proxy.compression import upstream_accept_encoding, compress_stream_response, parse_accept_encoding
+from reverse_proxy.proxy_service import proxy_request
+from server.app import app
+
+PAGE = b"<html><head><title>Origin</title></head><body>" + b"hello world " * 200 + b"</body></html>"
+
+
+class Origin(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = PAGE
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(PAGE)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def routes():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Origin)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield {"/site": f"http://127.0.0.1:{server.server_port}"}
+    server.shutdown()
+
+
+def fetch(routes, accept_encoding=None, transform_options=None):
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+    response = proxy_request({"method": "GET", "path": "/site", "headers": headers}, transform_options, route_config=routes, stream=True)
+    return response, b"".join(response["stream"])
+
+
+def test_upstream_accept_encoding_prefers_client_codings(monkeypatch):
+    monkeypatch.setattr(compression, "DECODABLE_ENCODINGS", ["gzip", "deflate"])
+    assert upstream_accept_encoding("gzip") == "gzip, deflate;q=0.5"
+    assert upstream_accept_encoding(None) == "gzip;q=0.5, deflate;q=0.5"
+    assert parse_accept_encoding("gzip;q=0, br") == {"gzip": 0.0, "br": 1.0}
+
+
+def test_compressed_body_passes_through(routes):
+    response, body = fetch(routes, "gzip, br")
+
+    assert response["content_encoding"] == "gzip"
+    assert gzip.decompress(body) == PAGE
+
+
+def test_decoded_when_client_takes_no_compression(routes):
+    response, body = fetch(routes, "identity")
+
+    assert response["content_encoding"] is None
+    assert body == PAGE
+
+
+def test_transform_decompresses_and_recompresses(routes):
+    response, body = fetch(routes, "gzip", {"page_title": "Proxied"})
+
+    assert response["content_encoding"] == "gzip"
+    assert gzip.decompress(body) == PAGE.replace(b"Origin", b"Proxied")
+
+
+def test_compress_uncompressed_respects_min_size():
+    config = dict(compression.COMPRESSION_CONFIG, compress_uncompressed=True, min_size=10)
+
+    def response(chunks):
+        return {"content_type": "text/plain", "headers": {}, "stream": iter(chunks)}
+
+    small = compress_stream_response(response([b"tiny"]), "gzip", config)
+    assert small.get("content_encoding") is None
+    assert b"".join(small["stream"]) == b"tiny"
+
+    large = compress_stream_response(response([b"abc" * 5, b"def"]), "gzip", config)
+    assert large["content_encoding"] == "gzip"
+    assert gzip.decompress(b"".join(large["stream"])) == b"abc" * 5 + b"def"
+
+    binary = compress_stream_response(dict(response([b"x" * 20]), content_type="image/png"), "gzip", config)
+    assert binary.get("content_encoding") is None
+
+
+@patch("server.app.proxy_request")
+def test_flask_sets_content_encoding(mock_proxy):
+    mock_proxy.return_value = {
+        "status_code": 200,
+        "headers": {},
+        "content_type": "text/html",
+        "content": None,
+        "content_encoding": "gzip",
+        "stream": iter([gzip.compress(b"hi")])
+    }
+
+    response = app.test_client().get("/proxy/site", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert mock_proxy.call_args.args[0]["headers"]["Accept-Encoding"] == "gzip"
@@ -0,0 +1,50 @@
+import pytest
+from unittest.mock import patch
+from server.app import app
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+@patch("server.app.proxy_request")
+def test_proxy_with_path_streams_untransformed_body(mock_proxy, client):
+    mock_proxy.return_value = {
+        "status_code": 200,
+        "headers": {},
+        "content_type": "video/mp4",
+        "content": None,
+        "stream": iter([b"part-1", b"part-2"])
+    }
+
+    response = client.get("/proxy/youtube")
+
+    assert mock_proxy.call_args.kwargs["stream"] is True
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "video/mp4"
+    assert "Content-Length" not in response.headers
+    assert response.data == b"part-1part-2"
+
+
+@patch("server.app.proxy_request")
+def test_proxy_with_path_buffered_body(mock_proxy, client):
+    mock_proxy.return_value = {
+        "status_code": 200,
+        "headers": {},
+        "content_type": "text/html",
+        "content": "<html>ok</html>"
+    }
+
+    response = client.get("/proxy/google?page_title=New")
+
+    assert response.data == b"<html>ok</html>"
+    assert response.headers["Content-Length"] == str(len(b"<html>ok</html>"))
+
+
+def test_health(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "healthy"
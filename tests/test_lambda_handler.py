@@ -0,0 +1,119 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+from reverse_proxy.ratelimit import RateLimitExceeded
+from reverse_proxy.breaker import CircuitOpenError
+from server import lambda_handler
+from server.lambda_handler import build_event, build_lambda_response, handler
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def http_api_event(path, query="", method="GET", body=None, headers=None):
+    return {
+        "version": "2.0",
+        "rawPath": path,
+        "rawQueryString": query,
+        "headers": headers or {"host": "proxy.example.com"},
+        "requestContext": {"http": {"method": method, "path": path, "sourceIp": "203.0.113.7"}},
+        "body": body,
+        "isBase64Encoded": False
+    }
+
+
+def fake_pipeline(proxy_request):
+    return patch.dict(lambda_handler._state, {"proxy_request": proxy_request, "errors": (RateLimitExceeded, CircuitOpenError)})
+
+
+def test_build_event_from_http_api_event():
+    event, transform_options = build_event(http_api_event(
+        "/proxy/api/users",
+        query="page=2&page_title=Hi",
+        method="POST",
+        body=json.dumps({"name": "x"}),
+        headers={"host": "proxy.example.com", "content-type": "application/json", "content-length": "13"}
+    ))
+
+    assert event["method"] == "POST"
+    assert event["path"] == "/api/users"
+    assert event["host"] == "proxy.example.com"
+    assert event["client_ip"] == "203.0.113.7"
+    assert event["params"] == {"page": "2", "page_title": "Hi"}
+    assert event["data"] == {"name": "x"}
+    assert "Host" not in event["headers"] and "Content-Length" not in event["headers"]
+    assert transform_options == {"page_title": "Hi", "text_replaces": {}}
+
+
+def test_build_event_from_rest_api_event():
+    event, transform_options = build_event({
+        "httpMethod": "GET",
+        "path": "/google",
+        "queryStringParameters": {"q": "proxy"},
+        "headers": {"Host": "proxy.example.com"},
+        "requestContext": {"identity": {"sourceIp": "198.51.100.1"}},
+        "body": None
+    })
+
+    assert event["method"] == "GET"
+    assert event["path"] == "/google"
+    assert event["params"] == {"q": "proxy"}
+    assert event["client_ip"] == "198.51.100.1"
+    assert transform_options is None
+
+
+def test_text_bodies_are_returned_as_text_and_binary_as_base64():
+    text = build_lambda_response({"status_code": 200, "content_type": "application/json", "content": None, "body": b'{"a": 1}'})
+    assert text == {"statusCode": 200, "headers": {"Content-Type": "application/json"}, "body": '{"a": 1}', "isBase64Encoded": False}
+
+    image = build_lambda_response({"status_code": 200, "content_type": "image/png", "content": None, "body": b"\x89PNG\x00"})
+    assert image["isBase64Encoded"] is True
+    assert base64.b64decode(image["body"]) == b"\x89PNG\x00"
+
+    transformed = build_lambda_response({"status_code": 200, "content_type": "text/html", "content": "<title>Hi</title>"})
+    assert transformed["body"] == "<title>Hi</title>"
+
+
+def test_handler_maps_pipeline_errors_to_status_codes():
+    def rejecting(event, transform_options=None):
+        if event["path"] == "/limited":
+            raise RateLimitExceeded("per-ip", 1.5)
+        raise ValueError(f"Unknown path: {event['path']}")
+
+    with fake_pipeline(rejecting):
+        limited = handler(http_api_event("/limited"))
+        unknown = handler(http_api_event("/missing"))
+
+    assert limited["statusCode"] == 429
+    assert limited["headers"]["Retry-After"] == "2"
+    assert unknown["statusCode"] == 400
+    assert json.loads(unknown["body"]) == {"error": "Unknown path: /missing"}
+
+
+def test_handler_proxies_through_pipeline():
+    def proxying(event, transform_options=None):
+        return {"status_code": 200, "content_type": "text/plain", "content": None, "body": event["path"].encode()}
+
+    with fake_pipeline(proxying):
+        response = handler(http_api_event("/proxy/google"))
+
+    assert response["statusCode"] == 200
+    assert response["body"] == "/google"
+
+
+def test_cold_import_defers_the_pipeline():
+    # the handler module must not pull in HTTP clients or the async stack at import time
+    script = (
+        "import sys, server.lambda_handler; "
+        "print(sorted(m for m in ['requests', 'httpx', 'asyncio', 'reverse_proxy.proxy_service'] if m in sys.modules))"
+    )
+    completed = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == "[]"
+
+    script = "import sys, reverse_proxy.proxy_service; print('httpx' in sys.modules, 'asyncio' in sys.modules)"
+    completed = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == "False False"
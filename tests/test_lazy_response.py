@@ -0,0 +1,55 @@
+import json
+from unittest.mock import patch
+from reverse_proxy.execution import parse_response, decode_body
+from reverse_proxy.transformation import transform_response
+from server.app import app
+from tests.conftest import make_response
+
+
+def test_nothing_decoded_until_asked():
+    result = parse_response(make_response(b'{"a": 1}', "application/json"))
+
+    assert result["body"] == b'{"a": 1}'
+    assert "text" not in result and "json" not in result and "content" not in result
+
+    with patch("reverse_proxy.execution.json.loads", wraps=json.loads) as loads:
+        assert result["content"] == {"a": 1}
+        assert result["json"] == {"a": 1}
+        assert loads.call_count == 1
+
+
+def test_invalid_json_falls_back_to_text():
+    result = parse_response(make_response(b"{oops", "application/json"))
+    assert result.get("json") is None
+    assert result.get("content") == "{oops"
+
+
+def test_binary_content_stays_bytes():
+    result = parse_response(make_response(b"\x89PNG\x00\xff", "image/png"))
+    assert result["content"] == b"\x89PNG\x00\xff"
+    assert "text" not in result
+
+
+def test_text_uses_declared_charset():
+    assert parse_response(make_response("café".encode("latin-1"), "text/plain", encoding="ISO-8859-1"))["text"] == "café"
+    assert decode_body("naïve".encode("utf-8"), None) == "naïve"
+
+
+def test_transform_drops_raw_body():
+    result = parse_response(make_response(b"<title>Old</title>", "text/html", encoding="utf-8"))
+    transform_response(result, page_title="New")
+
+    assert "body" not in result
+    assert result["content"] == "<title>New</title>"
+
+
+@patch("server.app.proxy_request")
+def test_untransformed_body_relayed_as_original_bytes(mock_proxy):
+    raw = b'{"b": 2,   "a": 1}'
+    mock_proxy.return_value = parse_response(make_response(raw, "application/json"))
+
+    response = app.test_client().get("/proxy/api")
+
+    assert response.data == raw
+    assert response.headers["Content-Length"] == str(len(raw))
+    assert "json" not in mock_proxy.return_value
@@ -0,0 +1,117 @@
+import json
+import logging
+import queue
+from unittest.mock import patch
+
+import pytest
+
+from reverse_proxy import batch
+from reverse_proxy.config import logging as log_pipeline
+from reverse_proxy.config.logging import (
+    JsonFormatter, RequestContextFilter, bind_request, reset_request, current_request_id,
+    set_log_route, header_request_id, log_stats
+)
+from server.app import app
+
+
+CONFIG = {"sample_rate": 1.0, "route_sample_rates": {"/noisy": 0.0}}
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def collected():
+    handler = Collect()
+    handler.addFilter(RequestContextFilter(CONFIG))
+    logger = logging.getLogger("test_logging")
+    logger.addHandler(handler)
+    yield logger, handler.records
+    logger.removeHandler(handler)
+
+
+def test_json_records_carry_request_id_and_route(collected):
+    logger, records = collected
+    token = bind_request("req-1")
+    try:
+        set_log_route("/google")
+        logger.info("Routed: %s -> %s", "/google/x", "https://www.google.com/x")
+    finally:
+        reset_request(token)
+
+    entry = json.loads(JsonFormatter().format(records[0]))
+    assert entry["message"] == "Routed: /google/x -> https://www.google.com/x"
+    assert entry["request_id"] == "req-1" and entry["route"] == "/google"
+    assert entry["level"] == "INFO" and entry["logger"] == "test_logging"
+    assert current_request_id() is None
+
+
+def test_unsampled_routes_keep_only_warnings_and_errors(collected):
+    logger, records = collected
+    before = log_stats()["sampled_out"]
+    token = bind_request()
+    try:
+        logger.info("before routing, default rate")
+        set_log_route("/noisy")
+        logger.info("dropped")
+        logger.error("always kept")
+    finally:
+        reset_request(token)
+
+    assert [record.getMessage() for record in records] == ["before routing, default rate", "always kept"]
+    assert log_stats()["sampled_out"] == before + 1
+
+
+def test_queued_records_are_formatted_by_the_writer_and_dropped_when_full():
+    handler = log_pipeline._Enqueue(queue.Queue(maxsize=1))
+    before = log_stats()["dropped"]
+    records = [logging.LogRecord("pipeline", logging.INFO, __file__, 1, "Validated: %s %s", ("GET", f"/{n}"), None) for n in range(2)]
+
+    for record in records:
+        handler.handle(record)
+
+    queued = handler.queue.get_nowait()
+    # not interpolated on the request thread
+    assert queued.msg == "Validated: %s %s" and queued.args == ("GET", "/0")
+    assert log_stats()["dropped"] == before + 1
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"x-request-id": "abc-123"}, "abc-123"),
+    ({"X-Request-Id": "line\nbreak"}, None),
+    ({"X-Request-ID": "x" * 200}, None),
+    ({}, None)
+])
+def test_header_request_id(headers, expected):
+    assert header_request_id(headers) == expected
+
+
+def test_flask_echoes_the_request_id():
+    client = app.test_client()
+
+    assert client.get("/health", headers={"X-Request-ID": "from-client"}).headers["X-Request-ID"] == "from-client"
+    generated = client.get("/health").headers["X-Request-ID"]
+    assert len(generated) == 32 and current_request_id() is None
+
+
+def test_batch_items_log_under_the_batch_request_id():
+    seen = {}
+
+    def record_id(event, transform_options=None):
+        seen[event["path"]] = current_request_id()
+        return {"status_code": 200, "headers": {}, "content_type": "text/plain", "content": "ok", "body": b"ok"}
+
+    token = bind_request("batch-7")
+    try:
+        with patch("reverse_proxy.batch.proxy_request", side_effect=record_id):
+            list(batch.run_batch([{"path": "/a"}, {"path": "/b"}], deadline=5))
+    finally:
+        reset_request(token)
+
+    assert seen == {"/a": "batch-7.0", "/b": "batch-7.1"}
@@ -0,0 +1,152 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from reverse_proxy import cache, media
+from reverse_proxy.proxy_service import proxy_request
+from tests.conftest import make_response
+
+
+LIVE = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:4
+#EXT-X-MEDIA-SEQUENCE:10
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:4.0,
+seg10.m4s
+#EXTINF:4.0,
+seg11.m4s
+#EXTINF:4.0,
+https://cdn.example.com/live/seg12.m4s
+#EXTINF:4.0,
+/live/seg13.m4s?token=abc
+"""
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360
+360p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2400000,RESOLUTION=1280x720
+720p/index.m3u8
+"""
+
+ROUTES = {"/live": {"target": "https://video.example.com/live", "media": True}}
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    cache.clear_cache()
+    media.reset_media()
+    yield
+    cache.clear_cache()
+    media.reset_media()
+
+
+def playlist(segments, endlist=False):
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:4"] + [f"#EXTINF:4.0,\n{segment}" for segment in segments]
+    return "\n".join(lines + (["#EXT-X-ENDLIST"] if endlist else [])) + "\n"
+
+
+def test_parse_hls_media_playlist():
+    parsed = media.parse_hls_playlist(LIVE, "https://video.example.com/live/index.m3u8")
+
+    assert parsed["master"] is False and parsed["endlist"] is False
+    assert parsed["target_duration"] == 4.0
+    assert parsed["segments"] == [
+        "https://video.example.com/live/init.mp4",
+        "https://video.example.com/live/seg10.m4s",
+        "https://video.example.com/live/seg11.m4s",
+        "https://cdn.example.com/live/seg12.m4s",
+        "https://video.example.com/live/seg13.m4s?token=abc"
+    ]
+
+
+def test_parse_hls_master_playlist_and_upstream_targets():
+    parsed = media.parse_hls_playlist(MASTER, "upstream://video/vod/index.m3u8")
+
+    assert parsed["master"] is True
+    assert parsed["segments"] == []
+    assert parsed["variants"] == ["upstream://video/vod/360p/index.m3u8", "upstream://video/vod/720p/index.m3u8"]
+
+    with pytest.raises(ValueError):
+        media.parse_hls_playlist("<html></html>", "https://video.example.com/index.m3u8")
+
+
+@pytest.mark.parametrize("url, kind", [
+    ("https://video.example.com/live/index.m3u8", "playlist"),
+    ("https://video.example.com/vod/manifest.mpd", "playlist"),
+    ("https://video.example.com/live/seg10.M4S", "segment"),
+    ("https://video.example.com/live/", None)
+])
+def test_media_kind(url, kind):
+    assert media.media_kind(url) == kind
+
+
+def test_live_prefetch_takes_newest_unseen_same_origin_segments():
+    base = "https://video.example.com/live/index.m3u8"
+    config = {**media.MEDIA_CONFIG, "prefetch_segments": 2}
+
+    first = media.parse_hls_playlist(playlist(["s1.ts", "s2.ts", "s3.ts", "https://cdn.example.com/s4.ts"]), base)
+    assert media.prefetch_candidates(base, first, base, config) == [
+        "https://video.example.com/live/s2.ts", "https://video.example.com/live/s3.ts"
+    ]
+
+    # the sliding window moved by one segment
+    refreshed = media.parse_hls_playlist(playlist(["s2.ts", "s3.ts", "s4.ts"]), base)
+    assert media.prefetch_candidates(base, refreshed, base, config) == ["https://video.example.com/live/s4.ts"]
+
+
+def test_vod_prefetch_takes_first_segments():
+    base = "https://video.example.com/vod/index.m3u8"
+    parsed = media.parse_hls_playlist(playlist(["s1.ts", "s2.ts", "s3.ts", "s4.ts"], endlist=True), base)
+
+    assert media.prefetch_candidates(base, parsed, base, {**media.MEDIA_CONFIG, "prefetch_segments": 2}) == [
+        "https://video.example.com/vod/s1.ts", "https://video.example.com/vod/s2.ts"
+    ]
+
+
+def test_media_ttls_override_origin_cache_control():
+    url = "https://video.example.com/live/seg1.ts"
+    lookup = cache.cache_lookup("GET", url, None, {}, media.media_cache_config("segment"))
+    cache.cache_store(lookup, make_response(b"x" * 10, "video/mp2t", url, headers={"Cache-Control": "no-cache"}))
+
+    entry = cache.cache_lookup("GET", url, None, {}, media.media_cache_config("segment"))
+    assert entry["fresh"] is True
+    assert entry["entry"]["expires_at"] - time.monotonic() > 250
+
+
+@pytest.mark.parametrize("cache_control", ["private", "no-store", "private, no-store"])
+def test_media_ttls_never_store_per_viewer_responses(cache_control):
+    url = "https://video.example.com/live/index.m3u8?token=viewer-1"
+    for kind in ["playlist", "segment"]:
+        lookup = cache.cache_lookup("GET", url, None, {}, media.media_cache_config(kind))
+        cache.cache_store(lookup, make_response(playlist(["s1.ts"]), "application/vnd.apple.mpegurl", url, headers={"Cache-Control": cache_control}))
+
+        assert cache.cache_lookup("GET", url, None, {}, media.media_cache_config(kind))["entry"] is None
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_playlist_fetch_prefetches_segments_into_cache(mock_execute):
+    def origin(method, url, params=None, data=None, headers=None, stream=False, timeout=None):
+        if url.endswith(".m3u8"):
+            return make_response(playlist(["s1.ts", "s2.ts"]), "application/vnd.apple.mpegurl", url)
+        return make_response(b"segment:" + url.encode(), "video/mp2t", url)
+
+    mock_execute.side_effect = origin
+    event = {"method": "GET", "path": "/live/index.m3u8", "params": {}, "data": None, "headers": {}}
+
+    response = proxy_request(event, route_config=ROUTES, stream=True)
+    assert response["status_code"] == 200
+    assert "stream" not in response
+
+    deadline = time.monotonic() + 2
+    while media.media_stats()["prefetched"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert media.media_stats()["prefetched"] == 2
+
+    # players now get the segments from the cache
+    calls = mock_execute.call_count
+    for name in ["s1.ts", "s2.ts"]:
+        segment = proxy_request({**event, "path": f"/live/{name}"}, route_config=ROUTES)
+        assert segment["body"] == b"segment:https://video.example.com/live/" + name.encode()
+    assert mock_execute.call_count == calls
@@ -0,0 +1,120 @@
+import pytest
+import requests
+from unittest.mock import patch, Mock
+from reverse_proxy import metrics
+from reverse_proxy.proxy_service import proxy_request
+from server.app import app
+from tests.conftest import make_response
+
+ROUTES = {"/users/{id}": "https://api.example.com/users/{id}"}
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset_metrics()
+    yield
+    metrics.reset_metrics()
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_records_stages_bytes_and_status_per_route_pattern(mock_execute):
+    mock_execute.return_value = make_response(b'{"ok": true}', "application/json")
+
+    for user in ["1", "2"]:
+        proxy_request({"method": "POST", "path": f"/users/{user}"}, route_config=ROUTES)
+
+    route = metrics.metrics_snapshot()["routes"]["/users/{id}"]
+    assert route["total"]["count"] == 2
+    assert set(route["stages"]) == {"validate", "route", "ratelimit", "cache", "upstream", "parse"}
+    assert route["statuses"] == {"200": 2}
+    assert route["bytes"] == {"upstream": 24}
+    assert metrics.metrics_snapshot()["in_flight"] == 0
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_errors_are_counted_and_unmatched_paths_grouped(mock_execute):
+    mock_execute.side_effect = requests.exceptions.Timeout("slow")
+
+    with pytest.raises(requests.exceptions.Timeout):
+        proxy_request({"method": "POST", "path": "/users/1"}, route_config=ROUTES)
+    with pytest.raises(ValueError):
+        proxy_request({"method": "POST", "path": "/nope"}, route_config=ROUTES)
+
+    routes = metrics.metrics_snapshot()["routes"]
+    assert routes["/users/{id}"]["statuses"] == {"error": 1}
+    assert routes[metrics.UNMATCHED_ROUTE]["statuses"] == {"error": 1}
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_streamed_request_in_flight_until_body_relayed(mock_execute):
+    raw = Mock(status_code=200, headers={"Content-Type": "video/mp4"})
+    raw.iter_content.return_value = iter([b"abc", b"defg"])
+    mock_execute.return_value = raw
+
+    response = proxy_request({"method": "POST", "path": "/users/1"}, route_config=ROUTES, stream=True)
+    assert metrics.metrics_snapshot()["in_flight"] == 1
+
+    assert b"".join(response["stream"]) == b"abcdefg"
+
+    snapshot = metrics.metrics_snapshot()
+    assert snapshot["in_flight"] == 0
+    assert snapshot["routes"]["/users/{id}"]["bytes"] == {"upstream": 7}
+    assert "stream" in snapshot["routes"]["/users/{id}"]["stages"]
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_head_requests_finish_without_their_body_being_read(mock_execute):
+    from reverse_proxy import upstreams
+
+    def streamed(*args, **kwargs):
+        raw = Mock(status_code=200, headers={"Content-Type": "video/mp4"})
+        raw.iter_content.return_value = iter([b"never", b"sent"])
+        return raw
+
+    mock_execute.side_effect = streamed
+    upstreams.set_upstream_groups({"media": {"strategy": "least_outstanding", "targets": ["https://a.example.com"]}})
+    routes = {"/s": "upstream://media"}
+    try:
+        with patch("server.app.proxy_request", side_effect=lambda *args, **kwargs: proxy_request(*args, route_config=routes, **kwargs)):
+            for _ in range(5):
+                # servers close the response iterator, as the test client does on close()
+                with app.test_client().head("/proxy/s/chunked") as response:
+                    assert response.status_code == 200
+
+        snapshot = metrics.metrics_snapshot()
+        assert snapshot["in_flight"] == 0
+        assert snapshot["routes"]["/s"]["total"]["count"] == 5
+        assert upstreams.upstream_stats()["media"]["targets"][0]["in_flight"] == 0
+    finally:
+        upstreams.set_upstream_groups({})
+
+
+def test_quantiles_from_buckets():
+    histogram = {"counts": [0] * (len(metrics.METRICS_CONFIG["buckets"]) + 1), "sum": 0.0, "count": 0}
+    buckets = metrics.METRICS_CONFIG["buckets"]
+    histogram["counts"][buckets.index(0.01)] = 90
+    histogram["counts"][buckets.index(1.0)] = 10
+    histogram["count"] = 100
+
+    assert 0.005 < metrics.quantile(histogram, 0.5) <= 0.01
+    assert 0.5 < metrics.quantile(histogram, 0.95) <= 1.0
+    assert metrics.quantile({"counts": [], "sum": 0, "count": 0}, 0.5) is None
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_metrics_endpoint_prometheus_text(mock_execute):
+    mock_execute.return_value = make_response(b'{"ok": true}', "application/json")
+    proxy_request({"method": "POST", "path": "/users/1"}, route_config=ROUTES)
+
+    response = app.test_client().get("/metrics")
+    text = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert "# TYPE proxy_request_duration_seconds histogram" in text
+    assert 'proxy_request_duration_seconds_bucket{route="/users/{id}",le="+Inf"} 1' in text
+    assert 'proxy_stage_duration_seconds_count{route="/users/{id}",stage="upstream"} 1' in text
+    assert 'proxy_requests_total{route="/users/{id}",status="200"} 1' in text
+    assert 'proxy_response_bytes_total{route="/users/{id}",source="upstream"} 12' in text
+    assert 'proxy_latency_quantile_seconds{route="/users/{id}",stage="total",quantile="0.99"}' in text
+    assert "proxy_requests_in_flight 0" in text
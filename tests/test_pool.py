@@ -0,0 +1,110 @@
+import pytest
+from unittest.mock import patch, Mock
+from reverse_proxy import pool
+from reverse_proxy.execution import execute_request
+
+
+CONFIG = {
+    "pool_size": 4,
+    "max_connections_per_host": None,
+    "max_idle_seconds": 60,
+    "max_age_seconds": 300
+}
+
+
+@pytest.fixture(autouse=True)
+def clean_pools():
+    pool.close_pools()
+    pool.reset_pool_stats()
+    yield
+    pool.close_pools()
+
+
+def test_pool_key_ignores_path_and_case():
+    assert pool.pool_key("https://Example.com/a?b=1") == "https://example.com"
+    assert pool.pool_key("http://example.com:8080/") == "http://example.com:8080"
+
+
+def test_session_reused_per_host():
+    first = pool.get_session("https://example.com/a", CONFIG)
+    second = pool.get_session("https://example.com/b", CONFIG)
+    other = pool.get_session("https://other.com/", CONFIG)
+
+    assert first is second
+    assert first is not other
+
+    stats = pool.pool_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert set(stats["hosts"]) == {"https://example.com", "https://other.com"}
+
+
+def test_session_recycled_after_max_age():
+    with patch("reverse_proxy.pool.time.monotonic", return_value=1000.0):
+        first = pool.get_session("https://example.com", CONFIG)
+
+    with patch("reverse_proxy.pool.time.monotonic", return_value=1000.0 + 301):
+        # keep it "used" so only the age limit applies
+        pool._pools["https://example.com"]["last_used"] = 1000.0 + 300
+        second = pool.get_session("https://example.com", CONFIG)
+
+    assert first is not second
+    assert pool.pool_stats()["evictions"] == 1
+
+
+def test_evict_idle_pools():
+    with patch("reverse_proxy.pool.time.monotonic", return_value=1000.0):
+        pool.get_session("https://example.com", CONFIG)
+
+    with patch("reverse_proxy.pool.time.monotonic", return_value=1000.0 + 61):
+        assert pool.evict_idle_pools(CONFIG) == 1
+
+    assert pool.pool_stats()["hosts"] == {}
+
+
+def test_connection_cap_blocks_pool():
+    session = pool.create_session({"pool_size": 10, "max_connections_per_host": 2})
+    adapter = session.get_adapter("https://example.com")
+
+    assert adapter._pool_maxsize == 2
+    assert adapter._pool_block is True
+
+
+def test_session_does_not_keep_upstream_cookies():
+    import requests
+    from http.client import HTTPMessage
+
+    session = pool.create_session(CONFIG)
+    upstream_headers = HTTPMessage()
+    upstream_headers["Set-Cookie"] = "sid=abc; Path=/"
+
+    session.cookies.extract_cookies(
+        requests.cookies.MockResponse(upstream_headers),
+        requests.cookies.MockRequest(requests.Request("GET", "https://example.com/").prepare())
+    )
+    assert len(session.cookies) == 0
+
+
+def test_warm_pools_swallows_connection_errors():
+    import requests
+
+    with patch("requests.Session.head", side_effect=requests.exceptions.ConnectionError("down")) as head:
+        pool.warm_pools(["https://example.com/a", "https://example.com/b", "https://other.com"], CONFIG)
+
+    assert head.call_count == 2
+    assert set(pool.pool_stats()["hosts"]) == {"https://example.com", "https://other.com"}
+
+
+def test_execute_request_uses_pooled_session():
+    mock_response = Mock(status_code=200)
+    mock_session = Mock()
+    mock_session.request.return_value = mock_response
+
+    with patch("reverse_proxy.execution.get_session", return_value=mock_session) as get_session:
+        result = execute_request("get", "https://example.com", headers={"Connection": "close", "Host": "x"})
+
+    assert result is mock_response
+    get_session.assert_called_once_with("https://example.com")
+    sent_headers = mock_session.request.call_args.kwargs["headers"]
+    assert "Connection" not in sent_headers
+    assert "Host" not in sent_headers
@@ -0,0 +1,98 @@
+import pytest
+from unittest.mock import patch, Mock
+from reverse_proxy import ratelimit
+from reverse_proxy.ratelimit import check_rate_limits, RateLimitExceeded, MemoryStore, gcra
+from server.app import app
+
+ROUTES = {"/hollandandbarrett": "https://www.hollandandbarrett.com", "/other": "https://other.example.com"}
+
+
+@pytest.fixture
+def rules():
+    ratelimit.reset_rate_limits()
+    config = dict(ratelimit.RATE_LIMIT_CONFIG, rules=[])
+    with patch.dict(ratelimit.RATE_LIMIT_CONFIG, config):
+        yield ratelimit.RATE_LIMIT_CONFIG["rules"]
+    ratelimit.reset_rate_limits()
+
+
+def test_gcra_allows_burst_then_refills_at_rate():
+    tat = None
+    for _ in range(3):
+        allowed, tat, _ = gcra(tat, 100.0, rate=2, burst=3)
+        assert allowed
+
+    allowed, _, retry_after = gcra(tat, 100.0, rate=2, burst=3)
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+
+    assert gcra(tat, 100.5, rate=2, burst=3)[0]
+
+
+def test_memory_store_sweeps_idle_keys():
+    store = MemoryStore(max_keys=2)
+    store.check("a", 0.0, rate=10, burst=1)
+    store.check("b", 0.0, rate=10, burst=1)
+    store.check("c", 5.0, rate=10, burst=1)
+    assert set(store.tats) == {"c"}
+
+
+def test_per_client_limit_only_on_listed_routes(rules):
+    rules.append({"name": "hb", "routes": ["/hollandandbarrett"], "key": "client_ip", "rate": 1, "burst": 2})
+
+    check_rate_limits({"client_ip": "1.1.1.1"}, "/hollandandbarrett", now=0)
+    check_rate_limits({"client_ip": "1.1.1.1"}, "/hollandandbarrett", now=0)
+    with pytest.raises(RateLimitExceeded) as raised:
+        check_rate_limits({"client_ip": "1.1.1.1"}, "/hollandandbarrett", now=0.2)
+
+    assert raised.value.retry_after == pytest.approx(0.8)
+    assert raised.value.retry_after_header == "1"
+    # other clients and other routes have their own budget
+    check_rate_limits({"client_ip": "2.2.2.2"}, "/hollandandbarrett", now=0.2)
+    for _ in range(5):
+        check_rate_limits({"client_ip": "1.1.1.1"}, "/other", now=0.2)
+
+    assert ratelimit.rate_limit_stats()["hb"] == {"allowed": 3, "limited": 1}
+
+
+def test_api_key_header_and_route_keys(rules):
+    rules.append({"name": "keys", "key": "header:X-Api-Key", "rate": 1, "burst": 1})
+    rules.append({"name": "origin", "key": "route", "rate": 1, "burst": 3})
+
+    check_rate_limits({"client_ip": "1.1.1.1", "headers": {"X-Api-Key": "k1"}}, "/other", now=0)
+    check_rate_limits({"client_ip": "1.1.1.1", "headers": {"X-Api-Key": "k2"}}, "/other", now=0)
+    with pytest.raises(RateLimitExceeded, match="keys"):
+        check_rate_limits({"client_ip": "9.9.9.9", "headers": {"X-Api-Key": "k1"}}, "/other", now=0)
+
+    check_rate_limits({"client_ip": "3.3.3.3"}, "/other", now=0)
+    with pytest.raises(RateLimitExceeded, match="origin"):
+        check_rate_limits({"client_ip": "4.4.4.4"}, "/other", now=0)
+
+
+def test_shared_store_is_used_by_every_check(rules):
+    store = Mock()
+    store.check.return_value = (False, 2.5)
+    ratelimit.set_store(store)
+    rules.append({"name": "shared", "key": "route", "rate": 10, "burst": 10})
+
+    with pytest.raises(RateLimitExceeded):
+        check_rate_limits({}, "/other", now=7.0)
+    store.check.assert_called_once_with("shared:/other:/other", 7.0, 10, 10)
+
+
+@patch("reverse_proxy.proxy_service.get_live_routes", return_value=ROUTES)
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_limited_before_upstream_and_served_as_429(mock_execute, mock_routes, rules):
+    rules.append({"name": "hb", "routes": ["/hollandandbarrett"], "rate": 0.1, "burst": 1})
+    mock_execute.return_value = Mock(status_code=200, headers={"Content-Type": "text/plain"})
+    mock_execute.return_value.iter_content.return_value = iter([b"ok"])
+
+    client = app.test_client()
+    with client.post("/proxy/hollandandbarrett") as first:
+        assert first.data == b"ok"
+    second = client.post("/proxy/hollandandbarrett")
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert int(second.headers["Retry-After"]) >= 9
+    assert mock_execute.call_count == 1
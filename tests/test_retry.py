@@ -0,0 +1,161 @@
+import threading
+import time
+import pytest
+import requests
+from unittest.mock import patch, Mock
+from reverse_proxy import retry
+from reverse_proxy.retry import call_with_retries, hedged, retry_policy, alternate_url, retry_stats, reset_retry_budget
+from reverse_proxy.proxy_service import proxy_request
+from reverse_proxy.config.logging import bind_request, reset_request, current_request_id
+
+CONFIG = dict(retry.RETRY_CONFIG, base_backoff=0.001, max_backoff=0.002, min_per_second=0)
+
+
+@pytest.fixture(autouse=True)
+def budget():
+    reset_retry_budget(balance=10)
+    yield
+    reset_retry_budget()
+
+
+def flaky(failures):
+    calls = []
+
+    def call(attempt):
+        calls.append(attempt)
+        if len(calls) <= failures:
+            raise requests.exceptions.ConnectionError("reset")
+        return "ok"
+
+    return call, calls
+
+
+def test_retries_until_success():
+    call, calls = flaky(2)
+    assert call_with_retries(call, 2, lambda e: True, CONFIG) == "ok"
+    assert calls == [0, 1, 2]
+    assert retry_stats()["retries"] == 2
+
+
+def test_non_retryable_errors_raise_immediately():
+    call, calls = flaky(1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        call_with_retries(call, 3, lambda e: False, CONFIG)
+    assert calls == [0]
+
+
+def test_budget_caps_retries():
+    reset_retry_budget(balance=1)
+    call, calls = flaky(5)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        call_with_retries(call, 5, lambda e: True, dict(CONFIG, budget_ratio=0))
+    assert calls == [0, 1]
+    assert retry_stats()["budget_exhausted"] == 1
+
+
+def test_backoff_is_jittered_and_bounded():
+    delays = [retry.backoff(10, CONFIG) for _ in range(50)]
+    assert all(0 <= delay <= CONFIG["max_backoff"] for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_policy_only_for_idempotent_methods():
+    route = {"pattern": "/api", "retries": 3, "hedge": {"delay": 0.2}}
+    assert retry_policy(route, "GET") == (3, 0.2)
+    assert retry_policy(route, "POST") == (0, None)
+    # p95-based hedge waits for enough samples
+    assert retry_policy({"pattern": "/unseen", "hedge": True}, "GET") == (retry.RETRY_CONFIG["retries"], None)
+
+
+def test_alternate_url_keeps_path_and_query():
+    assert alternate_url("https://a.example.com/x/y?q=1", "https://b.example.com") == "https://b.example.com/x/y?q=1"
+    assert alternate_url("https://a.example.com/x", None) == "https://a.example.com/x"
+
+
+def test_hedge_fires_after_delay_and_faster_attempt_wins():
+    release = threading.Event()
+    discarded = []
+
+    def attempt(index):
+        if index == 0:
+            release.wait(2)
+            return "slow"
+        return "fast"
+
+    assert hedged(attempt, 0.01, discarded.append, CONFIG) == "fast"
+    release.set()
+    time.sleep(0.05)
+    assert discarded == ["slow"]
+    assert retry_stats()["hedges"] == 1 and retry_stats()["hedge_wins"] == 1
+
+
+def test_no_hedge_when_primary_is_fast():
+    assert hedged(lambda index: f"attempt-{index}", 1.0, lambda result: None, CONFIG) == "attempt-0"
+    assert retry_stats()["hedges"] == 0
+
+
+def test_attempts_keep_the_callers_request_id():
+    token = bind_request("req-1")
+    try:
+        seen = []
+        hedged(lambda index: seen.append(current_request_id()), 1.0, lambda result: None, CONFIG)
+    finally:
+        reset_request(token)
+    assert seen == ["req-1"]
+
+
+def test_primaries_never_queue_behind_other_requests():
+    release = threading.Event()
+    started = []
+
+    def attempt(index):
+        started.append(index)
+        release.wait(5)
+        return index
+
+    reset_retry_budget(balance=0)
+    threads = [threading.Thread(target=hedged, args=(attempt, 0.01, lambda result: None, CONFIG)) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while len(started) < 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    running = len(started)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert running == 50
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_hedges_to_alternate(mock_execute):
+    release = threading.Event()
+
+    def execute(**kwargs):
+        if "primary" in kwargs["url"]:
+            release.wait(2)
+        return Mock(status_code=200, headers={"Content-Type": "text/plain"}, content=kwargs["url"].encode())
+
+    mock_execute.side_effect = execute
+    routes = {"/docs": {"target": "https://primary.example.com", "alternate": "https://mirror.example.com", "hedge": {"delay": 0.01}}}
+
+    response = proxy_request({"method": "GET", "path": "/docs/page"}, route_config=routes)
+    release.set()
+
+    assert response["body"] == b"https://mirror.example.com/page"
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_retries_get_but_not_post(mock_execute):
+    mock_execute.side_effect = [
+        requests.exceptions.ConnectionError("reset"),
+        Mock(status_code=200, headers={"Content-Type": "text/plain"}, content=b"ok"),
+        requests.exceptions.ConnectionError("reset")
+    ]
+    routes = {"/api": {"target": "https://api.example.com", "retries": 1}}
+
+    assert proxy_request({"method": "GET", "path": "/api"}, route_config=routes)["body"] == b"ok"
+    with pytest.raises(requests.exceptions.ConnectionError):
+        proxy_request({"method": "POST", "path": "/api"}, route_config=routes)
+    assert mock_execute.call_count == 3
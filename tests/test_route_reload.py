@@ -0,0 +1,101 @@
+import json
+import time
+import pytest
+from unittest.mock import patch
+from reverse_proxy import router
+from reverse_proxy.config.consts import ROUTE_CONFIG
+from reverse_proxy.route_loader import parse_route_file, reload_routes, watch_routes, stop_watching_routes
+from reverse_proxy.proxy_service import proxy_request
+from server.app import app
+
+
+@pytest.fixture(autouse=True)
+def restore_routes():
+    yield
+    stop_watching_routes()
+    router.set_live_routes(ROUTE_CONFIG)
+
+
+@pytest.fixture
+def route_file(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"/status": "https://status.example.com"}))
+    return str(path)
+
+
+def test_parse_route_file_json_and_yaml(tmp_path):
+    json_file = tmp_path / "routes.json"
+    json_file.write_text(json.dumps({"routes": {"/a": "https://a.example.com"}}))
+    assert parse_route_file(str(json_file)) == {"/a": "https://a.example.com"}
+
+    yaml = pytest.importorskip("yaml")
+    yaml_file = tmp_path / "routes.yaml"
+    yaml_file.write_text("/b:\n  target: https://b.example.com\n  methods: [GET]\n")
+    assert parse_route_file(str(yaml_file)) == {"/b": {"target": "https://b.example.com", "methods": ["GET"]}}
+
+
+@pytest.mark.parametrize("content", ["not json", "[1, 2]", '{"no-slash": "https://x"}', '{"/x": {"host": "y"}}'])
+def test_invalid_route_file_keeps_current_routes(tmp_path, content):
+    path = tmp_path / "routes.json"
+    path.write_text(content)
+    before = router.get_live_routes()
+
+    with pytest.raises(ValueError):
+        reload_routes(str(path))
+
+    assert router.get_live_routes() is before
+
+
+def test_reload_swaps_live_table(route_file):
+    version = router.live_routes_version()
+
+    reload_routes(route_file)
+
+    assert router.route_to_target("/status/ping") == "https://status.example.com/ping"
+    assert router.live_routes_version() == version + 1
+    with pytest.raises(ValueError):
+        router.route_to_target("/google")
+
+
+def test_in_flight_request_keeps_its_snapshot(route_file):
+    def execute_during_reload(**kwargs):
+        reload_routes(route_file)
+        raise RuntimeError(kwargs["url"])
+
+    with patch("reverse_proxy.proxy_service.execute_request", side_effect=execute_during_reload):
+        with pytest.raises(RuntimeError, match="https://www.google.com"):
+            proxy_request({"method": "GET", "path": "/google"}, route_config=None)
+
+    assert "/status" in router.get_live_routes()
+
+
+def test_watcher_reloads_on_change(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"/one": "https://one.example.com"}))
+    watch_routes(str(path), interval=0.01)
+
+    time.sleep(0.05)
+    path.write_text(json.dumps({"/two": "https://two.example.com", "/three": "https://three.example.com"}))
+
+    deadline = time.time() + 2
+    while "/two" not in router.get_live_routes() and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert set(router.get_live_routes()) == {"/two", "/three"}
+
+
+def test_reload_endpoint(route_file):
+    client = app.test_client()
+
+    with patch("server.app.reload_routes", side_effect=lambda: reload_routes(route_file)):
+        response = client.post("/routes/reload")
+
+    assert response.status_code == 200
+    assert response.get_json()["routes"] == ["/status"]
+    assert client.get("/routes").get_json()["available_routes"] == {"/status": "https://status.example.com"}
+    assert client.get("/health").get_json()["routes"] == ["/status"]
+
+
+def test_reload_endpoint_without_route_file():
+    response = app.test_client().post("/routes/reload")
+    assert response.status_code == 400
@@ -0,0 +1,113 @@
+import pytest
+from urllib.parse import urlsplit
+from reverse_proxy.router import route_to_target, match_route, compile_routes, route_origins
+
+
+CONFIG = {
+    "/google": "https://www.google.com",
+    "/hollandandbarrett": "https://www.hollandandbarrett.com/",
+    "/jsonplaceholder": "https://jsonplaceholder.typicode.com/posts",
+    "/users/{id}/posts": "https://api.example.com/v2/users/{id}/posts",
+    "/assets/*/latest": "https://cdn.example.com/latest",
+    "/api": [
+        {"target": "https://internal.example.com", "host": "internal.proxy.local"},
+        {"target": "https://write.example.com", "methods": ["POST", "PUT"]},
+        {"target": "https://read.example.com"},
+    ],
+}
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/google", "https://www.google.com"),
+    ("/google/search", "https://www.google.com/search"),
+    ("/google/search/", "https://www.google.com/search/"),
+    ("/hollandandbarrett", "https://www.hollandandbarrett.com/"),
+    ("/hollandandbarrett/vitamins", "https://www.hollandandbarrett.com/vitamins"),
+    ("/jsonplaceholder/1", "https://jsonplaceholder.typicode.com/posts/1"),
+    ("/users/42/posts", "https://api.example.com/v2/users/42/posts"),
+    ("/users/42/posts/7", "https://api.example.com/v2/users/42/posts/7"),
+    ("/assets/v1/latest", "https://cdn.example.com/latest"),
+])
+def test_route_to_target(path, expected):
+    assert route_to_target(path, CONFIG) == expected
+
+
+def test_unknown_path():
+    with pytest.raises(ValueError, match="Unknown path: /missing"):
+        route_to_target("/missing", CONFIG)
+    with pytest.raises(ValueError, match="Unknown path"):
+        route_to_target("/users/42", CONFIG)
+
+
+@pytest.mark.parametrize("path", [
+    "/google/../../admin/secret",
+    "/google/./search",
+    "/google/%2e%2e/admin",
+    "/google/%2E./admin",
+    "/google/..%2fadmin",
+    "/google/..%5cadmin",
+    "/users/../posts",
+    "/users/%2e%2e/posts",
+])
+def test_dot_segments_rejected(path):
+    with pytest.raises(ValueError, match="Invalid path"):
+        route_to_target(path, CONFIG)
+
+
+def test_dots_inside_segments_allowed():
+    assert route_to_target("/google/a..b/.well-known", CONFIG) == "https://www.google.com/a..b/.well-known"
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/users/1?admin=true", "https://api.example.com/v1/users/1%3Fadmin%3Dtrue"),
+    ("/users/evil.com#", "https://api.example.com/v1/users/evil.com%23"),
+    ("/users/x@evil.com:80", "https://api.example.com/v1/users/x%40evil.com%3A80"),
+    ("/files/a?b=1/c#d", "https://files.example.com/root/a%3Fb%3D1/c%23d"),
+    ("/files/x@y:z/", "https://files.example.com/root/x%40y%3Az/"),
+])
+def test_params_and_remainder_are_quoted(path, expected):
+    config = {"/users/{id}": "https://api.example.com/v1/users/{id}", "/files": "https://files.example.com/root"}
+    assert route_to_target(path, config) == expected
+
+
+def test_params_cannot_change_the_host():
+    config = {"/tenants/{name}": "https://{name}.api.example.com/v1"}
+    for name in ["evil.com#", "x@evil.com", "evil.com:80"]:
+        target = route_to_target(f"/tenants/{name}", config)
+        assert urlsplit(target).hostname.endswith(".api.example.com")
+
+
+def test_match_route_captures_params():
+    match = match_route("/users/42/posts", CONFIG)
+    assert match["params"] == {"id": "42"}
+    assert match["route"]["pattern"] == "/users/{id}/posts"
+
+
+def test_host_and_method_predicates():
+    assert route_to_target("/api/items", CONFIG, host="internal.proxy.local:5001") == "https://internal.example.com/items"
+    assert route_to_target("/api/items", CONFIG, method="POST") == "https://write.example.com/items"
+    assert route_to_target("/api/items", CONFIG, method="GET") == "https://read.example.com/items"
+
+
+def test_static_beats_param():
+    config = {"/users/{id}": "https://a.example.com/{id}", "/users/me": "https://me.example.com"}
+    assert route_to_target("/users/me", config) == "https://me.example.com"
+    assert route_to_target("/users/7", config) == "https://a.example.com/7"
+
+
+def test_compile_routes_rejects_bad_config():
+    with pytest.raises(ValueError, match="no target"):
+        compile_routes({"/x": {"host": "a"}})
+    with pytest.raises(ValueError, match="Conflicting"):
+        compile_routes({"/x/{a}": "https://a", "/x/{b}/y": "https://b"})
+
+
+def test_lookup_with_thousands_of_routes():
+    config = {f"/service-{i}/v1": f"https://svc{i}.example.com" for i in range(5000)}
+    assert route_to_target("/service-4321/v1/health", config) == "https://svc4321.example.com/health"
+
+
+def test_route_origins():
+    assert route_origins({"/a": "https://a.com/x", "/b": [{"target": "https://a.com/y"}], "/c": "http://c.com"}) == [
+        "https://a.com/", "http://c.com/"
+    ]
@@ -0,0 +1,136 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from server.prefork import PooledWSGIServer, bind_socket, reuse_port_supported
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    sock = bind_socket("127.0.0.1", 0)
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.mark.skipif(not reuse_port_supported(), reason="SO_REUSEPORT not available")
+def test_reuse_port_sockets_share_a_port():
+    first = bind_socket("127.0.0.1", 0, reuse_port=True)
+    second = bind_socket("127.0.0.1", first.getsockname()[1], reuse_port=True)
+    try:
+        assert first.getsockname() == second.getsockname()
+    finally:
+        first.close()
+        second.close()
+
+    taken = bind_socket("127.0.0.1", 0)
+    try:
+        with pytest.raises(OSError):
+            bind_socket("127.0.0.1", taken.getsockname()[1])
+    finally:
+        taken.close()
+
+
+def test_pooled_server_drains_in_flight_requests():
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_app(environ, start_response):
+        started.set()
+        release.wait(5)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"done"]
+
+    sock = bind_socket("127.0.0.1", 0)
+    server = PooledWSGIServer("127.0.0.1", sock.getsockname()[1], slow_app, threads=2, fd=sock.fileno())
+    serving = threading.Thread(target=server.serve_forever)
+    serving.start()
+
+    result = {}
+
+    def client():
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/", timeout=5) as response:
+            result["body"] = response.read()
+
+    request = threading.Thread(target=client)
+    request.start()
+    assert started.wait(5)
+
+    # stop accepting while the request is still running, then let it finish
+    server.shutdown()
+    serving.join()
+    sock.close()
+    assert server.in_flight == 1
+
+    threading.Timer(0.2, release.set).start()
+    assert server.drain(5) is True
+    request.join(5)
+    assert result["body"] == b"done"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-forking needs os.fork")
+@pytest.mark.parametrize("reuse_port", [True, False])
+def test_serve_runs_workers_and_exits_cleanly_on_sigterm(reuse_port):
+    port = _free_port()
+    command = [sys.executable, "-m", "server.cli", "serve", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", "2", "--threads", "2", "--graceful-timeout", "5",
+               "--reuse-port" if reuse_port else "--no-reuse-port"]
+    master = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        health = None
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and health is None:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=2) as response:
+                    health = json.loads(response.read())
+            except OSError:
+                time.sleep(0.2)
+
+        assert health is not None and health["status"] == "healthy"
+
+        master.send_signal(signal.SIGTERM)
+        assert master.wait(timeout=20) == 0
+    finally:
+        if master.poll() is None:
+            master.kill()
+            master.wait()
+
+
+WORKER_LOGS = """
+import os
+from unittest.mock import patch
+from reverse_proxy.config import logging as log_pipeline
+from reverse_proxy.config.logging import adapter_logger
+from server import prefork
+
+log_pipeline.configure_logging(dict(log_pipeline.LOGGING_CONFIG, queue_size=50))
+
+def run(listener, options):
+    for n in range(200):
+        adapter_logger.warning("worker line %d", n)
+    return 3
+
+with patch.object(prefork, "_run_worker", run):
+    pid = prefork._spawn(None, {"reuse_port": True}, {}, 0)
+print(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]))
+"""
+
+
+def test_workers_write_queued_logs_before_exiting():
+    result = subprocess.run([sys.executable, "-c", WORKER_LOGS], capture_output=True, text=True, cwd=ROOT, timeout=30)
+
+    assert result.stdout.strip() == "3"
+    written = [line for line in result.stderr.splitlines() if "worker line" in line]
+    # the queue holds 50 records, the rest may be dropped, but nothing queued is lost
+    assert len(written) >= 50
+    assert "worker line 0" in written[0]
@@ -0,0 +1,209 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+from reverse_proxy import cache, shared_cache
+from reverse_proxy.config.consts import SHARED_CACHE_CONFIG
+from reverse_proxy.proxy_service import proxy_request
+from server.app import app
+from server.prefork import SendfileWrapper
+from tests.conftest import make_response
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIG = {
+    "enabled": True,
+    "max_bytes": 1024 * 1024,
+    "max_entry_bytes": 1024,
+    "default_ttl": 0,
+    "methods": ["GET", "HEAD"],
+    "statuses": [200]
+}
+
+CACHEABLE = {"Cache-Control": "max-age=60"}
+
+
+@pytest.fixture
+def shared_dir(tmp_path):
+    directory = str(tmp_path / "shared")
+    with patch.dict(SHARED_CACHE_CONFIG, {"directory": directory, "slots": 64, "max_bytes": 64 * 1024, "zero_copy_min_bytes": 4096}):
+        cache.clear_cache()
+        shared_cache.clear_shared()
+        yield directory
+        cache.clear_cache()
+        shared_cache.clear_shared()
+
+
+def store(body, url="https://example.com/", request_headers=None, headers=None):
+    lookup = cache.cache_lookup("GET", url, None, request_headers, CONFIG)
+    cache.cache_store(lookup, make_response(body, url=url, headers={**CACHEABLE, **(headers or {})}))
+
+
+def test_entries_stored_by_another_process_are_hits(shared_dir):
+    script = (
+        "from reverse_proxy.config.consts import SHARED_CACHE_CONFIG; "
+        "from tests.test_shared_cache import store; "
+        "SHARED_CACHE_CONFIG['slots'] = 64; "
+        "store(b'from the other worker', url='https://example.com/other')"
+    )
+    env = dict(os.environ, REVERSE_PROXY_SHARED_CACHE_DIR=shared_dir)
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True)
+
+    lookup = cache.cache_lookup("GET", "https://example.com/other", None, {}, CONFIG)
+
+    assert lookup["fresh"] is True
+    assert cache.cached_response(lookup).content == b"from the other worker"
+    # small bodies are copied into this process, the next lookup doesn't touch the shared tier
+    cache.cache_lookup("GET", "https://example.com/other", None, {}, CONFIG)
+    assert shared_cache.shared_stats()["hits"] == 1
+
+
+def test_vary_values_must_match(shared_dir):
+    store(b"gzip variant", request_headers={"Accept-Language": "en"}, headers={"Vary": "Accept-Language"})
+    cache.clear_cache()
+
+    assert cache.cache_lookup("GET", "https://example.com/", None, {"Accept-Language": "de"}, CONFIG)["entry"] is None
+    assert cache.cache_lookup("GET", "https://example.com/", None, {"Accept-Language": "en"}, CONFIG)["fresh"] is True
+
+
+def test_large_bodies_stay_in_their_file(shared_dir):
+    body = b"x" * 5000
+    store(body)
+    cache.clear_cache()
+
+    lookup = cache.cache_lookup("GET", "https://example.com/", None, {}, CONFIG)
+    response = cache.cached_response(lookup)
+
+    assert response.cached_file["size"] == 5000
+    assert response.cached_file["file"].read() == body
+    response.cached_file["file"].close()
+    assert cache.cache_stats()["entries"] == 0
+
+
+def test_eviction_keeps_the_shared_tier_under_budget(shared_dir):
+    with patch.dict(SHARED_CACHE_CONFIG, {"max_bytes": 10000}):
+        for name in ["a", "b", "c"]:
+            store(bytes(4000), url=f"https://example.com/{name}")
+            time.sleep(0.01)
+
+    stats = shared_cache.shared_stats()
+    assert stats["bytes"] <= 10000
+    assert stats["evictions"] == 1
+    assert len(os.listdir(os.path.join(shared_dir, "bodies"))) == 2
+
+
+def test_crashed_writers_leave_nothing_behind(shared_dir):
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True).stdout.strip()
+    orphan = os.path.join(shared_dir, "tmp", f"abc.{dead}.1.tmp")
+    with open(orphan, "wb") as file:
+        file.write(b"half a body")
+
+    shared_cache._state["pid"] = None
+    shared_cache.shared_stats()
+
+    assert not os.path.exists(orphan)
+
+
+def test_streamed_bodies_are_teed_only_when_complete(shared_dir):
+    def streamed(url):
+        response = make_response(None, url=url, headers=CACHEABLE)
+        response._content = False
+        response._content_consumed = False
+        response.raw = shared_cache._ChunkReader(chunk for chunk in [b"a" * 3000, b"b" * 3000])
+        return response
+
+    for url, read_all in [("https://example.com/complete", True), ("https://example.com/aborted", False)]:
+        lookup = cache.cache_lookup("GET", url, None, {}, CONFIG)
+        relayed = cache.cache_store(lookup, streamed(url), stream=True)
+        chunks = relayed.iter_content(chunk_size=1024)
+        if read_all:
+            assert b"".join(chunks) == b"a" * 3000 + b"b" * 3000
+        else:
+            next(chunks)
+            relayed.close()
+
+    complete = cache.cache_lookup("GET", "https://example.com/complete", None, {}, CONFIG)
+    assert complete["fresh"] is True
+    complete["entry"]["file"].close()
+    assert cache.cache_lookup("GET", "https://example.com/aborted", None, {}, CONFIG)["entry"] is None
+    assert os.listdir(os.path.join(shared_dir, "tmp")) == []
+
+
+def test_teed_bodies_keep_set_cookie_for_their_client_only(shared_dir):
+    upstream = make_response(None, headers={**CACHEABLE, "Set-Cookie": "session=abc"})
+    upstream._content = False
+    upstream._content_consumed = False
+    upstream.raw = shared_cache._ChunkReader(iter([b"a" * 3000]))
+
+    lookup = cache.cache_lookup("GET", "https://example.com/cookie", None, {}, CONFIG)
+    relayed = cache.cache_store(lookup, upstream, stream=True)
+    assert relayed.headers["Set-Cookie"] == "session=abc"
+    assert relayed.content == b"a" * 3000
+
+    hit = cache.cache_lookup("GET", "https://example.com/cookie", None, {}, CONFIG)
+    assert hit["entry"]["body"] == b"a" * 3000
+    assert "Set-Cookie" not in hit["entry"]["headers"]
+
+
+def test_unread_teed_bodies_release_the_temp_file_and_upstream(shared_dir):
+    closed = []
+    upstream = make_response(None, headers=CACHEABLE)
+    upstream._content = False
+    upstream._content_consumed = False
+    upstream.raw = shared_cache._ChunkReader(iter([b"a" * 3000]), lambda: closed.append(True))
+
+    lookup = cache.cache_lookup("GET", "https://example.com/head", None, {}, CONFIG)
+    relayed = cache.cache_store(lookup, upstream, stream=True)
+    assert os.listdir(os.path.join(shared_dir, "tmp")) != []
+
+    relayed.close()
+
+    assert closed == [True]
+    assert os.listdir(os.path.join(shared_dir, "tmp")) == []
+    assert cache.cache_lookup("GET", "https://example.com/head", None, {}, CONFIG)["entry"] is None
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_flask_serves_large_hits_from_the_file(mock_execute, shared_dir):
+    body = b"0123456789" * 1000
+    mock_execute.return_value = make_response(body, "application/octet-stream", headers=CACHEABLE)
+    routes = {"/files": "https://files.example.com"}
+    event = {"method": "GET", "path": "/files/big.bin", "params": {}, "data": None, "headers": {}}
+
+    proxy_request(event, route_config=routes)
+    cache.clear_cache()
+
+    hit = proxy_request(event, route_config=routes, stream=True)
+    assert hit["stream"] is None and hit["content_length"] == len(body)
+    hit["file"].close()
+
+    with patch("server.app.proxy_request", side_effect=lambda *args, **kwargs: proxy_request(*args, route_config=routes, stream=True)):
+        response = app.test_client().get("/proxy/files/big.bin")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Length"] == str(len(body))
+    assert response.data == body
+    assert mock_execute.call_count == 1
+
+
+def test_sendfile_wrapper_sends_from_the_current_position(tmp_path):
+    path = tmp_path / "body"
+    path.write_bytes(b"HEADER" + b"body bytes")
+    server, client = socket.socketpair()
+
+    file = open(path, "rb")
+    file.seek(6)
+    wrapper = SendfileWrapper(server, file)
+    assert list(wrapper) == [b""]
+    wrapper.close()
+    server.close()
+
+    assert client.recv(1024) == b"body bytes"
+    assert file.closed
+    client.close()
@@ -0,0 +1,120 @@
+import pytest
+from unittest.mock import Mock, patch
+
+from reverse_proxy import cache, stages
+from reverse_proxy.proxy_service import proxy_request
+from reverse_proxy.router import compile_routes, match_route
+from reverse_proxy.stages import register_stage, stage_response, validate_stages
+
+
+EVENT = {"method": "GET", "path": "/api/items", "params": {}, "data": None, "headers": {"Cookie": "session=1", "Accept": "*/*"}}
+
+
+def make_upstream_response():
+    response = Mock()
+    response.status_code = 200
+    response.headers = {"Content-Type": "text/plain", "Cache-Control": "max-age=60"}
+    response.content = b"from upstream"
+    response.text = "from upstream"
+    response.encoding = "utf-8"
+    return response
+
+
+@pytest.fixture
+def token_stage():
+    def factory(route):
+        token = route.get("token")
+        if not token:
+            return None
+
+        def auth(ctx, call_next):
+            if (ctx["headers"] or {}).get("Authorization") != f"Bearer {token}":
+                ctx["raw"] = stage_response(401, b"unauthorized")
+                return
+            call_next(ctx)
+
+        return auth
+
+    register_stage("token", factory)
+    yield
+    stages._registry.pop("token", None)
+
+
+@pytest.mark.parametrize("names, message", [
+    (["ratelimit", "cache"], "exactly once"),
+    (["upstream", "upstream"], "exactly once"),
+    (["gzip", "upstream"], "Unknown stage"),
+    (["upstream", "cache"], "must come before"),
+    (["transform", "upstream"], "must come after"),
+    ("upstream", "list of names")
+])
+def test_invalid_stage_lists(names, message):
+    with pytest.raises(ValueError, match=message):
+        validate_stages(names)
+
+
+def test_routes_are_checked_when_loaded():
+    with pytest.raises(ValueError, match="Unknown stage"):
+        compile_routes({"/api": {"target": "https://api.example.com", "stages": ["auth", "upstream"]}})
+
+    route = match_route("/api", {"/api": "https://api.example.com"})["route"]
+    assert route["stages"] == ["ratelimit", "cache", "upstream", "transform", "compress"]
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_upstream_only_route_skips_the_cache(mock_execute):
+    mock_execute.return_value = make_upstream_response()
+    routes = {"/api": {"target": "https://bare.example.com", "stages": ["upstream"]}}
+    cache.clear_cache()
+
+    for _ in range(2):
+        response = proxy_request(EVENT, {"page_title": "ignored"}, route_config=routes)
+        assert response["body"] == b"from upstream"
+
+    assert mock_execute.call_count == 2
+    assert cache.cache_stats()["entries"] == 0
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_headers_stage_rewrites_the_upstream_request(mock_execute):
+    mock_execute.return_value = make_upstream_response()
+    routes = {"/api": {
+        "target": "https://api.example.com",
+        "stages": ["headers", "upstream"],
+        "request_headers": {"Authorization": "Bearer origin-key", "cookie": None}
+    }}
+
+    proxy_request(EVENT, route_config=routes)
+
+    assert mock_execute.call_args.kwargs["headers"] == {"Accept": "*/*", "Authorization": "Bearer origin-key"}
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_custom_stage_answers_without_calling_upstream(mock_execute, token_stage):
+    mock_execute.return_value = make_upstream_response()
+    routes = {"/api": {"target": "https://api.example.com", "stages": ["token", "upstream"], "token": "s3cret"}}
+
+    denied = proxy_request(EVENT, route_config=routes)
+    assert denied["status_code"] == 401 and denied["body"] == b"unauthorized"
+    assert mock_execute.call_count == 0
+
+    streamed = proxy_request(EVENT, route_config=routes, stream=True)
+    assert streamed["status_code"] == 401 and b"".join(streamed["stream"]) == b"unauthorized"
+
+    allowed = proxy_request({**EVENT, "headers": {"Authorization": "Bearer s3cret"}}, route_config=routes)
+    assert allowed["status_code"] == 200
+    assert mock_execute.call_count == 1
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_chain_is_compiled_once_per_route(mock_execute, token_stage):
+    mock_execute.return_value = make_upstream_response()
+    routes = {"/api": {"target": "https://api.example.com", "stages": ["token", "upstream"]}}
+
+    with patch("reverse_proxy.proxy_service.compile_stages", wraps=stages.compile_stages) as compile_spy:
+        for _ in range(3):
+            proxy_request(EVENT, route_config=routes)
+
+    assert compile_spy.call_count == 1
+    # the token factory returned None for a route without a token, nothing runs in its place
+    assert mock_execute.call_count == 3
@@ -0,0 +1,98 @@
+import pytest
+from unittest.mock import patch, Mock
+from reverse_proxy.execution import execute_request, stream_response
+from reverse_proxy.proxy_service import proxy_request
+from reverse_proxy.transform_cache import clear_transform_cache, transform_cache_stats
+
+
+def make_streamed_response(chunks, content_type="video/mp4", status_code=200):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = {"Content-Type": content_type}
+    response.iter_content.return_value = iter(chunks)
+    return response
+
+
+def test_stream_response_yields_chunks_and_closes():
+    raw = make_streamed_response([b"abc", b"", b"def"])
+
+    result = stream_response(raw)
+
+    assert result["status_code"] == 200
+    assert result["content"] is None
+    raw.close.assert_not_called()
+    assert list(result["stream"]) == [b"abc", b"def"]
+    raw.close.assert_called_once()
+
+
+def test_stream_response_closes_when_client_disconnects():
+    raw = make_streamed_response([b"abc", b"def"])
+
+    stream = stream_response(raw)["stream"]
+    next(stream)
+    stream.close()
+
+    raw.close.assert_called_once()
+
+
+def test_execute_request_streams_and_releases_failed_response():
+    import requests
+
+    failed = Mock(status_code=502)
+    failed.raise_for_status.side_effect = requests.exceptions.HTTPError("bad gateway")
+    session = Mock()
+    session.request.return_value = failed
+
+    with patch("reverse_proxy.execution.get_session", return_value=session):
+        with pytest.raises(requests.exceptions.HTTPError):
+            execute_request("GET", "https://example.com", stream=True)
+
+    assert session.request.call_args.kwargs["stream"] is True
+    failed.close.assert_called_once()
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_stream_passthrough(mock_execute):
+    mock_execute.return_value = make_streamed_response([b"chunk-1", b"chunk-2"])
+
+    response = proxy_request({"method": "GET", "path": "/google"}, stream=True)
+
+    assert mock_execute.call_args.kwargs["stream"] is True
+    assert b"".join(response["stream"]) == b"chunk-1chunk-2"
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_streams_transformed_html(mock_execute):
+    raw = make_streamed_response([b"<html><head><ti", b"tle>Old</title></head><body>Hel", b"lo</body></html>"], content_type="text/html")
+    raw.encoding = "utf-8"
+    mock_execute.return_value = raw
+
+    response = proxy_request(
+        {"method": "GET", "path": "/google"},
+        transform_options={"page_title": "New", "text_replaces": {"Hello": "Bye"}},
+        stream=True
+    )
+
+    assert mock_execute.call_args.kwargs["stream"] is True
+    assert b"".join(response["stream"]) == b"<html><head><title>New</title></head><body>Bye</body></html>"
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_small_streamed_bodies_use_the_transform_cache(mock_execute):
+    body = b"<html><head><title>Old</title></head><body>Hello</body></html>"
+
+    def execute(**kwargs):
+        raw = make_streamed_response([body], content_type="text/html; charset=utf-8")
+        raw.headers.update({"Content-Length": str(len(body)), "Cache-Control": "no-store"})
+        raw.encoding = "utf-8"
+        return raw
+
+    mock_execute.side_effect = execute
+    clear_transform_cache()
+    options = {"page_title": "New", "text_replaces": {"Hello": "Bye"}}
+
+    for _ in range(2):
+        response = proxy_request({"method": "GET", "path": "/google"}, transform_options=options, stream=True)
+        assert b"".join(response["stream"]) == b"<html><head><title>New</title></head><body>Bye</body></html>"
+
+    assert transform_cache_stats()["hits"] == 1
@@ -0,0 +1,59 @@
+import random
+import pytest
+from reverse_proxy.transformation import replace_text, replace_text_stream, compile_replacements
+
+
+def test_replace_text_basic():
+    assert replace_text("<body>Hello World</body>", {"Hello": "Hi", "World": "Universe"}) == "<body>Hi Universe</body>"
+
+
+def test_replace_text_is_single_pass():
+    # sequential str.replace would turn "a" into "c"
+    assert replace_text("ab", {"a": "b", "b": "c"}) == "bc"
+    assert replace_text("ab", {"b": "c", "a": "b"}) == "bc"
+
+
+def test_replace_text_leftmost_longest():
+    replacements = {"Goo": "X", "Google": "MySearch", "gle": "Y"}
+    assert replace_text("Google Goo gle", replacements) == "MySearch X Y"
+
+
+def test_replace_text_ignores_empty_keys_and_escapes_regex():
+    assert replace_text("a.b*c", {"": "boom", ".": "-", "*": "+"}) == "a-b+c"
+    assert replace_text("text", {}) == "text"
+
+
+def test_compiled_pattern_reused_per_replacement_set():
+    first = compile_replacements({"a": "1", "b": "2"})
+    second = compile_replacements({"b": "2", "a": "1"})
+    assert first[0] is second[0]
+
+
+@pytest.mark.parametrize("chunks", [
+    ["Goo", "gle Search"],
+    ["G", "o", "o", "g", "l", "e", " ", "Search"],
+    ["Google Sea", "rch"],
+    ["", "Google Search", ""],
+])
+def test_replace_text_stream_handles_split_keys(chunks):
+    replacements = {"Google": "MySearch", "Goo": "X", "Search": "Find"}
+    assert "".join(replace_text_stream(chunks, replacements)) == "MySearch Find"
+
+
+def test_replace_text_stream_matches_replace_text_on_random_chunking():
+    rng = random.Random(7)
+    text = "".join(rng.choice("abcde ") for _ in range(5000))
+    replacements = {"ab": "X", "abc": "Y", "c": "cc", "de": "", "eee": "E", "bcda": "Z"}
+
+    for _ in range(20):
+        cuts = sorted(rng.sample(range(1, len(text)), 40))
+        chunks = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        assert "".join(replace_text_stream(chunks, replacements)) == replace_text(text, replacements)
+
+
+def test_replace_text_stream_bounded_lookbehind():
+    chunks = ["x" * 100 for _ in range(5)]
+    outputs = list(replace_text_stream(chunks, {"needle": "pin"}))
+    # everything but the last (len("needle") - 1) chars is emitted as it arrives
+    assert len(outputs[0]) == 95
+    assert "".join(outputs) == "x" * 500
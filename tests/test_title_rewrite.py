@@ -0,0 +1,65 @@
+from reverse_proxy.transformation import update_html_title, rewrite_title_stream, transform_stream, transform_response
+
+
+def test_update_html_title():
+    html = "<html><head><title>Old Title</title></head><body></body></html>"
+    assert update_html_title(html, "New Title") == "<html><head><title>New Title</title></head><body></body></html>"
+
+
+def test_update_html_title_escapes_and_keeps_attributes():
+    html = "<HTML><HEAD><TITLE lang='en'>Old</TITLE></HEAD></HTML>"
+    assert update_html_title(html, "A & <B>") == "<HTML><HEAD><TITLE lang='en'>A &amp; &lt;B&gt;</TITLE></HEAD></HTML>"
+
+
+def test_update_html_title_skips_comments_and_scripts():
+    html = (
+        "<head><!-- <title>c</title> -->"
+        "<script>var t = '<title>s</title>';</script>"
+        "<title>Real</title></head>"
+    )
+    assert update_html_title(html, "New") == (
+        "<head><!-- <title>c</title> -->"
+        "<script>var t = '<title>s</title>';</script>"
+        "<title>New</title></head>"
+    )
+
+
+def test_update_html_title_stops_at_end_of_head():
+    html = "<html><head></head><body><svg><title>icon</title></svg></body></html>"
+    assert update_html_title(html, "New") == html
+
+
+def test_update_html_title_without_title_or_html():
+    assert update_html_title("plain text", "New") == "plain text"
+
+
+def test_rewrite_title_stream_split_across_chunks():
+    html = "<html><head><!-- x --><title>Old Title</title></head><body>" + "b" * 1000 + "</body></html>"
+    expected = update_html_title(html, "New")
+
+    for size in [1, 2, 3, 7, 64]:
+        chunks = [html[i:i + size] for i in range(0, len(html), size)]
+        assert "".join(rewrite_title_stream(chunks, "New")) == expected
+
+
+def test_rewrite_title_stream_passes_rest_through_untouched():
+    body_chunks = ["<body>" + "x" * 100, "y" * 100 + "</body>"]
+    output = list(rewrite_title_stream(["<head><title>t</title></head>"] + body_chunks, "New"))
+
+    # after the title the original chunk objects flow straight through
+    assert output[-2:] == body_chunks
+
+
+def test_transform_stream_decodes_split_multibyte_chars():
+    data = "<title>Old</title><p>café</p>".encode("utf-8")
+    split = data.index("é".encode("utf-8")) + 1
+    chunks = [data[:split], data[split:]]
+
+    output = b"".join(transform_stream(chunks, "utf-8", page_title="Nouveau", text_replaces={"café": "thé"}))
+
+    assert output.decode("utf-8") == "<title>Nouveau</title><p>thé</p>"
+
+
+def test_transform_response_updates_title():
+    response = {"content_type": "text/html", "text": "<head><title>Old</title></head>", "content": None}
+    assert transform_response(response, page_title="Unique New")["content"] == "<head><title>Unique New</title></head>"
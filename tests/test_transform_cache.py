@@ -0,0 +1,95 @@
+import pytest
+from unittest.mock import patch
+from reverse_proxy import transform_cache
+from reverse_proxy.transformation import transform_response, transform_stream_response
+
+
+CONFIG = {"enabled": True, "max_bytes": 400, "max_entry_bytes": 200}
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    transform_cache.clear_transform_cache()
+    yield
+    transform_cache.clear_transform_cache()
+
+
+def html_response(text):
+    return {"content_type": "text/html", "text": text, "content": text}
+
+
+def test_options_key_is_canonical():
+    assert transform_cache.options_key("T", {"a": "b"}) == transform_cache.options_key("T", {"a": "b"})
+    assert transform_cache.options_key("T", {"a": "b"}) != transform_cache.options_key("U", {"a": "b"})
+    assert transform_cache.options_key(None, {"a": "b", "b": "c"}) == transform_cache.options_key(None, {"b": "c", "a": "b"})
+
+
+def test_repeat_transform_served_from_cache():
+    with patch("reverse_proxy.transformation.replace_text", wraps=lambda text, replaces: text.replace("Hello", "Hi")) as replace:
+        first = transform_response(html_response("<p>Hello</p>"), text_replaces={"Hello": "Hi"})
+        second = transform_response(html_response("<p>Hello</p>"), text_replaces={"Hello": "Hi"})
+
+    assert replace.call_count == 1
+    assert first["content"] == second["content"] == "<p>Hi</p>"
+
+    stats = transform_cache.transform_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_different_body_or_options_miss():
+    transform_response(html_response("<p>Hello</p>"), text_replaces={"Hello": "Hi"})
+    other_body = transform_response(html_response("<p>Hello!</p>"), text_replaces={"Hello": "Hi"})
+    other_options = transform_response(html_response("<p>Hello</p>"), text_replaces={"Hello": "Hey"})
+
+    assert other_body["content"] == "<p>Hi!</p>"
+    assert other_options["content"] == "<p>Hey</p>"
+    assert transform_cache.transform_cache_stats()["hits"] == 0
+
+
+def test_eviction_bounds_memory():
+    for i in range(10):
+        key = transform_cache.transform_cache_key(f"body-{i}", None, {"a": "b"})
+        transform_cache.put_transformed(key, "x" * 50, CONFIG)
+
+    stats = transform_cache.transform_cache_stats()
+    assert stats["bytes"] <= CONFIG["max_bytes"]
+    assert stats["evictions"] > 0
+    assert transform_cache.get_transformed(transform_cache.transform_cache_key("body-9", None, {"a": "b"}), CONFIG) == "x" * 50
+    assert transform_cache.get_transformed(transform_cache.transform_cache_key("body-0", None, {"a": "b"}), CONFIG) is None
+
+
+def test_oversized_output_not_cached():
+    key = transform_cache.transform_cache_key("body", None, None)
+    transform_cache.put_transformed(key, "x" * 500, CONFIG)
+    assert transform_cache.transform_cache_stats()["entries"] == 0
+
+
+def streamed_response(chunks, headers):
+    return {"content_type": "text/html", "encoding": "utf-8", "headers": headers, "stream": iter(chunks)}
+
+
+def test_encoded_stream_is_measured_by_its_decoded_size():
+    read = []
+
+    def chunks():
+        for n in range(10):
+            read.append(n)
+            yield b"<p>Hello</p>" * 5
+
+    # the compressed size fits the limit, the decoded body doesn't
+    response = transform_stream_response(streamed_response(chunks(), {"Content-Encoding": "gzip", "Content-Length": "40"}),
+                                         text_replaces={"Hello": "Hi"}, cache_config=CONFIG)
+
+    assert len(read) == 4
+    assert b"".join(response["stream"]) == b"<p>Hi</p>" * 50
+    assert transform_cache.transform_cache_stats()["entries"] == 0
+
+
+def test_small_stream_without_declared_length_is_memoized():
+    response = transform_stream_response(streamed_response([b"<p>Hel", b"lo</p>"], {"Content-Encoding": "gzip"}),
+                                         text_replaces={"Hello": "Hi"}, cache_config=CONFIG)
+
+    assert b"".join(response["stream"]) == b"<p>Hi</p>"
+    assert transform_cache.transform_cache_stats()["entries"] == 1
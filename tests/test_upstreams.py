@@ -0,0 +1,221 @@
+import collections
+import time
+import pytest
+import requests
+from unittest.mock import patch, Mock
+from reverse_proxy import upstreams
+from reverse_proxy.proxy_service import proxy_request
+
+
+def make_group(strategy="round_robin", targets=None, **extra):
+    targets = targets or ["https://a.example.com", "https://b.example.com", "https://c.example.com"]
+    upstreams.set_upstream_groups({"api": {"strategy": strategy, "targets": targets, **extra}})
+    return upstreams.get_group("api")
+
+
+@pytest.fixture(autouse=True)
+def clean_groups():
+    yield
+    upstreams.stop_health_checks()
+    upstreams.set_upstream_groups({})
+
+
+def pick(n):
+    picks = []
+    for _ in range(n):
+        group, target = upstreams.acquire_target("api")
+        upstreams.release_target(group, target, success=True)
+        picks.append(target["url"])
+    return picks
+
+
+def test_round_robin_cycles_targets():
+    make_group()
+    assert collections.Counter(pick(9)) == {"https://a.example.com": 3, "https://b.example.com": 3, "https://c.example.com": 3}
+
+
+def test_weighted_follows_weights():
+    make_group("weighted", [{"url": "https://a.example.com", "weight": 3}, {"url": "https://b.example.com", "weight": 1}])
+    picks = pick(8)
+    assert collections.Counter(picks) == {"https://a.example.com": 6, "https://b.example.com": 2}
+    # smooth: b never waits more than one full cycle
+    assert "https://b.example.com" in picks[:4]
+
+
+@pytest.mark.parametrize("strategy", ["least_outstanding", "p2c"])
+def test_load_aware_strategies_avoid_busy_target(strategy):
+    group = make_group(strategy, ["https://a.example.com", "https://b.example.com"])
+    group["targets"][0]["in_flight"] = 50
+
+    picks = pick(20)
+
+    assert picks.count("https://b.example.com") >= 19 if strategy == "least_outstanding" else picks.count("https://b.example.com") >= 10
+
+
+def test_unknown_group_and_bad_spec():
+    with pytest.raises(ValueError, match="Unknown upstream group"):
+        upstreams.acquire_target("missing")
+    with pytest.raises(ValueError, match="no targets"):
+        upstreams.set_upstream_groups({"x": {"targets": []}})
+    with pytest.raises(ValueError, match="strategy"):
+        upstreams.set_upstream_groups({"x": {"targets": ["https://a"], "strategy": "magic"}})
+
+
+def test_passive_ejection_after_consecutive_failures():
+    group = make_group(targets=["https://a.example.com", "https://b.example.com"], max_consecutive_failures=2)
+    bad = group["targets"][0]
+
+    for _ in range(2):
+        bad["in_flight"] += 1
+        upstreams.release_target(group, bad, success=False)
+
+    assert upstreams.upstream_stats()["api"]["targets"][0]["ejected"]
+    assert set(pick(4)) == {"https://b.example.com"}
+
+
+def test_all_targets_unhealthy_fails_open():
+    group = make_group(targets=["https://a.example.com"])
+    group["targets"][0]["healthy"] = False
+    assert pick(1) == ["https://a.example.com"]
+
+
+def test_active_health_checks_flip_state_after_threshold():
+    group = make_group(targets=["https://a.example.com"], health_check={"path": "/health", "unhealthy_threshold": 2, "healthy_threshold": 1})
+
+    with patch("reverse_proxy.upstreams.check_target", return_value=False):
+        upstreams.run_health_checks()
+        assert group["targets"][0]["healthy"]
+        upstreams.run_health_checks()
+        assert not group["targets"][0]["healthy"]
+
+    with patch("reverse_proxy.upstreams.check_target", return_value=True):
+        upstreams.run_health_checks()
+        assert group["targets"][0]["healthy"]
+
+
+def test_health_checks_cover_groups_installed_after_start():
+    with patch.dict(upstreams.UPSTREAM_DEFAULTS["health_check"], interval=0.02), \
+            patch("reverse_proxy.upstreams.check_target", return_value=False):
+        # nothing to check at startup, e.g. no upstreams until the first route reload
+        assert upstreams.start_health_checks() is not None
+        group = make_group(targets=["https://a.example.com"], health_check={"path": "/health", "unhealthy_threshold": 1})
+
+        deadline = time.monotonic() + 2
+        while group["targets"][0]["healthy"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert not group["targets"][0]["healthy"]
+
+
+def test_is_upstream_failure():
+    server_error = requests.exceptions.HTTPError(response=Mock(status_code=503))
+    client_error = requests.exceptions.HTTPError(response=Mock(status_code=404))
+
+    assert upstreams.is_upstream_failure(requests.exceptions.Timeout())
+    assert upstreams.is_upstream_failure(requests.exceptions.ConnectionError())
+    assert upstreams.is_upstream_failure(server_error)
+    assert not upstreams.is_upstream_failure(client_error)
+    assert not upstreams.is_upstream_failure(ValueError())
+
+
+def test_resolve_upstream_keeps_path_and_query():
+    make_group(targets=["https://a.example.com/base"])
+    url, lease = upstreams.resolve_upstream("upstream://api/users/1?x=2")
+    assert url == "https://a.example.com/base/users/1?x=2"
+    assert lease[1]["in_flight"] == 1
+
+    assert upstreams.resolve_upstream("https://plain.example.com/") == ("https://plain.example.com/", None)
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_balances_and_tracks_stats(mock_execute):
+    make_group(targets=["https://a.example.com", "https://b.example.com"])
+    mock_execute.return_value = Mock(status_code=200, headers={"Content-Type": "text/plain"}, text="ok")
+    routes = {"/api": "upstream://api"}
+
+    for _ in range(4):
+        proxy_request({"method": "POST", "path": "/api/items"}, route_config=routes)
+
+    urls = [call.kwargs["url"] for call in mock_execute.call_args_list]
+    assert sorted(set(urls)) == ["https://a.example.com/items", "https://b.example.com/items"]
+
+    stats = upstreams.upstream_stats()["api"]["targets"]
+    assert [t["requests"] for t in stats] == [2, 2]
+    assert all(t["in_flight"] == 0 and t["latency_ms"] is not None for t in stats)
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_proxy_request_records_failure(mock_execute):
+    make_group(targets=["https://a.example.com"])
+    mock_execute.side_effect = requests.exceptions.Timeout("slow")
+
+    with pytest.raises(requests.exceptions.Timeout):
+        proxy_request({"method": "POST", "path": "/api"}, route_config={"/api": "upstream://api"})
+
+    target = upstreams.upstream_stats()["api"]["targets"][0]
+    assert target["failures"] == 1
+    assert target["in_flight"] == 0
+
+
+def test_streamed_body_released_on_close_and_client_disconnect():
+    group = make_group(targets=["https://a.example.com"])
+    target = group["targets"][0]
+
+    target["in_flight"] = 1
+    stream = upstreams.release_on_close(iter([b"a", b"b"]), (group, target), 0.01)
+    next(stream)
+    assert target["in_flight"] == 1
+    stream.close()
+
+    assert target["in_flight"] == 0
+    assert target["failures"] == 0
+
+
+def test_unread_stream_still_releases_target_and_connection():
+    from reverse_proxy.execution import iter_response_body
+
+    group = make_group(targets=["https://a.example.com"])
+    target = group["targets"][0]
+    response = Mock()
+    response.iter_content.return_value = iter([b"never read"])
+
+    target["in_flight"] = 1
+    # e.g. the body of a HEAD request, closed without ever being iterated
+    upstreams.release_on_close(iter_response_body(response), (group, target), 0.01).close()
+
+    assert target["in_flight"] == 0
+    response.close.assert_called_once()
+
+
+@patch("reverse_proxy.proxy_service.execute_request")
+def test_lease_released_when_the_response_fails_after_the_upstream_call(mock_execute):
+    make_group(targets=["https://a.example.com"])
+    mock_execute.return_value = Mock(status_code=200, headers={"Content-Type": "text/plain"}, content=b"ok")
+
+    with patch("reverse_proxy.proxy_service.cache_store", side_effect=requests.exceptions.ChunkedEncodingError("cut")):
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            proxy_request({"method": "GET", "path": "/api/leak"}, route_config={"/api": "upstream://api"})
+
+    target = upstreams.upstream_stats()["api"]["targets"][0]
+    assert target["in_flight"] == 0
+    mock_execute.return_value.close.assert_called()
+
+
+def test_route_file_installs_upstreams(tmp_path):
+    from reverse_proxy.route_loader import reload_routes
+    from reverse_proxy.router import get_live_routes, set_live_routes
+
+    previous = get_live_routes()
+    path = tmp_path / "routes.json"
+    path.write_text('{"routes": {"/api": "upstream://api"}, "upstreams": {"api": {"targets": ["https://a.example.com"]}}}')
+
+    try:
+        reload_routes(str(path))
+        assert upstreams.upstream_origins() == ["https://a.example.com/"]
+
+        path.write_text('{"routes": {"/x": "https://x.example.com"}, "upstreams": {"api": {"targets": []}}}')
+        with pytest.raises(ValueError):
+            reload_routes(str(path))
+        assert get_live_routes() == {"/api": "upstream://api"}
+    finally:
+        set_live_routes(previous)